@@ -0,0 +1,200 @@
+"""
+Persistent cache of answered questions.
+
+Answers are stored in SQLite keyed by index directory, index version and the
+normalized question text, together with their source documents. Rebuilding an
+index changes its version, and entries for older versions of the same index
+are purged on the next lookup, so a cached answer never outlives the content
+it was generated from.
+
+When the exact question misses, `get_similar` can fall back to the cached
+question whose embedding is closest to the new one, and reuses its answer if
+the cosine distance is within `max_distance`.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+DEFAULT_PATH = os.path.join("answer_cache", "answers.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_DISTANCE = 0.08
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    index_dir TEXT NOT NULL,
+    version TEXT NOT NULL,
+    question_key TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    embedding BLOB,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (index_dir, version, question_key)
+);
+CREATE INDEX IF NOT EXISTS answers_used ON answers (used);
+"""
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?.!")
+
+
+def _dump_sources(documents):
+    return json.dumps([
+        {"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents
+    ])
+
+
+def _load_sources(payload):
+    return [Document(**doc) for doc in json.loads(payload)]
+
+
+class AnswerCache:
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = {}  # (index_dir, version) -> (keys, normalized matrix)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def get(self, index_dir, version, question, count=True):
+        """
+        Return the cached result dict for `question` against this index
+        version, or None. The dict has "cache" set to "exact". With
+        `count=False` the lookup is not counted as a hit.
+        """
+        with self._lock:
+            self._purge(index_dir, version)
+            row = self._db.execute(
+                "SELECT question_key, answer, sources FROM answers "
+                "WHERE index_dir = ? AND version = ? AND question_key = ?",
+                (index_dir, version, normalize_question(question)),
+            ).fetchone()
+            if row is None:
+                return None
+            if count:
+                self.hits += 1
+            return self._hit(index_dir, version, row, "exact")
+
+    def get_similar(self, index_dir, version, query_embedding):
+        """
+        Return the result of the cached question closest to
+        `query_embedding` if it is within `max_distance`, else None. The
+        dict has "cache" set to "semantic".
+        """
+        if self.max_distance is None:
+            return None
+        with self._lock:
+            self._purge(index_dir, version)
+            row = self._nearest(index_dir, version, query_embedding)
+            if row is None:
+                return None
+            self.semantic_hits += 1
+            return self._hit(index_dir, version, row, "semantic")
+
+    def _hit(self, index_dir, version, row, kind):
+        self._db.execute(
+            "UPDATE answers SET used = ? WHERE index_dir = ? AND version = ? AND question_key = ?",
+            (time.time(), index_dir, version, row[0]),
+        )
+        self._db.commit()
+        return {"result": row[1], "source_documents": _load_sources(row[2]), "cache": kind}
+
+    def put(self, index_dir, version, question, result, query_embedding=None, count=True):
+        """
+        Store a `RetrievalQA`-shaped result for `question`. Every put is a
+        question that had to be answered, so it counts as a miss unless
+        `count=False` (answers computed ahead of any question).
+        """
+        now = time.time()
+        blob = None
+        if query_embedding is not None:
+            blob = np.asarray(query_embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (index_dir, version, normalize_question(question), question, result["result"],
+                 _dump_sources(result.get("source_documents", [])), blob, now, now),
+            )
+            self._evict()
+            self._db.commit()
+            self._vectors.pop((index_dir, version), None)
+            if count:
+                self.misses += 1
+
+    def clear(self, index_dir=None):
+        """Forget every answer, or only those for `index_dir`."""
+        with self._lock:
+            if index_dir is None:
+                self._db.execute("DELETE FROM answers")
+                self._vectors.clear()
+            else:
+                self._db.execute("DELETE FROM answers WHERE index_dir = ?", (index_dir,))
+                self._vectors = {k: v for k, v in self._vectors.items() if k[0] != index_dir}
+            self._db.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses}
+
+    def _purge(self, index_dir, version):
+        """Drop answers from older index versions and expired entries."""
+        cursor = self._db.execute(
+            "DELETE FROM answers WHERE (index_dir = ? AND version != ?) OR used < ?",
+            (index_dir, version, time.time() - self.ttl),
+        )
+        if cursor.rowcount:
+            self._db.commit()
+            self._vectors.clear()
+
+    def _evict(self):
+        self._db.execute(
+            "DELETE FROM answers WHERE rowid IN ("
+            "SELECT rowid FROM answers ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def _nearest(self, index_dir, version, query_embedding):
+        cached = self._vectors.get((index_dir, version))
+        if cached is None:
+            rows = self._db.execute(
+                "SELECT question_key, embedding FROM answers "
+                "WHERE index_dir = ? AND version = ? AND embedding IS NOT NULL",
+                (index_dir, version),
+            ).fetchall()
+            if not rows:
+                return None
+            matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            cached = ([key for key, _ in rows], matrix)
+            self._vectors[(index_dir, version)] = cached
+
+        keys, matrix = cached
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        distances = 1.0 - matrix @ query
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return self._db.execute(
+            "SELECT question_key, answer, sources FROM answers "
+            "WHERE index_dir = ? AND version = ? AND question_key = ?",
+            (index_dir, version, keys[best]),
+        ).fetchone()
@@ -0,0 +1,82 @@
+"""
+Streaming question answering.
+
+`RetrievalQA` returns only once the whole completion is done. This module
+splits the same "stuff" chain into its two steps: retrieval and context
+assembly (`context_builder`) run first so the sources can be shown right
+away, then the completion is streamed token by token. Time-to-first-token and
+total latency are recorded for every answer.
+"""
+import logging
+import time
+
+import context_builder
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerStream:
+    """
+    Iterate over an instance to receive answer tokens. `source_documents` is
+    available immediately; `answer` and the timings are filled in as the
+    stream is consumed.
+    """
+
+    def __init__(self, vectorstore, llm, question, query_embedding=None, token_budget=None):
+        self.question = question
+        self.query_embedding = query_embedding
+        self.run = metrics.RunMetrics("query", mode="stream")
+        self.metrics = None
+        self.started = time.perf_counter()
+        self.context = context_builder.assemble(vectorstore, question, query_embedding, token_budget)
+        self.source_documents = self.context.documents
+        self.retrieval_latency = time.perf_counter() - self.started
+        self.run.add_time("retrieve", self.retrieval_latency)
+        self.time_to_first_token = None
+        self.total_latency = None
+        self.answer = ""
+        self._llm = llm
+
+    def prompt(self):
+        from langchain.chains.retrieval_qa.prompt import PROMPT
+
+        return PROMPT.format(context=self.context.text, question=self.question)
+
+    def __iter__(self):
+        parts = []
+        prompt = self.prompt()
+        for token in self._llm.stream(prompt):
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self.started
+            parts.append(token)
+            yield token
+        self.total_latency = time.perf_counter() - self.started
+        self.answer = "".join(parts)
+        self._finish_metrics(prompt)
+        logger.info(
+            "answer streamed: retrieval=%.3fs ttft=%.3fs total=%.3fs question=%r",
+            self.retrieval_latency, self.time_to_first_token or self.total_latency,
+            self.total_latency, self.question,
+        )
+
+    def _finish_metrics(self, prompt):
+        first_token = self.time_to_first_token or self.total_latency
+        self.run.add_time("llm_first_token", first_token - self.retrieval_latency)
+        self.run.add_time("llm", self.total_latency - self.retrieval_latency)
+        self.run.count("source_chunks", self.context.chunks_used)
+        self.run.count("prompt_tokens_before", self.context.prompt_tokens_before)
+        self.run.count("prompt_tokens", metrics.count_tokens(prompt))
+        self.run.count("answer_tokens", metrics.count_tokens(self.answer))
+        self.metrics = self.run.finish()
+
+    def result(self):
+        """The answer in the same shape `RetrievalQA` returns."""
+        return {"result": self.answer, "source_documents": self.source_documents}
+
+    def timings(self):
+        return {
+            "retrieval": self.retrieval_latency,
+            "time_to_first_token": self.time_to_first_token,
+            "total": self.total_latency,
+        }
@@ -0,0 +1,125 @@
+"""
+Local HTTP server that serves synthetic news articles.
+
+    GET /article/<n>   an HTML page with a headline and several paragraphs
+
+Article `n` is generated from a seeded RNG, so every run serves the same
+corpus. Pages are built on request, so serving 10,000 articles costs no
+memory up front. `latency` delays every response to model a remote site.
+Every article has a fixed ETag, and a request whose If-None-Match matches it
+gets an empty 304, so revalidation can be benchmarked too.
+"""
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOPICS = {
+    "trade": ["tariff", "exports", "imports", "customs", "supply", "chain", "deficit", "quota"],
+    "energy": ["oil", "grid", "solar", "pipeline", "refinery", "turbine", "storage", "emissions"],
+    "markets": ["stocks", "bonds", "yield", "investors", "earnings", "index", "rally", "selloff"],
+    "policy": ["minister", "parliament", "regulation", "budget", "reform", "committee", "vote", "bill"],
+    "technology": ["chips", "software", "startup", "cloud", "semiconductor", "platform", "ai", "data"],
+    "health": ["hospital", "vaccine", "trial", "patients", "clinic", "drug", "outbreak", "insurance"],
+}
+FILLER = ["the", "a", "said", "on", "in", "after", "while", "report", "week", "officials",
+          "analysts", "expected", "new", "latest", "according", "to", "and", "with", "over"]
+
+_PATH_RE = re.compile(r"^/article/(\d+)$")
+
+
+def article_text(n, paragraphs=8, words_per_paragraph=90, seed=0):
+    """Headline and paragraphs of article `n`."""
+    rng = random.Random(seed * 1_000_003 + n)
+    topic = rng.choice(sorted(TOPICS))
+    vocabulary = TOPICS[topic]
+    headline = f"{topic.title()} update {n}: {' '.join(rng.sample(vocabulary, 3))}"
+    body = []
+    for _ in range(paragraphs):
+        words = [
+            rng.choice(vocabulary) if rng.random() < 0.3 else rng.choice(FILLER)
+            for _ in range(words_per_paragraph)
+        ]
+        body.append(" ".join(words).capitalize() + ".")
+    return headline, body
+
+
+def article_html(n, **options):
+    headline, body = article_text(n, **options)
+    paragraphs = "\n".join(f"<p>{text}</p>" for text in body)
+    return (
+        f"<html><head><title>{headline}</title></head><body>"
+        f"<nav><a href='/'>Home</a></nav><article><h1>{headline}</h1>\n{paragraphs}\n</article>"
+        f"<footer>Benchmark News</footer></body></html>"
+    )
+
+
+class ArticleServer:
+    """
+    Serve synthetic articles on 127.0.0.1 from a background thread. Use as a
+    context manager; `url(n)` is the address of article `n`.
+    """
+
+    def __init__(self, latency=0.0, port=0, **article_options):
+        self.latency = latency
+        self.article_options = article_options
+        self.requests = 0
+        self.not_modified = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = _PATH_RE.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                server.requests += 1
+                etag = f'"article-{match.group(1)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                payload = article_html(int(match.group(1)), **server.article_options).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def url(self, n):
+        return f"http://127.0.0.1:{self.port}/article/{n}"
+
+    def urls(self, count):
+        return [self.url(n) for n in range(count)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="article-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,100 @@
+"""
+Recall vs latency vs memory for the index types in `index_factory`.
+
+Builds every index type over the same synthetic, clustered corpus of
+normalized vectors, uses exact flat search as ground truth and reports
+recall@k, build time, single-query latency percentiles and serialized size.
+
+    python -m benchmarks.bench_index_types --vectors 50000 --dim 384
+    python -m benchmarks.bench_index_types --json results.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import index_factory
+
+
+def synthetic_corpus(n_vectors, dim, n_queries, n_clusters=200, noise=0.35, seed=0):
+    """Gaussian clusters on the unit sphere, roughly like topic-clustered text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, n_clusters, size=n)]
+        points = points + noise * rng.normal(size=(n, dim)).astype(np.float32)
+        points /= np.linalg.norm(points, axis=1, keepdims=True)
+        return np.ascontiguousarray(points, dtype=np.float32)
+
+    return sample(n_vectors), sample(n_queries)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def bench(index_type, vectors, queries, truth, k, nprobe, ef_search):
+    started = time.perf_counter()
+    index = index_factory.build_index(vectors, index_type, nprobe=nprobe, ef_search=ef_search)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found[i] = ids[0]
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "index_type": index_type,
+        "built_as": index_factory.index_kind(index),
+        "build_s": round(build_seconds, 3),
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "memory_mb": round(index_factory.memory_bytes(index) / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, default=index_factory.DEFAULT_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=index_factory.DEFAULT_EF_SEARCH)
+    parser.add_argument("--types", nargs="+", default=list(index_factory.INDEX_TYPES),
+                        choices=index_factory.INDEX_TYPES)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # the benchmark is about the index types, not the small-corpus fallback
+    index_factory.MIN_VECTORS = 0
+
+    vectors, queries = synthetic_corpus(args.vectors, args.dim, args.queries)
+    exact = index_factory.build_index(vectors, "flat")
+    _, truth = exact.search(queries, args.k)
+
+    results = [
+        bench(index_type, vectors, queries, truth, args.k, args.nprobe, args.ef_search)
+        for index_type in args.types
+    ]
+
+    columns = list(results[0])
+    print(" | ".join(f"{c:>11}" for c in columns))
+    for row in results:
+        print(" | ".join(f"{str(row[c]):>11}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
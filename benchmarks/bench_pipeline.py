@@ -0,0 +1,257 @@
+"""
+Offline end-to-end benchmark of the ingest and query pipeline.
+
+Articles come from a local HTTP server (`article_server`), embeddings and
+completions from deterministic fakes (`fakes`), so the run needs neither
+OpenAI nor the public web and is repeatable. For every corpus size each stage
+is timed on its own:
+
+    fetch       download the articles (url_loader)
+    parse_wN    parse and split them with N worker processes (parallel_parse),
+                once per --parse-workers value, with the speedup over the first
+    embed       embed the chunks through the streaming pipeline
+    build       write the vectors to an index and commit it
+    open        open the committed index cold
+    represent   pick the representative chunks suggested questions are drafted
+                from (representatives), with their total tokens
+    query       answer questions through the QA chain, one at a time, with the
+                average prompt tokens before and after context assembly
+    query_batch answer the same questions as one batch (research_pipeline.answer_many)
+
+and then once combined, through `research_pipeline.ingest` plus the same
+queries (`end_to_end`), and once more re-ingesting the same articles through
+the now warm page cache (`reingest`), which revalidates every page instead of
+downloading and parsing it.
+
+    python -m benchmarks.bench_pipeline --sizes 3 100 1000 10000
+    python -m benchmarks.bench_pipeline --sizes 2000 --parse-workers 1 2 4 8
+    python -m benchmarks.bench_pipeline --json after.json --compare before.json
+"""
+import argparse
+import json
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+import index_factory
+import index_store
+import ingest_pipeline
+import metrics
+import parallel_parse
+import representatives
+import research_pipeline
+import url_loader
+from benchmarks.article_server import TOPICS, ArticleServer
+from benchmarks.fakes import FakeEmbeddings, FakeLLM
+from mmap_store import MmapVectorStore
+from page_cache import PageCache
+
+
+def questions(count):
+    topics = sorted(TOPICS)
+    return [
+        f"What is the latest on {topics[i % len(topics)]} and {TOPICS[topics[i % len(topics)]][i % 8]}?"
+        for i in range(count)
+    ]
+
+
+def row(size, stage, seconds, items=None, latencies=None, **extra):
+    result = {"articles": size, "stage": stage, "seconds": round(seconds, 4)}
+    if items is not None:
+        result["items"] = items
+        result["items_per_s"] = round(items / seconds, 1) if seconds else None
+    if latencies:
+        latencies = np.array(latencies) * 1000
+        result["p50_ms"] = round(float(np.percentile(latencies, 50)), 3)
+        result["p95_ms"] = round(float(np.percentile(latencies, 95)), 3)
+    result.update(extra)
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - started
+
+
+def run_queries(index_dir, llm, embeddings, count):
+    latencies = []
+    prompt_tokens = {"prompt_tokens_before": 0, "prompt_tokens_after": 0}
+    for question in questions(count):
+        started = time.perf_counter()
+        result = research_pipeline.answer(question, index_dir, llm, embeddings_factory=lambda: embeddings)
+        latencies.append(time.perf_counter() - started)
+        if result is None:
+            # every article failed to load, so there is nothing to time
+            raise SystemExit(f"ingest produced no index in {index_dir}, cannot run queries")
+        for key in prompt_tokens:
+            prompt_tokens[key] += result["context"][key]
+    return latencies, {key: total // max(count, 1) for key, total in prompt_tokens.items()}
+
+
+def bench_stages(size, urls, args, llm, embeddings, workdir):
+    results = []
+
+    fetched, seconds = timed(lambda: list(url_loader.iter_load_urls(
+        urls, max_workers=args.load_workers, parse=False
+    )))
+    pages = [(r.url, r.html) for r in fetched if r.error is None]
+    results.append(row(size, "fetch", seconds, len(urls), failed=len(urls) - len(pages)))
+
+    baseline = None
+    for workers in args.parse_workers:
+        # pool start-up is paid once per process, not per batch
+        parallel_parse.warm_up(workers)
+        parsed, seconds = timed(lambda: list(
+            parallel_parse.iter_parse_and_split(pages, parallel_parse.SplitSettings(), workers)
+        ))
+        baseline = baseline or seconds
+        chunks = [chunk for p in parsed if p.ok for chunk in p.chunks]
+        results.append(row(size, f"parse_w{workers}", seconds, len(pages), chunks=len(chunks),
+                           speedup=round(baseline / seconds, 2) if seconds else None))
+
+    embedded, seconds = timed(lambda: list(ingest_pipeline.embed_stream(
+        chunks, embeddings, batch_size=args.batch_size, max_in_flight=args.max_in_flight
+    )))
+    results.append(row(size, "embed", seconds, len(chunks), calls=embeddings.calls))
+
+    index_dir = f"{workdir}/stages-{size}"
+
+    def build():
+        store = MmapVectorStore(index_dir, embeddings)
+        for batch, vectors in embedded:
+            store.add_embeddings(zip((d.page_content for d in batch), vectors),
+                                 metadatas=[d.metadata for d in batch])
+        store.commit(args.index_type)
+        store.close()
+
+    _, seconds = timed(build)
+    results.append(row(size, "build", seconds, len(chunks), index_type=args.index_type))
+
+    # the store was written directly; let index_store move it into a version first
+    index_store.get_vectorstore(index_dir, lambda: embeddings)
+    index_store.invalidate(index_dir)
+    _, seconds = timed(index_store.get_vectorstore, index_dir, lambda: embeddings)
+    results.append(row(size, "open", seconds))
+
+    vectorstore = index_store.get_vectorstore(index_dir, lambda: embeddings)
+    picked, seconds = timed(representatives.representative_chunks, vectorstore)
+    results.append(row(size, "represent", seconds, len(picked),
+                       prompt_tokens=sum(metrics.count_tokens(doc.page_content) for doc in picked)))
+
+    latencies, prompt_tokens = run_queries(index_dir, llm, embeddings, args.queries)
+    results.append(row(size, "query", sum(latencies), len(latencies), latencies, **prompt_tokens))
+
+    batch, seconds = timed(lambda: list(research_pipeline.answer_many(
+        questions(args.queries), index_dir, llm, concurrency=args.concurrency,
+        embeddings_factory=lambda: embeddings,
+    )))
+    results.append(row(size, "query_batch", seconds, len(batch), [s for _, _, s in batch],
+                       concurrency=args.concurrency))
+    index_store.clear_index(index_dir)
+    return results
+
+
+def bench_end_to_end(size, urls, args, llm, embeddings, workdir):
+    index_dir = f"{workdir}/e2e-{size}"
+    pages = PageCache(f"{workdir}/pages-{size}.sqlite3")
+
+    def ingest():
+        return research_pipeline.ingest(
+            urls, index_dir, embeddings=embeddings, keep_chunks=False, page_cache=pages,
+            workers=args.workers, batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+            index_type=args.index_type,
+        )
+
+    report, ingest_seconds = timed(ingest)
+    latencies, prompt_tokens = run_queries(index_dir, llm, embeddings, args.queries)
+    again, reingest_seconds = timed(ingest)
+    index_store.clear_index(index_dir)
+    return [
+        row(size, "end_to_end", ingest_seconds + sum(latencies), report.chunk_count, latencies,
+            ingest_s=round(ingest_seconds, 4), failed=len(report.failed), **prompt_tokens),
+        row(size, "reingest", reingest_seconds, again.chunk_count,
+            not_modified=again.page_cache["not_modified"],
+            speedup=round(ingest_seconds / reingest_seconds, 2) if reingest_seconds else None),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print each stage's time relative to the same stage in a saved run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["articles"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}")
+    for result in results:
+        before = baseline.get((result["articles"], result["stage"]))
+        if before and before["seconds"]:
+            ratio = result["seconds"] / before["seconds"]
+            print(f"{result['articles']:>7} {result['stage']:>11}  "
+                  f"{before['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 100, 1000, 10000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="seconds per embedding request")
+    parser.add_argument("--embed-per-text", type=float, default=0.0,
+                        help="extra seconds per embedded text")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--llm-tps", type=float, default=0.0, help="tokens per second, 0 = instant")
+    parser.add_argument("--server-latency", type=float, default=0.0, help="seconds per article request")
+    parser.add_argument("--load-workers", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=research_pipeline.ANSWER_CONCURRENCY,
+                        help="completions in flight in the query_batch stage")
+    parser.add_argument("--parse-workers", type=int, nargs="+", default=[1, parallel_parse.DEFAULT_WORKERS],
+                        help="worker process counts to time the parse stage with")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parse processes used by the end-to-end ingest (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=ingest_pipeline.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=ingest_pipeline.DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--index-type", default=index_factory.DEFAULT_INDEX_TYPE,
+                        choices=index_factory.INDEX_TYPES)
+    parser.add_argument("--skip-stages", action="store_true", help="only run the end-to-end pass")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    llm = FakeLLM(latency=args.llm_latency, tokens_per_second=args.llm_tps)
+    results = []
+    with ArticleServer(latency=args.server_latency) as server, tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            urls = server.urls(size)
+            if not args.skip_stages:
+                embeddings = FakeEmbeddings(args.dim, args.embed_latency, args.embed_per_text)
+                results.extend(bench_stages(size, urls, args, llm, embeddings, workdir))
+            embeddings = FakeEmbeddings(args.dim, args.embed_latency, args.embed_per_text)
+            results.extend(bench_end_to_end(size, urls, args, llm, embeddings, workdir))
+
+    columns = ["articles", "stage", "seconds", "items", "items_per_s", "p50_ms", "p95_ms"]
+    print(" | ".join(f"{c:>11}" for c in columns))
+    for result in results:
+        print(" | ".join(f"{str(result.get(c, '')):>11}" for c in columns))
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), "max_rss_mb": round(max_rss_mb, 1),
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
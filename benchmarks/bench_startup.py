@@ -0,0 +1,116 @@
+"""
+Startup and rerun latency of the Streamlit apps.
+
+    cold_import  a fresh interpreter importing the modules the app imports
+                 (median of --repeat runs), and which heavy dependencies that
+                 pulled in
+    first_run    the first execution of the app script in a process, imports
+                 included (streamlit's AppTest, no browser or server)
+    rerun        every later execution, as on each widget interaction
+
+Heavy dependencies (HEAVY_MODULES) should only be imported once a stage needs
+them. The run exits with status 1 if any of them is loaded at startup, so it
+can guard against regressions; `--max-rerun-ms` does the same for the median
+rerun.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --app main.py --reruns 20 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP_MODULES = {
+    "enhanced_main.py": ["streamlit", "dotenv", "index_store", "url_loader", "embedding_backends",
+                         "research_pipeline", "metrics", "answer_stream", "answer_cache", "precompute",
+                         "ingest_jobs"],
+    "main.py": ["streamlit", "dotenv", "index_store", "url_loader", "research_pipeline"],
+}
+HEAVY_MODULES = ["langchain_openai", "openai", "langchain_community", "unstructured",
+                 "langchain_text_splitters", "langchain.chains", "faiss", "sentence_transformers", "torch"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def cold_import(modules, repeat):
+    """Median seconds to import `modules` in a new interpreter, and the heavy modules loaded."""
+    code = _PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return statistics.median(r["seconds"] for r in runs), runs[-1]["heavy"]
+
+
+def script_runs(app, reruns, timeout):
+    """Seconds of the first run of `app` in this process and of each rerun after it."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=timeout)
+    timings = []
+    for _ in range(reruns + 1):
+        started = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(f"{app} raised: {at.exception[0].message}")
+    return timings[0], timings[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default="enhanced_main.py", choices=sorted(APP_MODULES))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters for cold_import")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--max-rerun-ms", type=float, help="fail if the median rerun is slower")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # the apps copy the key into the environment on every run
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    sys.path.insert(0, ROOT)
+
+    import_seconds, heavy = cold_import(APP_MODULES[args.app], args.repeat)
+    first_run, reruns = script_runs(args.app, args.reruns, args.timeout)
+    results = [
+        {"stage": "cold_import", "ms": round(import_seconds * 1000, 1), "heavy_loaded": heavy},
+        {"stage": "first_run", "ms": round(first_run * 1000, 1)},
+        {"stage": "rerun", "ms": round(statistics.median(reruns) * 1000, 1),
+         "max_ms": round(max(reruns) * 1000, 1), "runs": len(reruns)},
+    ]
+
+    for result in results:
+        extra = ", ".join(f"{key}={value}" for key, value in result.items() if key not in ("stage", "ms"))
+        print(f"{result['stage']:>11} {result['ms']:>9.1f} ms  {extra}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if args.max_rerun_ms and results[2]["ms"] > args.max_rerun_ms:
+        failures.append(f"median rerun {results[2]['ms']} ms > {args.max_rerun_ms} ms")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
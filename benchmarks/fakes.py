@@ -0,0 +1,94 @@
+"""
+Deterministic stand-ins for the OpenAI clients, for offline benchmarks.
+
+`FakeEmbeddings` hashes words into a fixed number of buckets, so texts that
+share words get similar vectors and retrieval behaves sensibly. `FakeLLM`
+echoes a canned completion. Both sleep for a configurable latency to model
+network round trips without making any.
+"""
+import hashlib
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized. Each `embed_documents` call
+    sleeps `latency + per_text_latency * len(texts)` seconds.
+    """
+
+    def __init__(self, dim=384, latency=0.0, per_text_latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.model = f"fake-hash-{dim}"
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        self.calls += 1
+        self.texts += len(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.vstack([self._vector(text) for text in texts])
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeLLM(LLM):
+    """
+    Returns a fixed-length answer after `latency` seconds, streamed at
+    `tokens_per_second`. Question-generation prompts get "Q:" lines back.
+    """
+
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _completion(self, prompt):
+        seed = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).hexdigest()
+        if "Q:" in prompt:
+            return "\n".join(
+                f"Q: What does benchmark article {seed}-{i} say about the topic?" for i in range(10)
+            )
+        return " ".join(f"token{seed}{i}" for i in range(self.answer_tokens))
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        text = self._completion(prompt)
+        time.sleep(self.latency)
+        if self.tokens_per_second:
+            time.sleep(len(text.split()) / self.tokens_per_second)
+        return text
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for word in self._completion(prompt).split(" "):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield GenerationChunk(text=word + " ")
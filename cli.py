@@ -0,0 +1,155 @@
+"""
+Batch command line interface to the research pipeline.
+
+    python cli.py ingest urls.txt --corpus markets --workers 4
+    python cli.py ask questions.txt --corpus markets --output answers.jsonl --concurrency 8
+
+`ingest` prints a JSON summary of the run. `ask` writes one JSON line per
+question with the answer, its sources, the prompt size and how long it took.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+import context_builder
+import dedup
+import embedding_backends
+import index_store
+import ingest_pipeline
+import research_pipeline
+import url_loader
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def index_dir(args):
+    return args.index_dir or index_store.corpus_dir(args.corpus)
+
+
+def cmd_ingest(args):
+    urls = url_loader.parse_url_list(read_lines(args.urls_file), limit=args.max_urls)
+    if not urls:
+        print("no URLs found in", args.urls_file, file=sys.stderr)
+        return 1
+
+    def progress(report):
+        print(f"\r{report.chunk_count} chunks embedded", end="", file=sys.stderr, flush=True)
+
+    report = research_pipeline.ingest(
+        urls, index_dir(args), backend=args.backend, incremental=args.incremental,
+        workers=args.workers, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+        keep_chunks=False, on_batch=progress,
+        deduplicate=not args.no_dedup, dedup_threshold=args.dedup_threshold,
+        batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+        page_cache=False if args.no_page_cache else None,
+    )
+    print(file=sys.stderr)
+    summary = {
+        "index_dir": index_dir(args),
+        "urls": report.urls,
+        "loaded": len(report.loaded),
+        "failed": [{"url": r.url, "error": r.error} for r in report.failed],
+        "chunks": report.chunk_count,
+        "added": report.added,
+        "removed": report.removed,
+        "embedding_cache": report.embedding_cache,
+        "page_cache": report.page_cache,
+        "dedup": report.dedup,
+        "seconds": round(report.seconds, 3),
+    }
+    print(json.dumps(summary, indent=2))
+    return 0 if report.loaded else 1
+
+
+def cmd_ask(args):
+    questions = [line.strip() for line in read_lines(args.questions_file).splitlines() if line.strip()]
+    if not questions:
+        print("no questions found in", args.questions_file, file=sys.stderr)
+        return 1
+
+    llm = research_pipeline.get_llm(temperature=args.temperature, max_tokens=args.max_tokens)
+    out = open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+    failures = 0
+    try:
+        results = research_pipeline.answer_many(questions, index_dir(args), llm, concurrency=args.concurrency,
+                                                token_budget=args.context_tokens)
+        for question, result, seconds in results:
+            record = {"question": question, "answer": None, "sources": [], "seconds": round(seconds, 3)}
+            if result is None:
+                record["error"] = f"no index in {index_dir(args)}"
+            elif isinstance(result, Exception):
+                record["error"] = str(result)
+            else:
+                record["answer"] = result["result"].strip()
+                record["sources"] = sorted({
+                    url for doc in result.get("source_documents", [])
+                    for url in doc.metadata.get("sources") or [doc.metadata.get("source", "")]
+                })
+                record["context"] = result["context"]
+            failures += "error" in record
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failures == len(questions) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Ingest articles and answer questions without Streamlit.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log pipeline progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="load, split, embed and index a list of URLs")
+    ingest.add_argument("urls_file", help="text or CSV file with one URL per line")
+    ingest.add_argument("--corpus", default=index_store.DEFAULT_CORPUS)
+    ingest.add_argument("--index-dir", help="corpus directory, overrides --corpus")
+    ingest.add_argument("--backend", choices=embedding_backends.BACKENDS, default="openai")
+    ingest.add_argument("--incremental", action="store_true",
+                        help="add to the existing index instead of replacing it")
+    ingest.add_argument("--workers", type=int, default=None,
+                        help="processes used to parse and split articles (default: one per core)")
+    ingest.add_argument("--chunk-size", type=int, default=research_pipeline.CHUNK_SIZE)
+    ingest.add_argument("--chunk-overlap", type=int, default=research_pipeline.CHUNK_OVERLAP)
+    ingest.add_argument("--no-dedup", action="store_true", help="embed near-duplicate chunks too")
+    ingest.add_argument("--dedup-threshold", type=float, default=dedup.DEFAULT_THRESHOLD,
+                        help="estimated Jaccard similarity above which chunks are merged")
+    ingest.add_argument("--no-page-cache", action="store_true",
+                        help="download and parse every page even if it is unchanged since the last run")
+    ingest.add_argument("--max-urls", type=int, default=url_loader.MAX_URLS)
+    ingest.add_argument("--batch-size", type=int, default=ingest_pipeline.DEFAULT_BATCH_SIZE)
+    ingest.add_argument("--max-in-flight", type=int,
+                        default=ingest_pipeline.DEFAULT_MAX_IN_FLIGHT)
+    ingest.set_defaults(func=cmd_ingest)
+
+    ask = commands.add_parser("ask", help="answer a file of questions, one per line")
+    ask.add_argument("questions_file")
+    ask.add_argument("--corpus", default=index_store.DEFAULT_CORPUS)
+    ask.add_argument("--index-dir", help="corpus directory, overrides --corpus")
+    ask.add_argument("--output", default="answers.jsonl", help="JSONL output file, or - for stdout")
+    ask.add_argument("--concurrency", type=int, default=research_pipeline.ANSWER_CONCURRENCY,
+                     help="completions in flight; retrieval runs once for all questions")
+    ask.add_argument("--temperature", type=float, default=0.8)
+    ask.add_argument("--max-tokens", type=int, default=600)
+    ask.add_argument("--context-tokens", type=int, default=context_builder.DEFAULT_TOKEN_BUDGET,
+                     help="token budget for the retrieved context in each prompt")
+    ask.set_defaults(func=cmd_ask)
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Token-budgeted context for the QA prompt.
+
+The default "stuff" chain pastes the top 4 chunks into the prompt as they
+are. Consecutive chunks of an article share `chunk_overlap` characters, so
+the same sentences are often sent twice, and near-identical chunks crowd out
+other evidence. `assemble` instead:
+
+    1. retrieves FETCH_K candidates together with their stored vectors,
+    2. orders them by maximal marginal relevance (MMR), dropping candidates
+       that are nearly identical to one already picked,
+    3. merges overlapping and adjacent chunks of the same article into one
+       passage, and
+    4. takes candidates in that order for as long as the merged context fits
+       the token budget (CONTEXT_TOKEN_BUDGET, default 800).
+
+The returned `Context` reports the prompt size the plain top-k context would
+have had next to the size of the assembled one.
+"""
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+import metrics
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+DEFAULT_K = 4  # chunks the plain "stuff" context uses
+FETCH_K = 12
+MMR_LAMBDA = 0.7  # 1 ranks by relevance only, 0 by diversity only
+REDUNDANT_SIMILARITY = 0.97  # cosine similarity above which a candidate adds nothing
+MAX_GAP = 2  # characters between two chunks that still count as adjacent
+MIN_OVERLAP = 40  # shortest shared text that counts as overlap when positions are unknown
+SEPARATOR = "\n\n"  # how the stuff chain joins documents
+
+
+@dataclass
+class Context:
+    documents: list = field(default_factory=list)
+    candidates: int = 0
+    chunks_used: int = 0
+    prompt_tokens_before: int = 0
+    prompt_tokens_after: int = 0
+
+    @property
+    def text(self):
+        return join(self.documents)
+
+    def report(self):
+        return {
+            "candidates": self.candidates,
+            "chunks_used": self.chunks_used,
+            "passages": len(self.documents),
+            "prompt_tokens_before": self.prompt_tokens_before,
+            "prompt_tokens_after": self.prompt_tokens_after,
+        }
+
+
+def join(documents):
+    return SEPARATOR.join(doc.page_content for doc in documents)
+
+
+def prompt_tokens(documents, question):
+    from langchain.chains.retrieval_qa.prompt import PROMPT
+
+    return metrics.count_tokens(PROMPT.format(context=join(documents), question=question))
+
+
+def mmr_order(query, vectors, lambda_mult=MMR_LAMBDA, redundant=REDUNDANT_SIMILARITY):
+    """
+    Indices of `vectors` in maximal marginal relevance order, leaving out
+    those nearly identical to an earlier pick.
+    """
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    closest = np.zeros(len(vectors))  # highest similarity to anything picked so far
+    remaining = list(range(len(vectors)))
+    order = []
+    while remaining:
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * closest[remaining]
+        best = remaining.pop(int(np.argmax(scores)))
+        if order and closest[best] >= redundant:
+            continue
+        order.append(best)
+        closest = np.maximum(closest, similarity[best])
+    return order
+
+
+def _overlap(a, b):
+    """Length of the longest suffix of `a` that `b` starts with, if at least MIN_OVERLAP, else 0."""
+    head = b[:MIN_OVERLAP]
+    if len(head) < MIN_OVERLAP:
+        return 0
+    i = a.find(head)
+    while i != -1:
+        if b.startswith(a[i:]):
+            return len(a) - i
+        i = a.find(head, i + 1)
+    return 0
+
+
+class _Passage:
+    def __init__(self, doc, rank):
+        self.text = doc.page_content
+        self.metadata = doc.metadata
+        self.source = doc.metadata.get("source")
+        self.start = doc.metadata.get("start_index")
+        self.rank = rank
+        self.chunks = 1
+        self.sources = list(doc.metadata.get("sources") or ([self.source] if self.source else []))
+
+    def merge(self, other):
+        """Fold `other` into this passage if both are one stretch of the same article."""
+        if self.source is None or other.source != self.source:
+            return False
+        if self.start is not None and other.start is not None:
+            first, second = sorted((self, other), key=lambda p: p.start)
+            first_end = first.start + len(first.text)
+            if second.start > first_end + MAX_GAP:
+                return False
+            if second.start > first_end:
+                text = first.text + " " + second.text
+            else:
+                text = first.text + second.text[first_end - second.start:]
+            start = first.start
+        else:
+            # indexed before chunk positions were recorded: look for the shared text
+            if other.text in self.text:
+                text = self.text
+            elif self.text in other.text:
+                text = other.text
+            elif _overlap(self.text, other.text):
+                text = self.text + other.text[_overlap(self.text, other.text):]
+            elif _overlap(other.text, self.text):
+                text = other.text + self.text[_overlap(other.text, self.text):]
+            else:
+                return False
+            start = None
+
+        if other.rank < self.rank:
+            self.metadata = other.metadata
+        self.text, self.start = text, start
+        self.rank = min(self.rank, other.rank)
+        self.chunks += other.chunks
+        self.sources += [source for source in other.sources if source not in self.sources]
+        return True
+
+    def document(self):
+        metadata = dict(self.metadata, sources=self.sources, chunks=self.chunks)
+        metadata.pop("start_index", None)
+        if self.start is not None:
+            metadata["start_index"] = self.start
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def merge_chunks(docs):
+    """
+    Merge chunks of the same article that overlap or follow each other into
+    single passages. `docs` are best first; passages keep the rank of their
+    best chunk.
+    """
+    passages = []
+    for rank, doc in enumerate(docs):
+        passage = _Passage(doc, rank)
+        merged = True
+        while merged:  # a chunk can bridge two passages
+            merged = False
+            for other in passages:
+                if passage.merge(other):
+                    passages.remove(other)
+                    merged = True
+                    break
+        passages.append(passage)
+    return [p.document() for p in sorted(passages, key=lambda p: p.rank)]
+
+
+def pack(docs, token_budget):
+    """
+    Take `docs` (best first) while their merged passages fit in
+    `token_budget` tokens. Returns the passages and the number of chunks used.
+    """
+    chosen, passages = [], []
+    for doc in docs:
+        trial = merge_chunks(chosen + [doc])
+        if metrics.count_tokens(join(trial)) <= token_budget:
+            chosen, passages = chosen + [doc], trial
+    if docs and not chosen:
+        # even the best chunk is over budget: send its beginning
+        best = docs[0]
+        truncated = Document(page_content=metrics.truncate_tokens(best.page_content, token_budget),
+                             metadata=best.metadata)
+        return merge_chunks([truncated]), 1
+    return passages, len(chosen)
+
+
+def embed_questions(embeddings, questions):
+    """Embed `questions` in a single request."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(questions)
+    return np.asarray(embeddings.embed_documents(list(questions)), dtype=np.float32)
+
+
+def assemble(vectorstore, question, query_embedding=None, token_budget=None, k=DEFAULT_K,
+             fetch_k=FETCH_K, lambda_mult=MMR_LAMBDA):
+    """Build the context for `question` from `vectorstore` (an `MmapVectorStore`)."""
+    if query_embedding is None:
+        query_embedding = vectorstore.embeddings.embed_query(question)
+    hits = vectorstore.similarity_search_with_vectors(query_embedding, k=max(k, fetch_k))
+    return _build(question, query_embedding, hits, token_budget, k, lambda_mult)
+
+
+def assemble_many(vectorstore, questions, query_embeddings=None, token_budget=None, k=DEFAULT_K,
+                  fetch_k=FETCH_K, lambda_mult=MMR_LAMBDA):
+    """
+    `assemble` for a list of questions: one embedding request and one index
+    search for all of them. Returns one Context per question, in order.
+    """
+    questions = list(questions)
+    if not questions:
+        return []
+    if query_embeddings is None:
+        query_embeddings = embed_questions(vectorstore.embeddings, questions)
+    batches = vectorstore.similarity_search_with_vectors_batch(query_embeddings, k=max(k, fetch_k))
+    return [
+        _build(question, embedding, hits, token_budget, k, lambda_mult)
+        for question, embedding, hits in zip(questions, query_embeddings, batches)
+    ]
+
+
+def _build(question, query_embedding, hits, token_budget, k, lambda_mult):
+    if token_budget is None:
+        token_budget = DEFAULT_TOKEN_BUDGET
+    context = Context(candidates=len(hits))
+    if hits:
+        docs = [doc for doc, _, _ in hits]
+        order = mmr_order(np.asarray(query_embedding, dtype=np.float32),
+                          np.vstack([vector for _, _, vector in hits]), lambda_mult)
+        context.documents, context.chunks_used = pack([docs[i] for i in order], token_budget)
+        context.prompt_tokens_before = prompt_tokens(docs[:k], question)
+    else:
+        context.prompt_tokens_before = prompt_tokens([], question)
+    context.prompt_tokens_after = prompt_tokens(context.documents, question)
+    return context
+
+
+class ContextRetriever(BaseRetriever):
+    """Retriever that returns `assemble`'s passages, for `RetrievalQA`."""
+
+    vectorstore: VectorStore
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+    k: int = DEFAULT_K
+    fetch_k: int = FETCH_K
+
+    def assemble(self, question, query_embedding=None):
+        return assemble(self.vectorstore, question, query_embedding, self.token_budget, self.k, self.fetch_k)
+
+    def assemble_many(self, questions, query_embeddings=None):
+        return assemble_many(self.vectorstore, questions, query_embeddings, self.token_budget, self.k,
+                             self.fetch_k)
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.assemble(query).documents
@@ -0,0 +1,154 @@
+"""
+Near-duplicate chunk elimination with MinHash and LSH banding.
+
+Syndicated wire stories show up nearly verbatim on many sites, so the same
+paragraph arrives as several chunks that differ only in a byline or a
+trailing link. `NearDuplicateFilter` sits between splitting and embedding:
+the first chunk of each near-duplicate group is kept and every later one is
+folded into it, adding its URL to the kept chunk's `metadata["sources"]`.
+
+Each chunk is reduced to a MinHash signature over its word shingles. The
+signature is cut into bands; chunks that share any band are candidates, and
+a candidate counts as a duplicate when the signatures agree on at least
+`threshold` of their positions (an estimate of the Jaccard similarity of the
+shingle sets).
+"""
+import hashlib
+import re
+import uuid
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 128
+BANDS = 16  # 8 rows per band: pairs above ~0.7 similarity almost always collide
+SHINGLE_SIZE = 3
+
+_WORD_RE = re.compile(r"\w+")
+_SHIFT = np.uint64(32)
+
+
+def _permutations(num_perm, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateFilter:
+    """
+    Streaming near-duplicate filter over chunk Documents. Use `filter(chunks)`
+    as a generator; only the first chunk of each near-duplicate group is
+    yielded. Kept chunks get an `id` so their merged `sources` can be written
+    back after they were indexed (see `merged_metadata`). Only ids, metadata
+    and signatures are retained, not the chunk text.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._a, self._b = _permutations(num_perm)
+        self._buckets = [{} for _ in range(bands)]  # band -> {band hash: [kept positions]}
+        self._signatures = []
+        self._kept = []
+        self._positions = {}  # kept chunk id -> index into _kept
+        self._merged = set()
+        self.chunks_in = 0
+        self.duplicates = 0
+        self.saved_text_bytes = 0
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+             for s in shingles(text)),
+            dtype=np.uint64,
+        )
+        # multiply-shift hashing: (a*x + b) mod 2**64, keep the high 32 bits
+        return ((hashes[:, None] * self._a + self._b) >> _SHIFT).min(axis=0).astype(np.uint32)
+
+    def _find(self, signature, band_keys):
+        seen = set()
+        for band, key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, doc):
+        """
+        Register `doc`. Returns the id of the kept chunk it duplicates, or
+        None if `doc` is new and should be indexed.
+        """
+        self.chunks_in += 1
+        signature = self.signature(doc.page_content)
+        band_keys = [
+            hash(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+        match = self._find(signature, band_keys)
+        if match is not None:
+            kept_id, metadata = self._kept[match]
+            sources = metadata["sources"]
+            source = doc.metadata.get("source")
+            if source is not None and source not in sources:
+                sources.append(source)
+            self._merged.add(match)
+            self.duplicates += 1
+            self.saved_text_bytes += len(doc.page_content.encode("utf-8"))
+            return kept_id
+
+        position = len(self._kept)
+        for band, key in enumerate(band_keys):
+            # every kept chunk stays a candidate, even if an unrelated one got the bucket first
+            self._buckets[band].setdefault(key, []).append(position)
+        self._signatures.append(signature)
+        source = doc.metadata.get("source")
+        doc.metadata["sources"] = [source] if source is not None else []
+        if not getattr(doc, "id", None):
+            doc.id = uuid.uuid4().hex
+        self._positions[doc.id] = len(self._kept)
+        self._kept.append((doc.id, doc.metadata))
+        return None
+
+    def filter(self, chunks):
+        """Yield only the chunks that are not near-duplicates of an earlier one."""
+        for doc in chunks:
+            if self.add(doc) is None:
+                yield doc
+
+    def merged_metadata(self):
+        """{chunk id: metadata} of the kept chunks that absorbed duplicates."""
+        return dict(self._kept[i] for i in sorted(self._merged))
+
+    def metadata(self, ids):
+        """{chunk id: metadata} of the kept chunks among `ids`, with every source merged so far."""
+        return {doc_id: self._kept[self._positions[doc_id]][1] for doc_id in ids if doc_id in self._positions}
+
+    def stats(self, dim=None):
+        """
+        Counts of chunks seen, kept and dropped. With the vector dimension,
+        also the index space saved: vector bytes plus stored text.
+        """
+        stats = {
+            "chunks": self.chunks_in,
+            "kept": self.chunks_in - self.duplicates,
+            "duplicates": self.duplicates,
+            "embeddings_saved": self.duplicates,
+            "text_bytes_saved": self.saved_text_bytes,
+        }
+        if dim:
+            stats["index_bytes_saved"] = self.duplicates * dim * 4 + self.saved_text_bytes
+        return stats
@@ -0,0 +1,119 @@
+"""
+Selectable embedding backends.
+
+    openai  OpenAIEmbeddings, one network round trip per batch and per query
+    local   sentence-transformers on CPU, fully offline
+
+Every index records the backend and model that built it in BACKEND_FILE.
+Queries are embedded with that same backend, and adding vectors from a
+different backend to an existing index is refused, since vectors from two
+models are not comparable.
+"""
+import functools
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import model_name_of
+
+BACKENDS = ("openai", "local")
+BACKEND_FILE = "embedding_backend.txt"
+
+DEFAULT_LOCAL_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DEFAULT_LOCAL_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+DEFAULT_LOCAL_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0")) or None
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers model run on CPU. Vectors come back as L2-normalized
+    float32 NumPy arrays, ready for FAISS without any conversion.
+
+    `num_threads` sets torch's intra-op thread count, which is process-wide.
+    """
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, batch_size=DEFAULT_LOCAL_BATCH_SIZE,
+                 num_threads=DEFAULT_LOCAL_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts):
+        vectors = self._model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self.encode(texts)
+
+    def embed_query(self, text):
+        return self.encode([text])[0]
+
+
+@functools.lru_cache(maxsize=None)
+def get_embeddings(backend="openai", model_name=None):
+    """Return the process-wide embeddings client for `backend`."""
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=model_name) if model_name else OpenAIEmbeddings()
+    if backend == "local":
+        return LocalEmbeddings(model_name or DEFAULT_LOCAL_MODEL)
+    raise ValueError(f"unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+
+
+def backend_id(embeddings):
+    """Identify the backend and model of `embeddings`, e.g. "local:all-MiniLM-L6-v2"."""
+    # look through wrappers such as CachedEmbeddings
+    embeddings = getattr(embeddings, "embeddings", embeddings)
+    if isinstance(embeddings, LocalEmbeddings):
+        return f"local:{embeddings.model_name}"
+    if type(embeddings).__module__.startswith("langchain_openai"):
+        return f"openai:{embeddings.model}"
+    return f"{type(embeddings).__name__}:{model_name_of(embeddings)}"
+
+
+def read_backend(index_dir):
+    try:
+        with open(os.path.join(index_dir, BACKEND_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_backend(index_dir, embeddings):
+    with open(os.path.join(index_dir, BACKEND_FILE), "w", encoding="utf-8") as f:
+        f.write(backend_id(embeddings))
+
+
+def check_backend(index_dir, embeddings):
+    """Raise ValueError if `index_dir` was built with a different backend."""
+    recorded = read_backend(index_dir)
+    if recorded is not None and recorded != backend_id(embeddings):
+        raise ValueError(
+            f"index {index_dir!r} was built with {recorded}; "
+            f"rebuild it instead of adding {backend_id(embeddings)} vectors"
+        )
+
+
+def for_index(index_dir):
+    """
+    Embeddings matching the backend recorded for `index_dir`. Indexes built
+    before the backend was recorded are OpenAI indexes.
+    """
+    recorded = read_backend(index_dir)
+    if recorded is None:
+        return get_embeddings("openai")
+    backend, _, model_name = recorded.partition(":")
+    return get_embeddings(backend, model_name or None)
@@ -0,0 +1,255 @@
+"""
+Persistent, content-addressed cache for chunk embeddings.
+
+Chunks are keyed by a BLAKE2b digest of the embedding model name and the chunk
+text, so re-analyzing the same articles never pays for the same vector twice.
+Only cache misses are sent to the wrapped embedding backend.
+
+On-disk layout (one directory per model):
+    meta.bin     magic, vector dimension and slot capacity
+    vectors.f32  memory-mapped float32 matrix, one row per slot
+    keys.bin     16-byte digest per slot
+    ticks.bin    uint64 last-use counter per slot (0 = empty)
+    generation   uint64 bumped by every write
+    .lock        file lock shared by every process using the cache
+
+When every slot is taken, the least recently used tenth of the cache is
+evicted in one go, which keeps the file size bounded by `max_entries`.
+
+Several processes (both apps, the CLI) may share one cache directory. Lookups
+take the file lock shared and writes take it exclusively, and each instance
+re-reads the slot table from keys.bin / ticks.bin whenever another process
+has written since it last looked, so no two instances hand out the same slot.
+"""
+import hashlib
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: only instances in this process are kept consistent
+    fcntl = None
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+DEFAULT_MAX_ENTRIES = 200_000
+
+_MAGIC = b"EMBC0001"
+_META = struct.Struct("<8sII")
+_GENERATION = struct.Struct("<Q")
+
+
+def model_name_of(embeddings):
+    """Best-effort identifier of the model behind an embeddings object."""
+    for attr in ("model", "model_name"):
+        name = getattr(embeddings, attr, None)
+        if name:
+            return str(name)
+    return type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain `Embeddings` and serves repeated chunks from disk.
+    Document embeddings come back as a float32 matrix; query embeddings are
+    passed straight through.
+    """
+
+    def __init__(self, embeddings, cache_dir=DEFAULT_CACHE_DIR,
+                 max_entries=DEFAULT_MAX_ENTRIES, model_name=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or model_name_of(embeddings)
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model_name))
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._keys = None
+        self._ticks = None
+        self._slots = {}
+        self._free = []
+        self._tick = 0
+        self._generation = None  # generation the slot table was read at
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_file = open(self._file(".lock"), "a")
+        with self._locked(exclusive=False):
+            pass  # reads the slot table
+
+    # -- public API ---------------------------------------------------------
+
+    def embed_documents(self, texts):
+        """Return a float32 matrix with one row per text."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys = [self._key(text) for text in texts]
+        missing = {}
+        hit_positions = []
+        hit_slots = []
+
+        with self._locked(exclusive=False):
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    hit_positions.append(i)
+                    hit_slots.append(slot)
+                    self._touch(slot)
+            cached = self._vectors[hit_slots] if hit_slots else None
+
+        vectors = None
+        if missing:
+            miss_keys = list(missing)
+            vectors = np.asarray(
+                self.embeddings.embed_documents([texts[missing[k][0]] for k in miss_keys]),
+                dtype=np.float32,
+            )
+            with self._locked(exclusive=True):
+                self._store(miss_keys, vectors)
+
+        dim = cached.shape[1] if cached is not None else vectors.shape[1]
+        results = np.empty((len(texts), dim), dtype=np.float32)
+        if cached is not None:
+            results[hit_positions] = cached
+        if vectors is not None:
+            for key, vector in zip(miss_keys, vectors):
+                results[missing[key]] = vector
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return results
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts):
+        """Embed several queries in one request. Queries are not cached, like `embed_query`."""
+        return np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._slots),
+            "capacity": self.max_entries,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    # -- storage ------------------------------------------------------------
+
+    def _key(self, text):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Hold the thread lock and the cache's file lock, with the slot table up to date."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                generation = self._read_generation()
+                if generation != self._generation:
+                    self._open_existing()
+                    self._generation = generation
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_generation(self):
+        try:
+            with open(self._file("generation"), "rb") as f:
+                return _GENERATION.unpack(f.read(_GENERATION.size))[0]
+        except (FileNotFoundError, struct.error):
+            return 0
+
+    def _bump_generation(self):
+        """Tell other instances to re-read the slot table. Call with the exclusive lock held."""
+        self._generation = self._read_generation() + 1
+        tmp = self._file("generation.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_GENERATION.pack(self._generation))
+        os.replace(tmp, self._file("generation"))
+
+    def _open_existing(self):
+        self._vectors = self._keys = self._ticks = None
+        self._slots, self._free, self._tick = {}, [], 0
+        try:
+            with open(self._file("meta.bin"), "rb") as f:
+                magic, dim, capacity = _META.unpack(f.read(_META.size))
+        except (FileNotFoundError, struct.error):
+            return
+        if magic != _MAGIC or capacity != self.max_entries:
+            # unknown format or a different size bound: start over
+            return
+        self._map(dim, capacity, mode="r+")
+        used = np.flatnonzero(self._ticks)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in used}
+        self._free = np.flatnonzero(self._ticks == 0)[::-1].tolist()
+        self._tick = int(self._ticks.max()) if len(used) else 0
+
+    def _create(self, dim):
+        with open(self._file("meta.bin"), "wb") as f:
+            f.write(_META.pack(_MAGIC, dim, self.max_entries))
+        self._map(dim, self.max_entries, mode="w+")
+        self._slots = {}
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._tick = 0
+
+    def _map(self, dim, capacity, mode):
+        self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32,
+                                  mode=mode, shape=(capacity, dim))
+        self._keys = np.memmap(self._file("keys.bin"), dtype=np.uint8,
+                               mode=mode, shape=(capacity, 16))
+        self._ticks = np.memmap(self._file("ticks.bin"), dtype=np.uint64,
+                                mode=mode, shape=(capacity,))
+
+    def _touch(self, slot):
+        self._tick += 1
+        self._ticks[slot] = self._tick
+
+    def _evict(self):
+        count = max(1, self.max_entries // 10)
+        victims = np.argpartition(self._ticks, count - 1)[:count]
+        for slot in victims:
+            self._slots.pop(self._keys[slot].tobytes(), None)
+            self._ticks[slot] = 0
+            self._free.append(int(slot))
+
+    def _store(self, keys, vectors):
+        if len(vectors) == 0:
+            return
+        if self._vectors is None or self._vectors.shape[1] != len(vectors[0]):
+            self._create(len(vectors[0]))
+        for key, vector in zip(keys, vectors):
+            slot = self._slots.get(key)
+            if slot is None:
+                if not self._free:
+                    self._evict()
+                slot = self._free.pop()
+                self._slots[key] = slot
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._vectors[slot] = vector
+            self._touch(slot)
+        self._vectors.flush()
+        self._keys.flush()
+        self._ticks.flush()
+        self._bump_generation()
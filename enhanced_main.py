@@ -1,13 +1,16 @@
 import os
+import uuid
 import streamlit as st
-from langchain.chains.retrieval_qa.base import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredURLLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_openai import OpenAI
 from dotenv import load_dotenv
-import random
+import index_store
+import url_loader
+import embedding_backends
+import research_pipeline
+import metrics
+from answer_stream import AnswerStream
+from answer_cache import AnswerCache
+from precompute import AnswerPrecomputer
+from ingest_jobs import ACTIVE_STATES, IngestJobs
 
 load_dotenv()
 # Set the OpenAI API key
@@ -107,6 +110,24 @@ if 'selected_question' not in st.session_state:
     st.session_state.selected_question = None
 if 'show_analysis' not in st.session_state:
     st.session_state.show_analysis = False
+if 'show_all_analysis' not in st.session_state:
+    st.session_state.show_all_analysis = False
+if 'embedding_cache_stats' not in st.session_state:
+    st.session_state.embedding_cache_stats = None
+if 'answer_timings' not in st.session_state:
+    st.session_state.answer_timings = []
+if 'ingest_metrics' not in st.session_state:
+    st.session_state.ingest_metrics = None
+if 'query_metrics' not in st.session_state:
+    st.session_state.query_metrics = None
+if 'corpus' not in st.session_state:
+    # every browser session starts on its own corpus so it never replaces another session's index;
+    # after a page refresh the URL brings back the corpus and the analysis job being watched
+    st.session_state.corpus = st.query_params.get("corpus") or f"{index_store.SESSION_PREFIX}{uuid.uuid4().hex[:8]}"
+    # corpora of sessions that were closed long ago
+    index_store.collect_idle_corpora()
+if 'ingest_job' not in st.session_state:
+    st.session_state.ingest_job = st.query_params.get("job")
 
 # Collapsible documentation section
 with st.expander("📚 How to Use This Tool", expanded=False):
@@ -115,7 +136,7 @@ with st.expander("📚 How to Use This Tool", expanded=False):
     with col1:
         st.markdown("""
         ### 🚀 Getting Started
-        1. **Add URLs**: Enter up to 3 article URLs in the input section
+        1. **Add URLs**: Paste article URLs (one per line) or upload a list
         2. **Process Content**: Click the "Analyze Content" button
         3. **Explore Questions**: Review AI-generated questions
         4. **Get Insights**: Click on any question to see detailed analysis
@@ -142,126 +163,276 @@ with st.expander("📚 How to Use This Tool", expanded=False):
 # Main content area with tabs
 tab1, tab2, tab3 = st.tabs(["📝 Content Input", "🧠 AI Analysis", "❓ Custom Questions"])
 
-llm = OpenAI(temperature=0.8, max_tokens=600)
-index_dir = "embeddings_folder"
+def get_llm():
+    # created on first use and shared by every rerun and session; most reruns never need it
+    return research_pipeline.get_llm(temperature=0.8, max_tokens=600)
 
-def generate_suggested_questions(docs, sample_size=8):
-    """
-    Generate suggested questions based on processed document chunks.
-    Improved version with better content validation and general topic focus.
-    """
-    if not docs:
-        return []
-    
-    try:
-        # Use more documents for better content coverage
-        sample_docs = random.sample(docs, min(sample_size, len(docs)))
-        
-        # Combine sample documents with longer text for better context
-        combined_text = "\n\n".join([doc.page_content[:800] for doc in sample_docs])
-        
-        # Store processed content for debugging
-        st.session_state.processed_content = combined_text[:1500]
-        
-        # Improved general-purpose question generation prompt
-        question_prompt = f"""
-        Based on the following news content, generate 10 specific, insightful questions that would be valuable for understanding and analyzing the topics discussed. Focus on questions about:
-        - Key events and developments mentioned
-        - Policy implications and impacts
-        - Economic and business implications
-        - Stakeholder perspectives and reactions
-        - Future outlook and predictions
-        - Cause-and-effect relationships
-        - Comparative analysis with similar situations
-        
-        Content to analyze:
-        {combined_text}
-        
-        Requirements:
-        - Generate exactly 10 questions, each on a new line starting with "Q:"
-        - Make questions specific to the actual content provided
-        - Focus on the main topics, companies, countries, policies, or events mentioned in the text
-        - Avoid generic questions - be specific to what's actually discussed
-        - Questions should help readers gain deeper insights into the topics covered
-        """
-        
-        # Generate questions using the existing LLM
-        response = llm.invoke(question_prompt)
-        
-        # Parse questions from response
-        questions = []
-        lines = response.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Q:'):
-                question = line[2:].strip()
-                if question and len(question) > 15:
-                    questions.append(question)
-        
-        # Ensure we have exactly 6 questions
-        if len(questions) < 10:
-            content_lower = combined_text.lower()
-            default_questions = []
-            
-            if 'trade' in content_lower or 'tariff' in content_lower:
-                default_questions.extend([
-                    "What are the main trade issues discussed in the articles?",
-                    "How might these trade developments affect the economies involved?"
-                ])
-            if 'policy' in content_lower or 'government' in content_lower:
-                default_questions.extend([
-                    "What policy changes or decisions are highlighted?",
-                    "What are the potential impacts of these policy decisions?"
-                ])
-            if 'company' in content_lower or 'business' in content_lower:
-                default_questions.extend([
-                    "Which companies or sectors are most affected by these developments?",
-                    "What are the business implications of the events discussed?"
-                ])
-            
-            if not default_questions:
-                default_questions = [
-                    "What are the key developments discussed in these articles?",
-                    "Who are the main stakeholders affected by these events?",
-                    "What are the potential future implications of these developments?",
-                    "How do these events compare to similar situations in the past?",
-                    "What are the different perspectives on these issues?",
-                    "What challenges and opportunities are identified in the content?"
-                ]
-            
-            questions.extend(default_questions[:10-len(questions)])
-        
-        return questions[:10]
-    
-    except Exception as e:
-        st.error(f"Error generating questions: {str(e)}")
-        return [
-            "What are the main topics and events discussed in the articles?",
-            "Who are the key stakeholders or entities mentioned?",
-            "What are the potential implications of the developments discussed?",
-            "What challenges or issues are highlighted in the content?",
-            "How might these events affect different sectors or regions?",
-            "What are the different viewpoints or reactions mentioned in the articles?"
-        ]
+@st.cache_resource
+def get_answer_cache():
+    # persistent answers, keyed by index version and normalized question
+    return AnswerCache()
+
+@st.cache_resource
+def get_precomputer():
+    # background workers answering suggested questions ahead of the clicks
+    return AnswerPrecomputer(get_answer_cache())
+
+with st.sidebar:
+    st.markdown("### 📚 Corpus")
+    st.text_input(
+        "Corpus name",
+        key="corpus",
+        help="Each corpus has its own index. Use the same name in another session to share it."
+    )
+    other_corpora = [name for name in index_store.list_corpora() if name != index_store.corpus_name(st.session_state.corpus)]
+    if other_corpora:
+        st.caption("Existing: " + ", ".join(other_corpora))
+
+index_dir = index_store.corpus_dir(st.session_state.corpus)
+st.query_params["corpus"] = st.session_state.corpus
+if st.session_state.get("active_index_dir") != index_dir:
+    # switched corpus: analysis state belongs to the previous one
+    st.session_state.active_index_dir = index_dir
+    st.session_state.suggested_questions = []
+    st.session_state.selected_question = None
+    st.session_state.show_analysis = False
+    st.session_state.show_all_analysis = False
+    st.session_state.chunks_processed = index_store.index_exists(index_dir)
 
 # Run custom query analysis
 def run_question_analysis(question):
     """
     Run a question through the QA chain and return results.
     """
-    if os.path.exists(index_dir):
-        embeddings = OpenAIEmbeddings()
-        vectorstore = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
-        
-        chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=vectorstore.as_retriever(),
-            return_source_documents=True
-        )
+    return research_pipeline.answer(question, index_dir, get_llm())
+
+def render_sources(sources):
+    if sources:
+        st.markdown("**📚 Sources:**")
+        unique_urls = set()
+        for source in sources:
+            # deduplicated chunks list every URL they appeared at
+            for url in source.metadata.get("sources") or [source.metadata.get("source", "Unknown Source")]:
+                if url not in unique_urls:
+                    st.markdown(f"""
+                    <div class="source-link">
+                        📄 <a href="{url}" target="_blank">{url}</a>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    unique_urls.add(url)
+
+def render_streamed_answer(stream):
+    """
+    Show the sources as soon as retrieval is done and render the answer
+    above them token by token.
+    """
+    st.markdown("**🤖 AI Analysis:**")
+    answer_area = st.container()
+    render_sources(stream.source_documents)
+    answer_area.write_stream(stream)
+    
+    timings = stream.timings()
+    st.session_state.answer_timings = (st.session_state.answer_timings + [timings])[-50:]
+    st.session_state.query_metrics = stream.metrics
+    context = stream.context
+    answer_area.caption(
+        f"⏱️ First token {timings['time_to_first_token'] or timings['total']:.2f}s · total {timings['total']:.2f}s · "
+        f"🧩 prompt {context.prompt_tokens_before:,} → {context.prompt_tokens_after:,} tokens "
+        f"({context.chunks_used} chunks in {len(context.documents)} passages)"
+    )
+
+def render_question_analysis(question):
+    """
+    Answer `question` against the current index and render it. Answers are
+    served from the answer cache when this question (or, with semantic reuse
+    enabled, a close enough one) was already answered for this index version;
+    otherwise a new answer is streamed and stored. Returns False if there is
+    no index to query.
+    """
+    vectorstore = index_store.get_vectorstore(index_dir)
+    version = index_store.version_token(index_dir)
+    if vectorstore is None or version is None:
+        return False
+    
+    answer_cache = get_answer_cache()
+    query_embedding = None
+    result = answer_cache.get(index_dir, version, question)
+    if result is None and st.session_state.get("semantic_answer_cache"):
+        query_embedding = vectorstore.embedding_function.embed_query(question)
+        result = answer_cache.get_similar(index_dir, version, query_embedding)
+    
+    pending = get_precomputer().future(index_dir, version, question) if result is None else None
+    if pending is not None and not pending.cancelled():
+        try:
+            with st.spinner("⏳ Finishing the answer started in the background..."):
+                result = dict(pending.result(), cache="precomputed")
+        except Exception:
+            result = None
+    
+    if result is not None:
+        metrics.REGISTRY.inc("answer_cache_hits", cache=result["cache"])
+        st.markdown("**🤖 AI Analysis:**")
+        st.write(result["result"])
+        render_sources(result["source_documents"])
+        labels = {"exact": "⚡ Cached answer", "semantic": "⚡ Cached answer (similar question)",
+                  "precomputed": "⚡ Precomputed answer"}
+        st.caption(labels[result["cache"]])
+        return True
+    
+    with st.spinner("🔎 Retrieving sources..."):
+        stream = AnswerStream(vectorstore, get_llm(), question, query_embedding=query_embedding)
+    render_streamed_answer(stream)
+    answer_cache.put(index_dir, version, question, stream.result(), query_embedding)
+    return True
+
+def render_all_analyses(questions):
+    """
+    Answer every question in one batch (one embedding request and one index
+    search, then parallel completions) and render them. Questions already in
+    the answer cache are not asked again. Returns False if there is no index.
+    """
+    version = index_store.version_token(index_dir)
+    if version is None:
+        return False
+    
+    answer_cache = get_answer_cache()
+    results = {question: answer_cache.get(index_dir, version, question) for question in questions}
+    missing = [question for question, result in results.items() if result is None]
+    if missing:
+        run = metrics.RunMetrics("query", mode="batch")
+        with st.spinner(f"🧠 Analyzing {len(missing)} questions in one batch..."):
+            for question, result, _ in research_pipeline.answer_many(missing, index_dir, get_llm(), run=run):
+                if isinstance(result, dict):
+                    answer_cache.put(index_dir, version, question, result)
+                results[question] = result
+        # this session's batch, not whichever query in the process finished last
+        st.session_state.query_metrics = run.as_dict()
+    
+    for i, question in enumerate(questions):
+        result = results[question]
+        with st.expander(f"🎯 {i+1}. {question}", expanded=i == 0):
+            if isinstance(result, dict):
+                st.write(result["result"])
+                render_sources(result["source_documents"])
+            else:
+                st.error(f"❌ Unable to analyze this question: {result or 'no index'}")
+    return True
+
+@st.cache_resource
+def get_ingest_jobs():
+    # ingestion runs on background threads that outlive reruns and page refreshes
+    return IngestJobs()
+
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id):
+    """
+    Poll a running ingestion job once a second without rerunning the whole
+    app; once the job has finished the app reruns to show the result.
+    """
+    jobs = get_ingest_jobs()
+    progress = jobs.progress(job_id)
+    if progress is None or progress["state"] not in ACTIVE_STATES:
+        st.rerun()
+    stages = {
+        "queued": "⏳ Waiting for another analysis of this corpus to finish...",
+        "ingesting": "📥 Loading, splitting and embedding content...",
+        "questions": "💡 Generating suggested questions...",
+    }
+    st.progress(progress["urls_fetched"] / max(progress["urls"], 1), text=stages.get(progress["stage"], progress["stage"]))
+    failed = f" ({progress['urls_failed']} failed)" if progress["urls_failed"] else ""
+    st.caption(
+        f"🔗 {progress['urls_fetched']}/{progress['urls']} URLs fetched{failed} · "
+        f"🧠 {progress['chunks_embedded']} chunks embedded"
+    )
+    if st.button("⛔ Cancel", key=f"cancel_{job_id}", help="Stop after the batch in flight; the analysis can be resumed"):
+        jobs.cancel(job_id)
+
+def render_job_result(job):
+    """
+    Show how a finished ingestion job went. A successful one is applied to
+    the session once: its suggested questions, metrics and precomputing.
+    Interrupted jobs can be resumed from their checkpoint or discarded.
+    """
+    summary = job.summary or {}
+    if job.state == "done" and st.session_state.get("applied_job") != job.id:
+        st.session_state.applied_job = job.id
+        st.session_state.embedding_cache_stats = summary.get("embedding_cache")
+        st.session_state.ingest_metrics = summary.get("metrics")
+        if job.questions:
+            st.session_state.suggested_questions = job.questions
+            st.session_state.processed_content = job.content_sample or ""
+            st.session_state.chunks_processed = True
+            if st.session_state.get("precompute_job"):
+                get_precomputer().submit(
+                    index_dir, index_store.version_token(index_dir),
+                    job.questions, run_question_analysis
+                )
+    
+    failed = summary.get("failed", [])
+    if failed:
+        with st.expander(f"⚠️ {len(failed)} of {len(job.urls)} URLs could not be loaded", expanded=False):
+            for r in failed:
+                st.markdown(f"- `{r['url']}` — {r['error']}")
+    
+    if job.resumable:
+        reasons = {
+            "cancelled": "⛔ Analysis cancelled",
+            "failed": f"❌ Error processing URLs: {job.error}",
+            "interrupted": "⚠️ Analysis was interrupted",
+        }
+        done = len(job.checkpoint.get("done", []))
+        st.warning(f"{reasons[job.state]}. {done} of {len(job.urls)} URLs are already indexed and will not be embedded again.")
+        resume_col, discard_col = st.columns(2)
+        if resume_col.button("▶️ Resume", key=f"resume_{job.id}", use_container_width=True):
+            get_ingest_jobs().resume(job.id)
+            st.rerun()
+        if discard_col.button("🗑️ Discard", key=f"discard_{job.id}", use_container_width=True):
+            get_ingest_jobs().discard(job.id)
+            st.session_state.ingest_job = None
+            st.query_params.pop("job", None)
+            st.rerun()
+        return
+    
+    if not summary.get("loaded") and not summary.get("skipped"):
+        st.error("❌ No content could be loaded from the provided URLs. Please check if the URLs are accessible.")
+    elif not summary.get("chunks") and not summary.get("skipped"):
+        st.error("❌ No content chunks could be created. Please check the URL content.")
+    else:
+        if job.options.get("incremental"):
+            st.caption(f"🗂️ Index updated: {summary['added']} chunks added, {summary['removed']} replaced")
+        dedup_stats = summary.get("dedup")
+        if dedup_stats and dedup_stats["duplicates"]:
+            saved_kb = dedup_stats.get("index_bytes_saved", dedup_stats["text_bytes_saved"]) / 1024
+            st.caption(
+                f"🧹 {dedup_stats['duplicates']} of {dedup_stats['chunks']} chunks were near-duplicates: "
+                f"{dedup_stats['embeddings_saved']} embeddings and {saved_kb:,.0f} KB of index saved"
+            )
         
-        result = chain({"query": question}, return_only_outputs=True)
-        return result
-    return None
+        st.markdown("""
+        <div class="success-message">
+            ✅ Content analysis complete! Check the "AI Analysis" tab to explore suggested questions.
+        </div>
+        """, unsafe_allow_html=True)
+        cache_stats = summary.get("embedding_cache")
+        if cache_stats:
+            st.caption(f"🧠 Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        page_stats = summary.get("page_cache")
+        if page_stats and (page_stats["not_modified"] or page_stats["unchanged"]):
+            st.caption(
+                f"📄 Page cache: {page_stats['not_modified']} articles unchanged since the last fetch, "
+                f"{page_stats['unchanged']} re-downloaded but not re-parsed"
+            )
+
+def render_run_metrics(title, summary):
+    """Stage timings and counts of one metrics.RunMetrics summary."""
+    if not summary:
+        return
+    st.markdown(f"**{title}** · {summary['seconds']:.2f}s")
+    st.table({
+        "stage": list(summary["stages"]),
+        "seconds": [f"{seconds:.3f}" for seconds in summary["stages"].values()],
+    })
+    st.caption(" · ".join(f"{name.replace('_', ' ')}: {value:,}" for name, value in summary["counts"].items()))
 
 # Tab 1: Content Input
 with tab1:
@@ -270,58 +441,60 @@ with tab1:
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        urls = []
-        for i in range(3):
-            url = st.text_input(f"URL {i+1}", placeholder=f"https://example.com/article-{i+1}")
-            urls.append(url)
+        url_text = st.text_area(
+            "Article URLs (one per line)",
+            height=180,
+            placeholder="https://example.com/article-1\nhttps://example.com/article-2"
+        )
+        url_file = st.file_uploader("...or upload a URL list", type=["txt", "csv"])
+        if url_file is not None:
+            url_text += "\n" + url_file.getvalue().decode("utf-8", errors="ignore")
+        urls = url_loader.parse_url_list(url_text)
+        if urls:
+            st.caption(f"🔗 {len(urls)} URLs ready (max {url_loader.MAX_URLS})")
     
     with col2:
         st.markdown("### 🎛️ Options")
         show_debug = st.checkbox("🔍 Debug Mode", help="Show content preview for verification")
+        embedding_backend = st.selectbox(
+            "🧬 Embedding backend",
+            embedding_backends.BACKENDS,
+            format_func=lambda b: {"openai": "OpenAI", "local": "Local (sentence-transformers, CPU)"}[b],
+            help="Local embeddings run offline; an index can only hold vectors from one backend"
+        )
+        precompute_answers = st.checkbox(
+            "⚡ Precompute suggested answers",
+            help="Answer every suggested question in the background right after analysis"
+        )
+        deduplicate = st.checkbox(
+            "🧹 Drop near-duplicate chunks",
+            value=True,
+            help="Syndicated stories are embedded and stored once; every URL they appear at is kept as a source"
+        )
+        incremental = st.checkbox(
+            "➕ Add to existing index",
+            help="Keep previously analyzed articles and only embed these URLs. Articles already indexed are replaced."
+        )
         
         if st.button("🚀 Analyze Content", type="primary", use_container_width=True):
-            if not any(url.strip() for url in urls):
+            if not urls:
                 st.warning("⚠️ Please enter at least one URL before processing.")
             else:
-                try:
-                    valid_urls = [url.strip() for url in urls if url.strip()]
-                    
-                    with st.spinner("📥 Loading content from URLs..."):
-                        loader = UnstructuredURLLoader(urls=valid_urls)
-                        data = loader.load()
-                    
-                    if not data:
-                        st.error("❌ No content could be loaded from the provided URLs. Please check if the URLs are accessible.")
-                    else:
-                        with st.spinner("✂️ Processing and analyzing content..."):
-                            text_splitter = RecursiveCharacterTextSplitter(
-                                separators=['\n\n', '\n', '.', '!', '?', ','],
-                                chunk_size=1000,
-                                chunk_overlap=250
-                            )
-                            
-                            docs = text_splitter.split_documents(data)
-                            
-                            if not docs:
-                                st.error("❌ No content chunks could be created. Please check the URL content.")
-                            else:
-                                embeddings = OpenAIEmbeddings()
-                                vectorstore_openai = FAISS.from_documents(docs, embeddings)
-                                vectorstore_openai.save_local(index_dir)
-                                
-                                suggested_questions = generate_suggested_questions(docs)
-                                
-                                st.session_state.suggested_questions = suggested_questions
-                                st.session_state.chunks_processed = True
-                        
-                        st.markdown("""
-                        <div class="success-message">
-                            ✅ Content analysis complete! Check the "AI Analysis" tab to explore suggested questions.
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                except Exception as e:
-                    st.error(f"❌ Error processing URLs: {str(e)}")
+                # runs in the background: the app stays responsive and polls the job,
+                # and the job id in the URL survives a page refresh
+                st.session_state.ingest_job = get_ingest_jobs().submit(
+                    urls, index_dir, backend=embedding_backend,
+                    incremental=incremental, deduplicate=deduplicate
+                )
+                st.session_state.precompute_job = precompute_answers
+                st.query_params["job"] = st.session_state.ingest_job
+        
+        job = get_ingest_jobs().get(st.session_state.ingest_job) if st.session_state.ingest_job else None
+        if job is not None and job.index_dir == index_dir:
+            if job.active:
+                render_job_progress(job.id)
+            else:
+                render_job_result(job)
     
     # Debug content preview
     if show_debug and st.session_state.processed_content:
@@ -353,10 +526,19 @@ with tab2:
                     if st.button(f"🔍 Analyze", key=f"analyze_btn_{i}", help=f"Get detailed analysis for: {question}"):
                         st.session_state.selected_question = question
                         st.session_state.show_analysis = True
+                        st.session_state.show_all_analysis = False
+            
+            if st.button("🚀 Analyze all suggested questions", use_container_width=True,
+                         help="Retrieve sources for every question in one pass and answer them in parallel"):
+                st.session_state.show_all_analysis = True
+                st.session_state.show_analysis = False
         
         with col2:
             st.markdown("#### 📊 Analysis Results")
-            if st.session_state.show_analysis and st.session_state.selected_question:
+            if st.session_state.show_all_analysis:
+                if not render_all_analyses(st.session_state.suggested_questions):
+                    st.error("❌ Unable to analyze questions. Please ensure content has been processed.")
+            elif st.session_state.show_analysis and st.session_state.selected_question:
                 with st.container():
                     st.markdown(f"""
                     <div class="analysis-container ai-analysis">
@@ -364,28 +546,8 @@ with tab2:
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    with st.spinner("🤖 Generating analysis..."):
-                        result = run_question_analysis(st.session_state.selected_question)
-                        
-                        if result:
-                            st.markdown("**🤖 AI Analysis:**")
-                            st.write(result["result"])
-                            
-                            sources = result.get("source_documents", [])
-                            if sources:
-                                st.markdown("**📚 Sources:**")
-                                unique_urls = set()
-                                for source in sources:
-                                    url = source.metadata.get("source", "Unknown Source")
-                                    if url not in unique_urls:
-                                        st.markdown(f"""
-                                        <div class="source-link">
-                                            📄 <a href="{url}" target="_blank">{url}</a>
-                                        </div>
-                                        """, unsafe_allow_html=True)
-                                        unique_urls.add(url)
-                        else:
-                            st.error("❌ Unable to analyze question. Please ensure content has been processed.")
+                    if not render_question_analysis(st.session_state.selected_question):
+                        st.error("❌ Unable to analyze question. Please ensure content has been processed.")
             else:
                 st.markdown("""
                 <div class="info-box">
@@ -418,34 +580,16 @@ with tab3:
         
         if custom_query and ask_custom:
             st.markdown("---")
-            with st.spinner("🤖 Processing your question..."):
-                result = run_question_analysis(custom_query)
+            if index_store.index_exists(index_dir):
+                st.markdown(f"""
+                <div class="analysis-container">
+                    <h4>🎯 Your Question: {custom_query}</h4>
+                </div>
+                """, unsafe_allow_html=True)
                 
-                if result:
-                    st.markdown(f"""
-                    <div class="analysis-container">
-                        <h4>🎯 Your Question: {custom_query}</h4>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown("**🤖 AI Analysis:**")
-                    st.write(result["result"])
-                    
-                    sources = result.get("source_documents", [])
-                    if sources:
-                        st.markdown("**📚 Sources:**")
-                        unique_urls = set()
-                        for source in sources:
-                            url = source.metadata.get("source", "Unknown Source")
-                            if url not in unique_urls:
-                                st.markdown(f"""
-                                <div class="source-link">
-                                    📄 <a href="{url}" target="_blank">{url}</a>
-                                </div>
-                                """, unsafe_allow_html=True)
-                                unique_urls.add(url)
-                else:
-                    st.error("❌ Unable to process your question. Please ensure content has been analyzed first.")
+                render_question_analysis(custom_query)
+            else:
+                st.error("❌ Unable to process your question. Please ensure content has been analyzed first.")
     
     else:
         st.markdown("""
@@ -460,25 +604,81 @@ with st.sidebar:
     st.markdown("### ⚙️ Tools & Settings")
     
     if st.button("🔄 Clear Analysis", help="Reset all processed data"):
-        st.session_state.suggested_questions = []
-        st.session_state.chunks_processed = False
-        st.session_state.processed_content = ""
-        st.session_state.selected_question = None
-        st.session_state.show_analysis = False
-        if os.path.exists(index_dir):
-            import shutil
-            shutil.rmtree(index_dir)
-        st.success("✅ Analysis cleared!")
-        st.rerun()
+        try:
+            index_store.clear_index(index_dir, wait=False)
+        except index_store.IndexBusy:
+            st.warning("⏳ An analysis of this corpus is still running. Cancel it or wait for it to finish.")
+        else:
+            st.session_state.suggested_questions = []
+            st.session_state.chunks_processed = False
+            st.session_state.processed_content = ""
+            st.session_state.selected_question = None
+            st.session_state.show_analysis = False
+            st.session_state.show_all_analysis = False
+            st.session_state.ingest_job = None
+            st.query_params.pop("job", None)
+            st.session_state.embedding_cache_stats = None
+            st.session_state.ingest_metrics = None
+            st.session_state.query_metrics = None
+            get_precomputer().cancel(index_dir)
+            get_answer_cache().clear(index_dir)
+            st.success("✅ Analysis cleared!")
+            st.rerun()
+    
+    st.checkbox(
+        "🧲 Reuse answers for similar questions",
+        key="semantic_answer_cache",
+        help="Serve a cached answer when a new question is nearly identical in meaning to one already answered"
+    )
+    
+    indexed_sources = index_store.list_sources(index_dir) if st.session_state.chunks_processed else []
+    if indexed_sources:
+        with st.expander(f"🗂️ Indexed Sources ({len(indexed_sources)})", expanded=False):
+            source_to_remove = st.selectbox("Source", indexed_sources, label_visibility="collapsed")
+            if st.button("🗑️ Remove Source", help="Delete every chunk from this URL"):
+                try:
+                    removed = index_store.remove_source(index_dir, source_to_remove, wait=False)
+                except index_store.IndexBusy:
+                    st.warning("⏳ An analysis of this corpus is still running. Cancel it or wait for it to finish.")
+                else:
+                    if not index_store.index_exists(index_dir):
+                        st.session_state.chunks_processed = False
+                    st.success(f"✅ Removed {removed} chunks")
+                    st.rerun()
     
     st.markdown("---")
     st.markdown("### 📊 Status")
     if st.session_state.chunks_processed:
         st.success("✅ Content Processed")
         st.info(f"📝 {len(st.session_state.suggested_questions)} questions generated")
+        cache_stats = st.session_state.embedding_cache_stats
+        if cache_stats:
+            st.info(f"🧠 Embeddings reused: {cache_stats['hits']} / {cache_stats['hits'] + cache_stats['misses']}")
+        precomputed, submitted = get_precomputer().status(index_dir, index_store.version_token(index_dir))
+        if submitted:
+            st.info(f"⚡ {precomputed}/{submitted} suggested answers precomputed")
+        answer_stats = get_answer_cache().stats()
+        if answer_stats["hits"] or answer_stats["semantic_hits"]:
+            st.info(f"⚡ Cached answers served: {answer_stats['hits'] + answer_stats['semantic_hits']}")
+        if st.session_state.answer_timings:
+            last = st.session_state.answer_timings[-1]
+            st.info(f"⏱️ Last answer: first token {last['time_to_first_token'] or last['total']:.2f}s, total {last['total']:.2f}s")
     else:
         st.warning("⏳ No content processed")
     
+    with st.expander("📈 Pipeline Metrics", expanded=False):
+        render_run_metrics("📥 Last ingestion", st.session_state.ingest_metrics)
+        render_run_metrics("💬 Last answer", st.session_state.query_metrics)
+        if not (st.session_state.ingest_metrics or st.session_state.query_metrics):
+            st.caption("Metrics appear after the first analysis or answer.")
+        st.download_button(
+            "⬇️ Prometheus metrics",
+            metrics.REGISTRY.render(),
+            file_name=metrics.PROM_FILE,
+            mime="text/plain",
+            help=f"Also written to {metrics.METRICS_DIR}/{metrics.PROM_FILE} after every run" if metrics.METRICS_DIR else None
+        )
+    
     st.markdown("---")
     st.markdown("""
     ### 🔗 About
@@ -0,0 +1,125 @@
+"""
+FAISS index types for `embeddings_folder`.
+
+    flat   exact search over the memory-mapped vectors, no separate index
+    ivf    inverted lists over k-means cells; searches `nprobe` cells
+    hnsw   graph search; `efSearch` trades recall for latency
+    ivfpq  IVF with product-quantized vectors, a fraction of the memory
+
+Approximate indexes only pay off on large corpora, and IVF types need enough
+vectors to train their centroids, so anything below `MIN_VECTORS` stays flat.
+Indexes are built over the stored vectors in row order, so FAISS ids are
+row positions.
+
+Configured through FAISS_INDEX_TYPE, FAISS_NPROBE, FAISS_EF_SEARCH and
+FAISS_MIN_VECTORS. FAISS itself is imported only once an index is built,
+searched or loaded, not with this module.
+"""
+import math
+import os
+
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+DEFAULT_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+MIN_VECTORS = int(os.getenv("FAISS_MIN_VECTORS", "5000"))
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+PQ_BITS = 8  # at most; fewer on corpora too small to train 2**8 codes
+POINTS_PER_CENTROID = 39  # faiss warns when training with fewer
+
+
+def default_nlist(n_vectors):
+    """About 4 * sqrt(n) cells, capped so each cell gets enough training points."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // POINTS_PER_CENTROID))
+
+
+def pq_subquantizers(dim):
+    """Largest common sub-quantizer count that divides `dim`."""
+    for m in (96, 64, 48, 32, 24, 16, 12, 8, 4, 2):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def pq_bits(n_vectors):
+    """Bits per PQ code, at most `PQ_BITS`, so each of the 2**bits codes gets enough training points."""
+    return max(1, min(PQ_BITS, int(math.log2(max(n_vectors, 1) / POINTS_PER_CENTROID))))
+
+
+def index_kind(index):
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def create_index(index_type, dim, n_vectors, nlist=None):
+    """Return an empty (possibly untrained) index of `index_type`."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    import faiss
+
+    if index_type == "flat" or n_vectors < MIN_VECTORS:
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    nlist = nlist or default_nlist(n_vectors)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), pq_bits(n_vectors))
+
+
+def set_search_params(index, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH):
+    import faiss
+
+    kind = index_kind(index)
+    if kind in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = ef_search
+
+
+def build_index(vectors, index_type=DEFAULT_INDEX_TYPE, nlist=None,
+                nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH):
+    """Create, train if needed, and fill an index with `vectors`."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    index = create_index(index_type, dim, n_vectors, nlist)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    set_search_params(index, nprobe, ef_search)
+    return index
+
+
+def reconstruct_all(index):
+    """
+    All stored vectors in insertion order. Exact for flat, HNSW and IVF-Flat;
+    IVF-PQ only has the quantized approximation.
+    """
+    import faiss
+
+    if index_kind(index) in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def memory_bytes(index):
+    """Serialized size of `index`, a close proxy for its resident memory."""
+    import faiss
+
+    return int(faiss.serialize_index(index).nbytes)
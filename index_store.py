@@ -0,0 +1,634 @@
+"""
+Named corpora, their versions, and a process-wide cache of opened indexes
+and QA chains.
+
+Streamlit re-executes the app script on every interaction, so objects created
+in the script itself are rebuilt on each rerun. Imported modules live for the
+whole process, which makes this module the place to keep the vector store and
+RetrievalQA chain resident between questions.
+
+Each corpus has its own directory under CORPORA_DIR, and every write produces
+a new immutable version of it:
+
+    embeddings_folder/
+        <corpus>/
+            CURRENT        name of the live version, replaced atomically
+            v-<time_ns>/   an `MmapVectorStore` plus its embedding backend
+            .lock          serializes writers, also across processes
+            ACCESSED       last opened or written (its mtime)
+
+A write builds the next version in its own directory (an incremental update
+starts from a cheap copy of the live one) and publishes it by swapping
+CURRENT. Readers never see a half-written index and keep querying the
+version they opened; replaced versions are deleted once they have been
+retired for RETIRE_SECONDS. Writers to one corpus take turns; readers and
+other corpora are never blocked.
+
+Corpora named "session-*" belong to one browser session each. Opening or
+writing a corpus touches its ACCESSED file, and `collect_idle_corpora`
+deletes session corpora nobody used for SESSION_IDLE_SECONDS.
+
+A write given a checkpoint keeps its unfinished version (marked PARTIAL) when
+it fails or is cancelled, so it can be resumed; unclaimed partial versions
+are deleted after PARTIAL_SECONDS.
+
+Indexes written by `FAISS.save_local` (index.faiss + index.pkl) and
+unversioned store directories are converted on first open.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import context_builder
+import embedding_backends
+import index_factory
+import ingest_pipeline
+import metrics
+from mmap_store import MANIFEST_FILE, MmapVectorStore, copy_store, read_manifest
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process
+    fcntl = None
+
+CORPORA_DIR = "embeddings_folder"
+DEFAULT_CORPUS = "default"
+CURRENT_FILE = "CURRENT"
+RETIRED_FILE = "RETIRED"
+LOCK_FILE = ".lock"
+PARTIAL_FILE = "PARTIAL"
+ACCESSED_FILE = "ACCESSED"
+SESSION_PREFIX = "session-"
+RETIRE_SECONDS = float(os.getenv("INDEX_RETIRE_SECONDS", "300"))
+PARTIAL_SECONDS = float(os.getenv("INDEX_PARTIAL_SECONDS", str(24 * 3600)))
+SESSION_IDLE_SECONDS = float(os.getenv("INDEX_SESSION_IDLE_SECONDS", str(3 * 24 * 3600)))
+TOUCH_SECONDS = 60  # ACCESSED is rewritten at most this often per corpus
+LEGACY_FILES = ("index.faiss", "index.pkl")
+
+_lock = threading.RLock()
+_stores = {}  # index_dir -> (version, vectorstore)
+_chains = {}  # index_dir -> (version, llm, token_budget, chain)
+_write_locks = {}  # index_dir -> RLock
+_touched = {}  # index_dir -> when ACCESSED was last updated by this process
+
+
+class IndexBusy(RuntimeError):
+    """Another writer holds the corpus, e.g. a background ingest."""
+
+
+# -- corpora ----------------------------------------------------------------
+
+def corpus_name(name):
+    """`name` reduced to characters that are safe in a directory name."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", name.strip()).strip("-.") or DEFAULT_CORPUS
+
+
+def corpus_dir(name=DEFAULT_CORPUS, root=CORPORA_DIR):
+    """Directory of corpus `name`. An index left directly in `root` becomes the default corpus."""
+    path = os.path.join(root, corpus_name(name))
+    if corpus_name(name) == DEFAULT_CORPUS and not os.path.exists(path):
+        _adopt_root_index(root, path)
+    return path
+
+
+def list_corpora(root=CORPORA_DIR):
+    """Names of the corpora under `root` that have a live index."""
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return []
+    return [name for name in names if index_exists(os.path.join(root, name))]
+
+
+def collect_idle_corpora(root=CORPORA_DIR, prefix=SESSION_PREFIX, max_idle=None):
+    """
+    Delete the corpora under `root` named `prefix`* that were neither opened
+    nor written for `max_idle` seconds (default SESSION_IDLE_SECONDS).
+    Corpora being written are skipped. Returns the names deleted.
+    """
+    if max_idle is None:
+        max_idle = SESSION_IDLE_SECONDS
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return []
+    deleted = []
+    for name in names:
+        path = os.path.join(root, name)
+        if not name.startswith(prefix) or time.time() - _last_access(path) < max_idle:
+            continue
+        try:
+            with _write_lock(path, wait=False):
+                if time.time() - _last_access(path) < max_idle:
+                    continue
+                invalidate(path)
+                shutil.rmtree(path, ignore_errors=True)
+        except IndexBusy:
+            continue
+        with _lock:
+            _write_locks.pop(path, None)
+            _touched.pop(path, None)
+        deleted.append(name)
+    return deleted
+
+
+def _touch(index_dir):
+    """Record that `index_dir` is in use, at most once per TOUCH_SECONDS."""
+    now = time.time()
+    with _lock:
+        if now - _touched.get(index_dir, 0.0) < TOUCH_SECONDS:
+            return
+        _touched[index_dir] = now
+    try:
+        with open(os.path.join(index_dir, ACCESSED_FILE), "w", encoding="utf-8") as f:
+            f.write(str(now))
+    except FileNotFoundError:
+        pass
+
+
+def _last_access(index_dir):
+    for path in (os.path.join(index_dir, ACCESSED_FILE), index_dir):
+        try:
+            return os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+    return time.time()
+
+
+def _adopt_root_index(root, path):
+    # before corpora existed the single index lived directly in `root`
+    if not (os.path.exists(os.path.join(root, MANIFEST_FILE)) or _has_legacy_index(root)):
+        return
+    os.makedirs(path)
+    for name in os.listdir(root):
+        source = os.path.join(root, name)
+        if os.path.isfile(source):
+            os.replace(source, os.path.join(path, name))
+
+
+# -- versions ---------------------------------------------------------------
+
+def _current(index_dir):
+    """Path of the live version of `index_dir`, or None."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(index_dir, name) if name else None
+
+
+def _versions(index_dir):
+    try:
+        return [name for name in os.listdir(index_dir) if name.startswith("v-")]
+    except FileNotFoundError:
+        return []
+
+
+def _new_version(index_dir, base=None):
+    """Create the directory of the next version, sharing the rows of `base` if given."""
+    path = os.path.join(index_dir, f"v-{time.time_ns()}")
+    if base is not None:
+        copy_store(base, path)
+    else:
+        os.makedirs(path)
+    return path
+
+
+def _swap(index_dir, version_path):
+    """Make `version_path` the live version (or none, if None) and retire the old one."""
+    previous = _current(index_dir)
+    if version_path is None:
+        if os.path.exists(os.path.join(index_dir, CURRENT_FILE)):
+            os.remove(os.path.join(index_dir, CURRENT_FILE))
+    else:
+        tmp = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(version_path))
+        os.replace(tmp, os.path.join(index_dir, CURRENT_FILE))
+    if previous is not None and os.path.isdir(previous):
+        with open(os.path.join(previous, RETIRED_FILE), "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+
+
+def _collect_garbage(index_dir):
+    """
+    Delete versions retired more than RETIRE_SECONDS ago, and versions that
+    were never published (a writer died). Call with the corpus write lock held.
+    """
+    current = _current(index_dir)
+    now = time.time()
+    for name in _versions(index_dir):
+        path = os.path.join(index_dir, name)
+        if path == current:
+            continue
+        partial_since = _read_time(os.path.join(path, PARTIAL_FILE))
+        if partial_since is not None:
+            if now - partial_since >= PARTIAL_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        retired_at = _read_time(os.path.join(path, RETIRED_FILE)) or 0.0  # 0: never published
+        if now - retired_at >= RETIRE_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _read_time(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return float(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@contextmanager
+def _write_lock(index_dir, wait=True):
+    """
+    Serialize writers to `index_dir`: a thread lock plus a file lock for
+    other processes. Without `wait`, raises IndexBusy instead of queueing
+    behind another writer.
+    """
+    with _lock:
+        lock = _write_locks.setdefault(index_dir, threading.RLock())
+    if not lock.acquire(blocking=wait):
+        raise IndexBusy(f"{index_dir} is being written to")
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        with open(os.path.join(index_dir, LOCK_FILE), "a") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise IndexBusy(f"{index_dir} is being written to") from None
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    finally:
+        lock.release()
+
+
+def _has_legacy_index(path):
+    return all(os.path.exists(os.path.join(path, name)) for name in LEGACY_FILES)
+
+
+def _is_unversioned(index_dir):
+    return (not os.path.exists(os.path.join(index_dir, CURRENT_FILE))
+            and (os.path.exists(os.path.join(index_dir, MANIFEST_FILE)) or _has_legacy_index(index_dir)))
+
+
+def _migrate_legacy_index(path, embeddings):
+    """Convert a pickled `FAISS.save_local` index to the on-disk format in place."""
+    from langchain_community.vectorstores import FAISS
+
+    legacy = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    vectors = index_factory.reconstruct_all(legacy.index)
+    ids = [legacy.index_to_docstore_id[i] for i in range(legacy.index.ntotal)]
+    docs = [legacy.docstore.search(doc_id) for doc_id in ids]
+    for name in LEGACY_FILES:
+        os.remove(os.path.join(path, name))
+
+    vectorstore = MmapVectorStore(path, embeddings)
+    if docs:
+        vectorstore.add_embeddings(
+            zip((doc.page_content for doc in docs), vectors),
+            metadatas=[doc.metadata for doc in docs],
+            ids=ids,
+        )
+    vectorstore.commit()
+    vectorstore.close()
+
+
+def _adopt_unversioned(index_dir, embeddings_factory):
+    """Move an index written straight into `index_dir` into its first version."""
+    with _write_lock(index_dir):
+        if not _is_unversioned(index_dir):
+            return
+        path = _new_version(index_dir)
+        for name in os.listdir(index_dir):
+            source = os.path.join(index_dir, name)
+            if os.path.isfile(source) and name != LOCK_FILE:
+                os.replace(source, os.path.join(path, name))
+        if _has_legacy_index(path):
+            # queries must be embedded with the backend that built the index
+            embeddings = embeddings_factory() if embeddings_factory else embedding_backends.for_index(path)
+            _migrate_legacy_index(path, embeddings)
+        _swap(index_dir, path)
+
+
+# -- reading ----------------------------------------------------------------
+
+def index_version(index_dir):
+    """
+    Return the generation of the live index in `index_dir`, or None if there
+    is none. A new generation is published by every write.
+    """
+    current = _current(index_dir)
+    manifest = read_manifest(current) if current else None
+    if manifest is None:
+        return None
+    return manifest.get("generation")
+
+
+def version_token(index_dir):
+    """`index_version` as a string, for use as a cache key."""
+    version = index_version(index_dir)
+    return None if version is None else str(version)
+
+
+def index_exists(index_dir):
+    return index_version(index_dir) is not None or _is_unversioned(index_dir)
+
+
+def get_vectorstore(index_dir, embeddings_factory=None):
+    """
+    Return the vector store for the live version of `index_dir`, opening it
+    only if it is not cached yet or a newer version was published since.
+    """
+    return _open(index_dir, embeddings_factory)[1]
+
+
+def _open(index_dir, embeddings_factory=None):
+    """(version, vectorstore) of the live version, or (None, None)."""
+    if _is_unversioned(index_dir):
+        _adopt_unversioned(index_dir, embeddings_factory)
+
+    with _lock:
+        current = _current(index_dir)
+        version = index_version(index_dir)
+        if version is None:
+            return None, None
+        _touch(index_dir)
+
+        cached = _stores.get(index_dir)
+        if cached and cached[0] == version:
+            return cached
+
+        # queries must be embedded with the backend that built the index
+        if embeddings_factory is None:
+            embeddings = embedding_backends.for_index(current)
+        else:
+            embeddings = embeddings_factory()
+        vectorstore = MmapVectorStore(current, embeddings)
+        _stores[index_dir] = (version, vectorstore)
+        _chains.pop(index_dir, None)
+        return version, vectorstore
+
+
+def get_qa_chain(index_dir, llm, embeddings_factory=None, token_budget=None):
+    """
+    Return a RetrievalQA chain over `index_dir` whose prompt context is built
+    by `context_builder` within `token_budget` tokens. The chain is rebuilt
+    only when a new version is published or a different LLM object or budget
+    is passed in.
+    """
+    version, vectorstore = _open(index_dir, embeddings_factory)
+    if vectorstore is None:
+        return None
+    if token_budget is None:
+        token_budget = context_builder.DEFAULT_TOKEN_BUDGET
+    from langchain.chains.retrieval_qa.base import RetrievalQA
+
+    with _lock:
+        cached = _chains.get(index_dir)
+        if cached and cached[0] == version and cached[1] is llm and cached[2] == token_budget:
+            return cached[3]
+
+        chain = RetrievalQA.from_chain_type(
+            llm=llm,
+            retriever=context_builder.ContextRetriever(vectorstore=vectorstore, token_budget=token_budget),
+            return_source_documents=True
+        )
+        _chains[index_dir] = (version, llm, token_budget, chain)
+        return chain
+
+
+def list_sources(index_dir, embeddings_factory=None):
+    """Return the source URLs currently indexed in `index_dir`."""
+    vectorstore = get_vectorstore(index_dir, embeddings_factory)
+    if vectorstore is None:
+        return []
+    return vectorstore.sources()
+
+
+# -- writing ----------------------------------------------------------------
+
+def _publish(index_dir, version_path, vectorstore):
+    """Swap `version_path` in and make `vectorstore` the cached copy of it."""
+    _swap(index_dir, version_path)
+    _touch(index_dir)
+    with _lock:
+        _chains.pop(index_dir, None)
+        _stores[index_dir] = (index_version(index_dir), vectorstore)
+    _collect_garbage(index_dir)
+
+
+def invalidate(index_dir):
+    """Drop any cached store and chain for `index_dir`."""
+    with _lock:
+        _stores.pop(index_dir, None)
+        _chains.pop(index_dir, None)
+
+
+def clear_index(index_dir, wait=True):
+    """
+    Unpublish the corpus in `index_dir`. Sessions still reading it finish on
+    the retired version, which is deleted later like any other. Without
+    `wait`, raises IndexBusy if another write is in progress.
+    """
+    with _write_lock(index_dir, wait):
+        _swap(index_dir, None)
+        invalidate(index_dir)
+        _collect_garbage(index_dir)
+
+
+def check_checkpoint(index_dir, checkpoint, replace=False):
+    """
+    True if the partial version named by `checkpoint` can be resumed. It
+    cannot once it is gone or, for an update, once another write has been
+    published since it was started; it is then deleted.
+    """
+    name = checkpoint.get("version")
+    if not name:
+        return False
+    if "base_rows" not in checkpoint:
+        # written before carried-over rows were told apart from new ones
+        discard_checkpoint(index_dir, checkpoint)
+        return False
+    path = os.path.join(index_dir, name)
+    current = _current(index_dir)
+    if os.path.isdir(path) and (replace or checkpoint.get("base") == (current and os.path.basename(current))):
+        return True
+    discard_checkpoint(index_dir, checkpoint)
+    return False
+
+
+def discard_checkpoint(index_dir, checkpoint):
+    """Delete the partial version named by `checkpoint`."""
+    name = checkpoint.pop("version", None)
+    if name:
+        with _write_lock(index_dir):
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def _batch_sources(batch):
+    # deduplicated chunks carry every URL they were found at in "sources"
+    sources = set()
+    for doc in batch:
+        sources.update(doc.metadata.get("sources") or [doc.metadata.get("source")])
+    return sources
+
+
+def upsert_documents(index_dir, docs, embeddings, embeddings_factory=None, on_batch=None,
+                     index_type=None, run=None, before_commit=None, replace=False, checkpoint=None,
+                     sources=(), **pipeline_options):
+    """
+    Stream `docs` (any iterable of chunks) into a new version of `index_dir`.
+    Only the new chunks are embedded and written; the rest of the corpus is
+    carried over from the live version, unless `replace` is set. Once all
+    chunks are written, the carried-over chunks of every source in
+    `sources`, in the new chunks' metadata or in `checkpoint["done"]` are
+    unlinked from it, and removed unless another URL still links to them;
+    `sources` is read only then, so it may still be filled while `docs` is
+    consumed. `on_batch(batch, vectorstore)` runs after each batch is written
+    and `before_commit(vectorstore)` after all of them, before the version is
+    published.
+
+    With `checkpoint` (a dict, see `research_pipeline.ingest`) a failed write
+    keeps its version for a later call with the same checkpoint to continue.
+
+    A call that neither adds nor removes chunks leaves the live version
+    untouched, even with `replace`, so a run where every URL failed does not unpublish the corpus.
+    Creates the index if it does not exist yet. Returns (added, removed).
+    Stage timings are recorded on `run`, a metrics.RunMetrics, if given.
+    Raises ValueError if the index was built with a different embedding
+    backend than `embeddings`.
+    """
+    if _is_unversioned(index_dir):
+        _adopt_unversioned(index_dir, embeddings_factory)
+
+    with _write_lock(index_dir):
+        base = None if replace else _current(index_dir)
+        if base is not None:
+            embedding_backends.check_backend(base, embeddings)
+        resumed = bool(checkpoint and checkpoint.get("version"))
+        if resumed:
+            path = os.path.join(index_dir, checkpoint["version"])
+        else:
+            path = _new_version(index_dir, base)
+            if checkpoint is not None:
+                with open(os.path.join(path, PARTIAL_FILE), "w", encoding="utf-8") as f:
+                    f.write(str(time.time()))
+                checkpoint["version"] = os.path.basename(path)
+                checkpoint["base"] = base and os.path.basename(base)
+        vectorstore = None
+        try:
+            vectorstore = MmapVectorStore(path, embeddings)
+            # rows below this were carried over; everything after it is new
+            if resumed:
+                base_rows = checkpoint["base_rows"]
+            else:
+                base_rows = vectorstore.rows
+                if checkpoint is not None:
+                    checkpoint["base_rows"] = base_rows
+            replaced = set(checkpoint.get("done", ())) if checkpoint else set()
+            added = removed = 0
+
+            for batch, vectors in ingest_pipeline.embed_stream(docs, embeddings, run=run, **pipeline_options):
+                with metrics.stage(run, "index_write"):
+                    replaced.update(_batch_sources(batch))
+                    ids = [getattr(doc, "id", None) for doc in batch]
+                    vectorstore.add_embeddings(
+                        zip((doc.page_content for doc in batch), vectors),
+                        metadatas=[doc.metadata for doc in batch],
+                        ids=ids if all(ids) else None,
+                    )
+                added += len(batch)
+                if on_batch:
+                    on_batch(batch, vectorstore)
+
+            unlinked = 0
+            with metrics.stage(run, "index_write"):
+                for source in replaced.union(sources):
+                    deleted, shared = vectorstore.remove_source(source, before=base_rows)
+                    removed += deleted
+                    unlinked += shared
+
+            if not added and not removed and not unlinked and not resumed:
+                # nothing new: the live version stays as it is
+                vectorstore.close()
+                shutil.rmtree(path, ignore_errors=True)
+                if checkpoint is not None:
+                    checkpoint.pop("version", None)
+                return 0, 0
+
+            if before_commit:
+                before_commit(vectorstore)
+            embedding_backends.write_backend(path, embeddings)
+            with metrics.stage(run, "index_commit"):
+                vectorstore.commit(index_type)
+        except BaseException:
+            if checkpoint is None:
+                shutil.rmtree(path, ignore_errors=True)
+            elif vectorstore is not None:
+                vectorstore.close()  # kept for resuming
+            raise
+        if checkpoint is not None:
+            os.remove(os.path.join(path, PARTIAL_FILE))
+            checkpoint.pop("version", None)
+        _publish(index_dir, path, vectorstore)
+        return added, removed
+
+
+def rebuild_index(index_dir, docs, embeddings, on_batch=None, index_type=None, run=None,
+                  before_commit=None, checkpoint=None, **pipeline_options):
+    """
+    Replace the index in `index_dir` with `docs`. The previous version keeps
+    serving queries until the new one is complete. Returns the number of
+    chunks indexed.
+    """
+    added, _ = upsert_documents(
+        index_dir, docs, embeddings, on_batch=on_batch, index_type=index_type, run=run,
+        before_commit=before_commit, replace=True, checkpoint=checkpoint, **pipeline_options
+    )
+    return added
+
+
+def remove_source(index_dir, source, embeddings_factory=None, wait=True):
+    """
+    Remove all chunks indexed for `source`. Chunks also found at other URLs
+    are kept for those. Returns the number removed. Without `wait`, raises
+    IndexBusy if another write is in progress.
+    """
+    vectorstore = get_vectorstore(index_dir, embeddings_factory)
+    if vectorstore is None:
+        return 0
+
+    with _write_lock(index_dir, wait):
+        base = _current(index_dir)
+        if base is None:
+            return 0
+        path = _new_version(index_dir, base)
+        try:
+            copy = MmapVectorStore(path, vectorstore.embeddings)
+            removed, unlinked = copy.remove_source(source)
+            if not removed and not unlinked:
+                copy.close()
+                shutil.rmtree(path, ignore_errors=True)
+                return 0
+            if not copy.count():
+                copy.close()
+                shutil.rmtree(path, ignore_errors=True)
+                _swap(index_dir, None)
+                invalidate(index_dir)
+                _collect_garbage(index_dir)
+                return removed
+            copy.commit()
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        _publish(index_dir, path, copy)
+        return removed
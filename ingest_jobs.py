@@ -0,0 +1,252 @@
+"""
+Background ingestion jobs.
+
+`research_pipeline.ingest` takes minutes for a long URL list. `IngestJobs`
+runs it on a worker thread so the Streamlit script returns right away:
+`submit` hands back a job id, `get` returns the job with its progress for the
+UI to poll, and `cancel` stops it after the batch in flight.
+
+Every job is saved to JOBS_DIR as one JSON file, rewritten after each
+embedded batch together with its checkpoint: the version being built and the
+URLs whose chunks are all written. A job that was cancelled, failed, or was
+running when the process died can be resumed: finished URLs are skipped and
+the rest are written into the same version, so embedding work is not repeated.
+Jobs that ended more than INGEST_JOB_RETENTION_SECONDS ago (default a week) are
+forgotten, together with their files and partial versions.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import index_store
+import research_pipeline
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("INGEST_JOBS_DIR", "ingest_jobs")
+DEFAULT_MAX_WORKERS = 2
+ACTIVE_STATES = ("queued", "running")
+RESUMABLE_STATES = ("cancelled", "failed", "interrupted")
+JOB_RETENTION_SECONDS = float(os.getenv("INGEST_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+
+@dataclass
+class IngestJob:
+    id: str
+    urls: list
+    index_dir: str
+    options: dict = field(default_factory=dict)
+    suggest_questions: bool = True
+    state: str = "queued"
+    stage: str = "queued"
+    checkpoint: dict = field(default_factory=dict)
+    summary: dict = None
+    questions: list = None
+    content_sample: str = None
+    error: str = None
+    created: float = field(default_factory=time.time)
+    finished: float = None
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    @property
+    def resumable(self):
+        return self.state in RESUMABLE_STATES
+
+
+def _summary(report):
+    return {
+        "urls": report.urls,
+        "loaded": len(report.loaded),
+        "failed": [{"url": r.url, "error": r.error} for r in report.failed],
+        "skipped": report.skipped,
+        "chunks": report.chunk_count,
+        "added": report.added,
+        "removed": report.removed,
+        "embedding_cache": report.embedding_cache,
+        "page_cache": report.page_cache,
+        "dedup": report.dedup,
+        "metrics": report.metrics,
+        "seconds": round(report.seconds, 3),
+    }
+
+
+class IngestJobs:
+    def __init__(self, jobs_dir=JOBS_DIR, max_workers=DEFAULT_MAX_WORKERS, retention=JOB_RETENTION_SECONDS):
+        self.jobs_dir = jobs_dir
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._reports = {}  # job id -> IngestReport of the running attempt
+        self._cancels = {}  # job id -> threading.Event
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._load()
+        self.prune()
+
+    def submit(self, urls, index_dir, suggest_questions=True, **options):
+        """
+        Queue ingestion of `urls` into `index_dir` and return the job id.
+        `options` are passed to `research_pipeline.ingest` and must be JSON
+        serializable, so the job can be resumed by a later process.
+        """
+        self.prune()
+        job = IngestJob(uuid.uuid4().hex[:12], list(urls), index_dir, options, suggest_questions)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._start(job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, index_dir=None):
+        """Jobs for `index_dir` (or all), newest first."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if index_dir is None or job.index_dir == index_dir]
+        return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+    def progress(self, job_id):
+        """URLs fetched and failed, chunks embedded, and the stage of a job, for polling."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        report = self._reports.get(job_id)
+        done = len(job.checkpoint.get("done", ()))
+        progress = {"state": job.state, "stage": job.stage, "urls": len(job.urls),
+                    "urls_fetched": done, "urls_failed": 0, "chunks_embedded": 0}
+        if report is not None:
+            progress["urls_fetched"] = report.skipped + len(report.loaded) + len(report.failed)
+            progress["urls_failed"] = len(report.failed)
+            progress["chunks_embedded"] = report.chunk_count
+        elif job.summary:
+            progress["urls_fetched"] = job.summary["skipped"] + job.summary["loaded"] + len(job.summary["failed"])
+            progress["urls_failed"] = len(job.summary["failed"])
+            progress["chunks_embedded"] = job.summary["chunks"]
+        return progress
+
+    def cancel(self, job_id):
+        """Stop a job after the batch in flight; it can be resumed later."""
+        with self._lock:
+            event = self._cancels.get(job_id)
+        if event is not None:
+            event.set()
+
+    def resume(self, job_id):
+        """Run a cancelled, failed or interrupted job again from its checkpoint."""
+        job = self.get(job_id)
+        if job is None or not job.resumable:
+            return False
+        job.state, job.stage, job.error = "queued", "queued", None
+        self._start(job)
+        return True
+
+    def discard(self, job_id):
+        """Forget a finished job and delete its partial index version."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.active:
+                return False
+            del self._jobs[job_id]
+        if job.checkpoint.get("version"):
+            index_store.discard_checkpoint(job.index_dir, job.checkpoint)
+        try:
+            os.remove(self._file(job_id))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def prune(self):
+        """Discard the jobs that ended more than `retention` seconds ago. Returns how many."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job.id for job in self._jobs.values()
+                       if not job.active and (job.finished or job.created) < cutoff]
+        return sum(self.discard(job_id) for job_id in expired)
+
+    # -- internals ----------------------------------------------------------
+
+    def _start(self, job):
+        with self._lock:
+            self._cancels[job.id] = threading.Event()
+        self._save(job)
+        self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        cancel = self._cancels[job.id]
+        if cancel.is_set():
+            self._finish(job, "cancelled")
+            return
+        report = research_pipeline.IngestReport()
+        self._reports[job.id] = report
+        job.state, job.stage, job.finished = "running", "ingesting", None
+        self._save(job)
+        try:
+            research_pipeline.ingest(
+                job.urls, job.index_dir, keep_chunks=False, report=report,
+                cancel=cancel, checkpoint=job.checkpoint, on_batch=lambda _: self._save(job),
+                **job.options
+            )
+        except research_pipeline.IngestCancelled:
+            job.summary = _summary(report)
+            self._finish(job, "cancelled")
+            return
+        except Exception as e:
+            logger.exception("ingest job %s failed", job.id)
+            job.summary = _summary(report)
+            job.error = str(e)
+            self._finish(job, "failed")
+            return
+        finally:
+            self._reports.pop(job.id, None)
+
+        job.summary = _summary(report)
+        if job.suggest_questions and (report.chunk_count or report.skipped):
+            job.stage = "questions"
+            self._save(job)
+            try:
+                job.questions, sample = research_pipeline.suggest_questions(job.index_dir)
+                job.content_sample = sample[:1500]
+            except Exception:
+                logger.exception("suggesting questions failed for job %s", job.id)
+                job.questions = list(research_pipeline.FALLBACK_QUESTIONS)
+        self._finish(job, "done")
+
+    def _finish(self, job, state):
+        job.state = job.stage = state
+        job.finished = time.time()
+        self._save(job)
+
+    def _file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        with self._lock:
+            payload = json.dumps(asdict(job))
+        tmp = self._file(job.id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self._file(job.id))
+
+    def _load(self):
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), encoding="utf-8") as f:
+                    job = IngestJob(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                logger.warning("skipping unreadable job file %s", name)
+                continue
+            if job.active:
+                # the process running it is gone
+                job.state = job.stage = "interrupted"
+            self._jobs[job.id] = job
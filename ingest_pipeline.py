@@ -0,0 +1,168 @@
+"""
+Streaming split -> embed -> index pipeline.
+
+Instead of loading every article, splitting every article and then embedding
+every chunk in one call, documents flow through the stages one at a time:
+
+    documents --split (parallel_parse)--> chunks --batch--> [bounded queue] --embed (N in flight)--> index
+
+A producer thread pulls chunks as they are split and fills a bounded queue of
+fixed-size batches; when the embedders fall behind the queue fills up and the producer
+(and whatever generator feeds it) blocks. Several batches are embedded
+concurrently and each is yielded to the caller (`index_store` writes it to the
+new index version) as soon as it completes, so peak memory is bounded by the
+queue and in-flight batches rather than by the size of the corpus.
+"""
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+import metrics
+
+DEFAULT_BATCH_SIZE = 128
+DEFAULT_MAX_IN_FLIGHT = 4
+MAX_RETRIES = 6
+
+_DONE = object()
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _is_rate_limit(error):
+    if type(error).__name__ == "RateLimitError":
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Backoff:
+    """
+    Shared pause for all embedding workers. When one batch is rate limited
+    every worker holds off, instead of each one hammering the API in turn.
+    """
+
+    def __init__(self, base_delay=1.0, max_delay=60.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, error, attempt):
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay *= 0.5 + random.random() / 2
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+
+def _embed_batch(embeddings, batch, backoff, max_retries=MAX_RETRIES, run=None):
+    texts = [doc.page_content for doc in batch]
+    for attempt in range(max_retries + 1):
+        backoff.wait()
+        try:
+            with metrics.stage(run, "embed"):
+                return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_rate_limit(e):
+                raise
+            if run is not None:
+                run.count("embed_rate_limited")
+            backoff.pause(e, attempt)
+
+
+def embed_stream(chunks, embeddings, batch_size=DEFAULT_BATCH_SIZE,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, run=None):
+    """
+    Embed `chunks` (any iterable of Documents) in batches of `batch_size`
+    with up to `max_in_flight` requests outstanding. Yields (batch, vectors)
+    in completion order. Embedding time and batch counts are recorded on
+    `run`, a metrics.RunMetrics, if given.
+    """
+    batches = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for batch in batched(chunks, batch_size):
+                if not put(batch):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    producer.start()
+    backoff = _Backoff()
+    in_flight = {}
+    exhausted = False
+
+    pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embed")
+    try:
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    batch = batches.get(timeout=0.05 if in_flight else None)
+                except queue.Empty:
+                    break
+                if batch is _DONE:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(_embed_batch, embeddings, batch, backoff, run=run)] = batch
+
+            if not in_flight:
+                if exhausted:
+                    break
+                continue
+
+            done, _ = wait(in_flight, timeout=None if exhausted else 0.05,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = in_flight.pop(future)
+                vectors = future.result()
+                if run is not None:
+                    run.count("embed_batches")
+                    run.count("embedded_chunks", len(batch))
+                yield batch, vectors
+
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
@@ -1,12 +1,9 @@
 import os,time
 import streamlit as st
-from langchain.chains.retrieval_qa.base import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredURLLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_openai import OpenAI
 from dotenv import load_dotenv
+import index_store
+import url_loader
+import research_pipeline
 
 load_dotenv()
 # Set the OpenAI API key
@@ -15,60 +12,44 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 st.title("NEWS RESEARCH TOOL")
 st.sidebar.title("NEWS Article URLs")
 
-urls = []
-for i in range(3):
-    url = st.sidebar.text_input(f"URL {i+1}")
-    urls.append(url)
+url_text = st.sidebar.text_area("URLs (one per line)", height=150)
+url_file = st.sidebar.file_uploader("or upload a URL list", type=["txt", "csv"])
+if url_file is not None:
+    url_text += "\n" + url_file.getvalue().decode("utf-8", errors="ignore")
+urls = url_loader.parse_url_list(url_text)
 
 process_url_clicked = st.sidebar.button("Process URLs")
 
 main_placeholder = st.empty()
-index_dir = "embeddings_folder" # faiss index folder
-
-llm = OpenAI(temperature=0.9, max_tokens=500)
+index_dir = index_store.corpus_dir(st.sidebar.text_input("Corpus", value=index_store.DEFAULT_CORPUS))
 
 # Step 1: Process URLs -> Create embeddings & FAISS index
-if process_url_clicked:
-    #load the data from the URLs
-    loader = UnstructuredURLLoader(urls=urls)
-    main_placeholder.text("📥 Loading data from URLs...")
-    data = loader.load()
-    
-    #split the data into manageable chunks
-    text_splitter = RecursiveCharacterTextSplitter(
+if process_url_clicked and not urls:
+    st.sidebar.warning("Enter at least one URL to process.")
+elif process_url_clicked:
+    #load the data from the URLs, split them and index the chunks
+    main_placeholder.text(f"📥 Loading data from {len(urls)} URLs...")
+    report = research_pipeline.ingest(
+        urls, index_dir, keep_chunks=False,
         separators=['\n\n','\n','.',','],
-        chunk_size=1000, 
-        #chunk_overlap=200
-        )
-    
-    main_placeholder.text("✂️ Text Splitter ..... Started...")
-    docs = text_splitter.split_documents(data)
-    
-    #create embeddings for the chunks and save them to Faiss index
-    main_placeholder.text("🔎 Creating embedding vectors and faiss indexes started .....")
-    embeddings = OpenAIEmbeddings()
-    vectorstore_openai = FAISS.from_documents(docs, embeddings)
+        chunk_size=1000,
+        chunk_overlap=200,
+        on_batch=lambda r: main_placeholder.text(f"🔎 {r.chunk_count} chunks embedded .....")
+    )
+    for r in report.failed:
+        st.sidebar.warning(f"Could not load {r.url}: {r.error}")
+    st.sidebar.caption(f"Embedding cache: {report.embedding_cache['hits']} hits, {report.embedding_cache['misses']} misses")
     time.sleep(2)
     
-    # save the faiss index
-    vectorstore_openai.save_local(index_dir)
     main_placeholder.text("✅ Embeddings created successfully!")
 
 #Step 2 : Ask questions 
 query = main_placeholder.text_input("❓Ask a Question : ")
 if query:
-    if os.path.exists(index_dir):
-        # Recreate the embeddings obect
-        embeddings = OpenAIEmbeddings()
-        vectorstore = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
-        
-        chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=vectorstore.as_retriever(),
-            return_source_documents=True
-        )
-        
-        result = chain({"query": query}, return_only_outputs=True)
+    # reuses the already opened index and chain unless the index changed on disk
+    llm = research_pipeline.get_llm(temperature=0.9, max_tokens=500)
+    result = research_pipeline.answer(query, index_dir, llm)
+    if result is not None:
         # result -> {"result" : "", "sources" : []}
         st.header("Answer:")
         st.subheader(result["result"])
@@ -79,10 +60,11 @@ if query:
             st.subheader("Sources:")
             unique_urls = set()
             for source in sources:
-                url = source.metadata.get("source", "Unknown Source")
-                if url not in unique_urls:
-                    st.write(url)
-                    unique_urls.add(url)
+                # deduplicated chunks list every URL they appeared at
+                for url in source.metadata.get("sources") or [source.metadata.get("source", "Unknown Source")]:
+                    if url not in unique_urls:
+                        st.write(url)
+                        unique_urls.add(url)
 
     
     else:
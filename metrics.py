@@ -0,0 +1,217 @@
+"""
+Per-stage instrumentation for ingestion runs and queries.
+
+A `RunMetrics` collects the wall time spent in each stage of one ingest run
+or one query, plus counts (chunks, tokens, batches, cache hits...). Stages
+that run concurrently, like fetching or embedding, add up the time spent in
+every worker, so a stage can report more seconds than the run took.
+
+Finished runs are folded into the process-wide `REGISTRY` and exported to
+METRICS_DIR (default "metrics", empty to disable):
+
+    pipeline.prom   Prometheus text exposition format, rewritten after every run
+    events.jsonl    one JSON line per finished run
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PROM_FILE = "pipeline.prom"
+EVENTS_FILE = "events.jsonl"
+PREFIX = "research"
+
+_export_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Tokens in `text` under the OpenAI tokenizer, or about 4 characters per token without tiktoken."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """The first `max_tokens` tokens of `text`, measured like `count_tokens`."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class Registry:
+    """Process-wide counters and summaries (count, sum, max) keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._summaries = {}
+        self._last = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, _labels(labels))] += value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            summary = self._summaries.setdefault((name, _labels(labels)), [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def remember(self, kind, summary):
+        with self._lock:
+            self._last[kind] = summary
+
+    def last(self, kind):
+        """Summary of the most recent finished run of `kind`, or None."""
+        return self._last.get(kind)
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        for (name, labels), (count, total, _) in summaries:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+        for (name, labels), (_, _, peak) in summaries:
+            metric = f"{PREFIX}_{name}_max"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{_format_labels(labels)} {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+            self._last.clear()
+
+
+REGISTRY = Registry()
+
+
+class RunMetrics:
+    """Stage timings and counts of a single ingest run or query."""
+
+    def __init__(self, kind, **labels):
+        self.kind = kind
+        self.labels = labels
+        self.stages = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.started = time.perf_counter()
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] += seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] += value
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                **self.labels,
+                "seconds": round(self.seconds if self.seconds is not None
+                                 else time.perf_counter() - self.started, 6),
+                "stages": {name: round(value, 6) for name, value in self.stages.items()},
+                "counts": dict(self.counts),
+            }
+
+    def finish(self):
+        """Record the run in the registry, export it, and return its summary."""
+        self.seconds = time.perf_counter() - self.started
+        summary = self.as_dict()
+        REGISTRY.observe(f"{self.kind}_seconds", self.seconds, **self.labels)
+        for name, seconds in summary["stages"].items():
+            REGISTRY.observe(f"{self.kind}_stage_seconds", seconds, stage=name, **self.labels)
+        for name, value in summary["counts"].items():
+            REGISTRY.inc(f"{self.kind}_{name}", value, **self.labels)
+        REGISTRY.remember(self.kind, summary)
+        export(summary)
+        return summary
+
+
+def stage(run, name):
+    """`run.stage(name)`, or a no-op when no RunMetrics is being collected."""
+    return run.stage(name) if run is not None else nullcontext()
+
+
+def export(event=None, metrics_dir=None):
+    """Append `event` to the event log and rewrite the Prometheus file."""
+    metrics_dir = METRICS_DIR if metrics_dir is None else metrics_dir
+    if event is not None:
+        logger.info("%s", json.dumps(event))
+    if not metrics_dir:
+        return
+    try:
+        with _export_lock:
+            _write(event, metrics_dir)
+    except OSError:
+        logger.warning("could not write metrics to %s", metrics_dir, exc_info=True)
+
+
+def _write(event, metrics_dir):
+    os.makedirs(metrics_dir, exist_ok=True)
+    if event is not None:
+        with open(os.path.join(metrics_dir, EVENTS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), **event}) + "\n")
+    path = os.path.join(metrics_dir, PROM_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(path + ".tmp", path)
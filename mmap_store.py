@@ -0,0 +1,837 @@
+"""
+On-disk vector store: memory-mapped vectors plus an SQLite document store.
+
+`FAISS.load_local` unpickles the whole docstore on every load. This store
+keeps everything on disk and only touches what a query needs:
+
+    vectors.f32    float32 rows this store wrote, in insertion order,
+                   memory-mapped
+    docs.sqlite3   chunk id, row position, source, text and metadata of those
+                   rows, plus a link from each chunk to every URL it was
+                   found at; also tombstones and metadata changes for rows
+                   of the shared segments
+    seg-<id>.*     read-only segments shared with earlier versions: the same
+                   two files for the rows before this store's own
+    index.faiss    optional ANN index over the rows (see index_factory),
+                   memory-mapped where FAISS supports it
+    manifest.txt   generation, row count and dimension, rewritten on commit
+
+Opening maps the files and reads a few meta rows, so it takes the same time
+for ten chunks or a million. A query searches the vectors and then reads only
+the SQLite rows of its top-k hits. Rows appended after the ANN index was
+built are searched exactly and merged in. Deleted chunks leave tombstone rows
+in the vector file that are skipped at query time until `commit` compacts it.
+
+`copy_store` starts a new version without copying the corpus: the rows of
+the old one become shared segments, hard-linked rather than copied, so an
+update writes only its new rows and tombstones. `commit` folds trailing
+segments no bigger than the store's own rows back into it, which keeps the
+number of segments logarithmic in the number of updates.
+"""
+import bisect
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+import index_factory
+
+VECTORS_FILE = "vectors.f32"
+DOCS_FILE = "docs.sqlite3"
+ANN_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.txt"
+SEGMENT_PREFIX = "seg-"
+
+COMPACT_RATIO = 0.25  # compact once this share of rows are tombstones
+ANN_STALE_RATIO = 0.1  # rebuild the ANN index once this share of rows is outside it
+MAX_SEGMENTS = 16  # fold segments beyond this many even if they are big
+_SQL_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    source TEXT,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    PRIMARY KEY (source, pos)
+);
+CREATE INDEX IF NOT EXISTS links_pos ON links (pos);
+CREATE TABLE IF NOT EXISTS deleted (
+    pos INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS overrides (
+    pos INTEGER PRIMARY KEY,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_counts (
+    source TEXT PRIMARY KEY,
+    chunks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def chunk_sources(metadata):
+    """Every URL a chunk was found at: its merged "sources", else its "source"."""
+    sources = metadata.get("sources") or [metadata.get("source")]
+    return [source for source in dict.fromkeys(sources) if source is not None]
+
+
+def read_manifest(path):
+    """Return the manifest of the store at `path` as a dict, or None."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            return dict(line.strip().split("=", 1) for line in f if "=" in line)
+    except FileNotFoundError:
+        return None
+
+
+def copy_store(src, dst):
+    """
+    Start a store at the new directory `dst` from the one at `src`, without
+    copying its rows: the segments of `src`, plus its own rows as one more
+    segment, are hard-linked into `dst` (copied where the filesystem has no
+    hard links). They are never written again; `dst` appends to files of its
+    own. Only the tombstones, metadata changes and source counts are copied.
+    The ANN index is linked too, since it is only ever replaced.
+    """
+    os.makedirs(dst)
+    db = _connect(src)
+    try:
+        meta = dict(db.execute("SELECT key, value FROM meta"))
+        segments = json.loads(meta.get("segments", "[]"))
+        for segment_id, _ in segments:
+            for ext in (".f32", ".sqlite3"):
+                name = SEGMENT_PREFIX + segment_id + ext
+                _link_file(os.path.join(src, name), os.path.join(dst, name))
+        own = int(meta.get("rows", 0)) - sum(rows for _, rows in segments)
+        if own:
+            name = SEGMENT_PREFIX + meta["segment"]
+            _freeze(db, os.path.join(src, DOCS_FILE), os.path.join(dst, name + ".sqlite3"))
+            _link_file(os.path.join(src, VECTORS_FILE), os.path.join(dst, name + ".f32"))
+            segments.append([meta["segment"], own])
+        for name in os.listdir(src):
+            source = os.path.join(src, name)
+            if (os.path.isfile(source) and not name.startswith((DOCS_FILE, VECTORS_FILE, SEGMENT_PREFIX))
+                    and not name.endswith(".tmp")):
+                if name == ANN_FILE:
+                    _link_file(source, os.path.join(dst, name))
+                else:
+                    shutil.copy2(source, os.path.join(dst, name))
+
+        copy = _connect(dst)
+        try:
+            copy.executemany("INSERT INTO deleted VALUES (?)", db.execute("SELECT pos FROM deleted"))
+            copy.executemany("INSERT INTO overrides VALUES (?, ?)", db.execute("SELECT pos, metadata FROM overrides"))
+            copy.executemany(
+                "INSERT INTO links VALUES (?, ?)",
+                db.execute("SELECT source, pos FROM links WHERE pos IN (SELECT pos FROM overrides)"),
+            )
+            copy.executemany("INSERT OR REPLACE INTO source_counts VALUES (?, ?)",
+                             db.execute("SELECT source, chunks FROM source_counts"))
+            for key in ("rows", "dim", "live"):
+                _put_meta(copy, key, meta.get(key, 0))
+            _put_meta(copy, "segments", json.dumps(segments))
+            copy.commit()
+        finally:
+            copy.close()
+    finally:
+        db.close()
+
+
+def _connect(path):
+    """Open the document store in `path`, upgrading one written by an older version of this module."""
+    db = sqlite3.connect(os.path.join(path, DOCS_FILE), check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(_SCHEMA)
+    meta = dict(db.execute("SELECT key, value FROM meta"))
+    if "live" not in meta:
+        _put_meta(db, "live", db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+    if "links" not in meta:
+        # chunks used to be found by their primary source only
+        rows = db.execute("SELECT pos, metadata FROM chunks").fetchall()
+        db.executemany(
+            "INSERT OR IGNORE INTO links VALUES (?, ?)",
+            [(source, pos) for pos, metadata in rows for source in chunk_sources(json.loads(metadata))],
+        )
+        _put_meta(db, "links", 1)
+    if "counts" not in meta:
+        db.execute("DELETE FROM source_counts")
+        db.execute("INSERT INTO source_counts SELECT source, COUNT(*) FROM links GROUP BY source")
+        _put_meta(db, "counts", 1)
+    if "segment" not in meta:
+        _put_meta(db, "segment", uuid.uuid4().hex)
+    db.commit()
+    return db
+
+
+def _put_meta(db, key, value):
+    db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+
+def _link_file(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _freeze(db, path, target):
+    """Make `target` a read-only copy of the database `db` at `path`: a hard link once the WAL is folded in."""
+    busy, _, _ = db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    if not busy:
+        try:
+            os.link(path, target)
+            return
+        except OSError:
+            pass
+    copy = sqlite3.connect(target)
+    try:
+        db.backup(copy)
+    finally:
+        copy.close()
+
+
+def _batches(items, size=_SQL_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _select_in(db, sql, values):
+    """Rows of `sql`, whose `{}` is replaced by placeholders, for `values` in batches."""
+    rows = []
+    for batch in _batches(values):
+        rows.extend(db.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+    return rows
+
+
+@dataclass
+class _Segment:
+    """Rows `start`..`start + rows` of a store, shared read-only with other versions."""
+    id: str
+    start: int
+    rows: int
+    db: sqlite3.Connection
+    vectors: np.ndarray
+
+
+class _Rows:
+    """The vector rows of a store, over its segments and its own file, indexed by position."""
+
+    def __init__(self, parts, dim):
+        self._parts = parts  # [(first position, rows)] in position order
+        self._starts = [start for start, _ in parts]
+        self.dim = dim
+
+    def __len__(self):
+        return sum(len(rows) for _, rows in self._parts)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            pieces = [rows for _, rows in self.parts(key.start or 0)]
+            return pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+        if np.isscalar(key):
+            start, rows = self._parts[bisect.bisect_right(self._starts, key) - 1]
+            return rows[key - start]
+        positions = np.asarray(key, dtype=np.int64)
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        parts = np.searchsorted(self._starts, positions, side="right") - 1
+        for i, (start, rows) in enumerate(self._parts):
+            mask = parts == i
+            if mask.any():
+                out[mask] = rows[positions[mask] - start]
+        return out
+
+    def parts(self, start=0):
+        """(first position, rows) pieces covering the positions from `start` on."""
+        for offset, rows in self._parts:
+            if offset + len(rows) > start:
+                skip = max(start - offset, 0)
+                yield offset + skip, rows[skip:]
+
+
+class MmapVectorStore(VectorStore):
+    def __init__(self, path, embedding):
+        self.path = path
+        self.embedding_function = embedding
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._db = _connect(path)
+        self.rows = int(self._meta("rows", 0))
+        self.dim = int(self._meta("dim", 0))
+        self.live = int(self._meta("live"))
+        self._segments = []
+        self.start = 0  # first row of this store's own file
+        for segment_id, rows in json.loads(self._meta("segments", "[]")):
+            self._segments.append(self._open_segment(segment_id, self.start, rows))
+            self.start += rows
+        self._vectors = None
+        self._ann = None
+        self._map_vectors()
+        self._load_ann()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def close(self):
+        with self._lock:
+            self._vectors = None
+            self._ann = None
+            for segment in self._segments:
+                segment.db.close()
+            self._db.close()
+
+    # -- writing ------------------------------------------------------------
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        texts, vectors = zip(*text_embeddings)
+        vectors = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            path = self._file(VECTORS_FILE)
+            expected = (self.rows - self.start) * self.dim * 4
+            if os.path.exists(path) and os.path.getsize(path) != expected:
+                # drop rows left behind by an interrupted write
+                os.truncate(path, expected)
+            with open(path, "ab") as f:
+                f.write(vectors.tobytes())
+
+            self._db.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.rows + i, doc_id, metadata.get("source"), text, json.dumps(metadata))
+                    for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                ],
+            )
+            self._link((self.rows + i, metadata) for i, metadata in enumerate(metadatas))
+            self.rows += len(texts)
+            self.live += len(texts)
+            self._set_meta("rows", self.rows)
+            self._set_meta("live", self.live)
+            self._db.commit()
+            self._map_vectors()
+        return list(ids)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self._lock:
+            self._drop(list(self._positions(ids).values()))
+            self._db.commit()
+        return True
+
+    def remove_source(self, source, before=None):
+        """
+        Unlink `source` from its chunks, only those at row positions below
+        `before` if given. A chunk also found at other URLs stays, with
+        `source` dropped from its metadata; any other chunk is deleted.
+        Returns (deleted, unlinked).
+        """
+        with self._lock:
+            rows = self._rows(self._source_positions(source, self.rows if before is None else before))
+            doomed, kept = [], {}
+            for pos, _, _, metadata in rows.values():
+                metadata = json.loads(metadata)
+                others = [url for url in chunk_sources(metadata) if url != source]
+                if not others:
+                    doomed.append(pos)
+                    continue
+                metadata["sources"] = others
+                if metadata.get("source") == source:
+                    metadata["source"] = others[0]
+                kept[pos] = metadata
+            self._update(kept)
+            self._drop(doomed)
+            self._db.commit()
+        return len(doomed), len(kept)
+
+    def update_metadata(self, metadatas):
+        """
+        Replace the metadata of existing chunks, given as {id: metadata}.
+        Vectors and row positions are unchanged, so no commit is needed.
+        """
+        if not metadatas:
+            return
+        with self._lock:
+            self._update({pos: metadatas[doc_id] for doc_id, pos in self._positions(list(metadatas)).items()})
+            self._db.commit()
+
+    def commit(self, index_type=None):
+        """
+        Finish a batch of writes: compact tombstones if there are many, fold
+        small trailing segments into this store's own file, refresh the ANN
+        index and publish a new manifest generation.
+        """
+        with self._lock:
+            live = self.count()
+            if self.rows and self.rows - live > COMPACT_RATIO * self.rows:
+                self._compact()
+            while self._segments and (self._segments[-1].rows <= self.rows - self.start
+                                      or len(self._segments) > MAX_SEGMENTS):
+                self._absorb()
+            self._refresh_ann(index_type or index_factory.DEFAULT_INDEX_TYPE, live)
+            # the next version links this file; everything must be in it
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            manifest = {
+                "generation": time.time_ns(),
+                "rows": self.rows,
+                "live": live,
+                "dim": self.dim,
+            }
+            tmp = self._file(MANIFEST_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(f"{key}={value}\n" for key, value in manifest.items())
+            os.replace(tmp, self._file(MANIFEST_FILE))
+
+    # -- reading ------------------------------------------------------------
+
+    def count(self):
+        return self.live
+
+    def sources(self):
+        """Every URL some chunk was found at, including those merged into another URL's chunk."""
+        with self._lock:
+            rows = self._db.execute("SELECT source FROM source_counts WHERE chunks > 0 ORDER BY source").fetchall()
+        return [row[0] for row in rows]
+
+    def ids_for_source(self, source):
+        """Ids of the chunks found at `source`."""
+        with self._lock:
+            rows = self._rows(self._source_positions(source, self.rows))
+        return [rows[pos][1] for pos in sorted(rows)]
+
+    def sample_vectors(self, limit):
+        """
+        (positions, vectors) of up to `limit` live rows, spread evenly over
+        the store, for analysing the whole corpus without a query.
+        """
+        with self._lock:
+            live = self._live_positions()
+            if len(live) > limit:
+                live = [live[i] for i in np.linspace(0, len(live) - 1, limit).astype(int)]
+            if not live or self._vectors is None:
+                return [], np.empty((0, self.dim), dtype=np.float32)
+            return live, self._vectors[live]
+
+    def documents_at(self, positions):
+        """The documents at row `positions` (from `sample_vectors`), in order."""
+        positions = list(positions)
+        with self._lock:
+            return [doc for doc, _, _ in self._fetch(positions, [0.0] * len(positions))]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, fetch_k=20, **kwargs):
+        wanted = max(k, fetch_k) if filter else k
+        with self._lock:
+            hits = [(doc, distance) for doc, distance, _ in self._hits(embedding, wanted)]
+
+        if filter:
+            hits = [
+                (doc, score) for doc, score in hits
+                if all(doc.metadata.get(key) == value for key, value in filter.items())
+            ]
+        return hits[:k]
+
+    def similarity_search_with_vectors(self, embedding, k=4):
+        """
+        The top `k` hits as (doc, distance, vector), with each chunk's stored
+        vector, so callers can compare hits with each other without
+        re-embedding them.
+        """
+        with self._lock:
+            return [
+                (doc, distance, np.array(self._vectors[pos]))
+                for doc, distance, pos in self._hits(embedding, k)
+            ]
+
+    def similarity_search_with_vectors_batch(self, embeddings, k=4):
+        """`similarity_search_with_vectors` for a matrix of query embeddings, searched together."""
+        with self._lock:
+            return [
+                [(doc, distance, np.array(self._vectors[pos])) for doc, distance, pos in hits]
+                for hits in self._hits_batch(embeddings, k)
+            ]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        if path is None:
+            raise ValueError("MmapVectorStore.from_texts needs a `path`")
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.commit()
+        return store
+
+    # -- internals ----------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        _put_meta(self._db, key, value)
+
+    def _open_segment(self, segment_id, start, rows):
+        uri = pathlib.Path(self._file(SEGMENT_PREFIX + segment_id + ".sqlite3")).absolute().as_uri()
+        db = sqlite3.connect(uri + "?immutable=1", uri=True, check_same_thread=False)
+        vectors = np.memmap(self._file(SEGMENT_PREFIX + segment_id + ".f32"), dtype=np.float32,
+                            mode="r", shape=(rows, self.dim))
+        return _Segment(segment_id, start, rows, db, vectors)
+
+    def _map_vectors(self):
+        parts = [(segment.start, segment.vectors) for segment in self._segments]
+        if self.rows > self.start:
+            parts.append((self.start, np.memmap(self._file(VECTORS_FILE), dtype=np.float32,
+                                                mode="r", shape=(self.rows - self.start, self.dim))))
+        self._vectors = _Rows(parts, self.dim) if parts else None
+
+    def _segment_of(self, pos):
+        return self._segments[bisect.bisect_right([s.start for s in self._segments], pos) - 1]
+
+    def _by_segment(self, positions):
+        """Shared `positions` grouped as (segment, positions)."""
+        groups = {}
+        for pos in positions:
+            groups.setdefault(self._segment_of(pos).id, []).append(pos)
+        return [(segment, groups[segment.id]) for segment in self._segments if segment.id in groups]
+
+    def _deleted(self, positions):
+        return {row[0] for row in _select_in(self._db, "SELECT pos FROM deleted WHERE pos IN ({})", positions)}
+
+    def _overridden(self, positions):
+        return dict(_select_in(self._db, "SELECT pos, metadata FROM overrides WHERE pos IN ({})", positions))
+
+    def _positions(self, ids):
+        """{id: row position} of the live chunks among `ids`."""
+        ids = list(ids)
+        found = dict(_select_in(self._db, "SELECT id, pos FROM chunks WHERE id IN ({})", ids))
+        for segment in reversed(self._segments):
+            missing = [doc_id for doc_id in ids if doc_id not in found]
+            if not missing:
+                break
+            found.update(_select_in(segment.db, "SELECT id, pos FROM chunks WHERE id IN ({})", missing))
+        dead = self._deleted([pos for pos in found.values() if pos < self.start])
+        return {doc_id: pos for doc_id, pos in found.items() if pos not in dead}
+
+    def _source_positions(self, source, before):
+        """Row positions below `before` of the live chunks linked to `source`."""
+        # this store's own rows, and shared rows whose metadata was changed here
+        positions = [row[0] for row in self._db.execute(
+            "SELECT pos FROM links WHERE source = ? AND pos < ?", (source, before))]
+        for segment in self._segments:
+            if segment.start >= before:
+                break
+            # a segment's database also links the rows it changed below it; those are stale
+            found = [row[0] for row in segment.db.execute(
+                "SELECT pos FROM links WHERE source = ? AND pos >= ? AND pos < ?", (source, segment.start, before))]
+            hidden = self._deleted(found) | set(self._overridden(found))
+            positions.extend(pos for pos in found if pos not in hidden)
+        return positions
+
+    def _links_at(self, positions):
+        """{position: [sources]} for live chunks."""
+        links = {pos: [] for pos in positions}
+        for pos, source in _select_in(self._db, "SELECT pos, source FROM links WHERE pos IN ({})", links):
+            links[pos].append(source)
+        shared = [pos for pos in links if pos < self.start]
+        overridden = self._overridden(shared)
+        for segment, group in self._by_segment(pos for pos in shared if pos not in overridden):
+            for pos, source in _select_in(segment.db, "SELECT pos, source FROM links WHERE pos IN ({})", group):
+                links[pos].append(source)
+        return links
+
+    def _link(self, rows):
+        """Link each chunk in `rows`, (position, metadata) pairs, to its sources."""
+        pairs = [(source, pos) for pos, metadata in rows for source in chunk_sources(metadata)]
+        self._db.executemany("INSERT OR IGNORE INTO links VALUES (?, ?)", pairs)
+        self._count_sources([source for source, _ in pairs], 1)
+
+    def _count_sources(self, sources, step):
+        self._db.executemany(
+            "INSERT INTO source_counts VALUES (?, ?) "
+            "ON CONFLICT (source) DO UPDATE SET chunks = chunks + excluded.chunks",
+            [(source, step * n) for source, n in Counter(sources).items()],
+        )
+        self._db.execute("DELETE FROM source_counts WHERE chunks <= 0")
+
+    def _drop(self, positions):
+        """Delete the live chunks at `positions`: own rows outright, shared ones by tombstone."""
+        links = self._links_at(positions)
+        self._count_sources([source for sources in links.values() for source in sources], -1)
+        for batch in _batches(positions):
+            marks = ",".join("?" * len(batch))
+            self._db.execute(f"DELETE FROM chunks WHERE pos IN ({marks})", batch)
+            self._db.execute(f"DELETE FROM links WHERE pos IN ({marks})", batch)
+            self._db.execute(f"DELETE FROM overrides WHERE pos IN ({marks})", batch)
+        self._db.executemany("INSERT OR IGNORE INTO deleted VALUES (?)",
+                             [(pos,) for pos in positions if pos < self.start])
+        self.live -= len(positions)
+        self._set_meta("live", self.live)
+
+    def _update(self, metadatas):
+        """Replace the metadata of the live chunks given as {position: metadata}."""
+        old = self._links_at(metadatas)
+        self._count_sources([source for sources in old.values() for source in sources], -1)
+        self._db.executemany("DELETE FROM links WHERE pos = ?", [(pos,) for pos in metadatas])
+        self._db.executemany(
+            "UPDATE chunks SET source = ?, metadata = ? WHERE pos = ?",
+            [(metadata.get("source"), json.dumps(metadata), pos)
+             for pos, metadata in metadatas.items() if pos >= self.start],
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO overrides VALUES (?, ?)",
+            [(pos, json.dumps(metadata)) for pos, metadata in metadatas.items() if pos < self.start],
+        )
+        self._link(metadatas.items())
+
+    def _live_positions(self):
+        dead = {row[0] for row in self._db.execute("SELECT pos FROM deleted")}
+        positions = []
+        for segment in self._segments:
+            positions.extend(row[0] for row in segment.db.execute("SELECT pos FROM chunks ORDER BY pos")
+                             if row[0] not in dead)
+        positions.extend(row[0] for row in self._db.execute("SELECT pos FROM chunks ORDER BY pos"))
+        return positions
+
+    def _load_ann(self):
+        path = self._file(ANN_FILE)
+        if not os.path.exists(path):
+            self._ann = None
+            return
+        import faiss
+
+        self._ann = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        index_factory.set_search_params(self._ann)
+
+    def _hits(self, embedding, wanted):
+        """Top `wanted` live hits as (doc, distance, row position). Call with the lock held."""
+        if not self.rows:
+            return []
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        tombstones = self.rows - self.live
+        fetch = min(self.rows, wanted + min(tombstones, 4 * wanted))
+        while True:
+            distances, positions = self._search(query, fetch)[0]
+            hits = self._fetch(positions, distances)
+            if len(hits) >= wanted or fetch >= min(self.rows, wanted + tombstones):
+                return hits[:wanted]
+            fetch = min(self.rows, wanted + tombstones)
+
+    def _hits_batch(self, embeddings, wanted):
+        """
+        `_hits` for every row of `embeddings` with one index search and one
+        SQLite read. Call with the lock held.
+        """
+        queries = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        if not self.rows:
+            return [[] for _ in range(len(queries))]
+        tombstones = self.rows - self.live
+        fetch = min(self.rows, wanted + min(tombstones, 4 * wanted))
+        found = self._search(queries, fetch)
+        by_pos = self._rows({pos for _, positions in found for pos in positions})
+        results = []
+        for query, (distances, positions) in zip(queries, found):
+            hits = self._fetch(positions, distances, by_pos)
+            if len(hits) < wanted and fetch < min(self.rows, wanted + tombstones):
+                hits = self._hits(query, wanted)  # too many tombstones among this query's hits
+            results.append(hits[:wanted])
+        return results
+
+    def _search(self, queries, fetch):
+        """
+        Top `fetch` (distances, row positions) for every row of `queries`,
+        over the ANN index plus the exact tail, in one search per part.
+        """
+        found = [[] for _ in range(len(queries))]
+        covered = 0
+        if self._ann is not None:
+            covered = self._ann.ntotal
+            distances, positions = self._ann.search(queries, min(fetch, covered))
+            for i in range(len(queries)):
+                found[i].extend(zip(distances[i], positions[i]))
+        if self.rows > covered:
+            import faiss
+
+            for offset, tail in self._vectors.parts(covered):
+                distances, positions = faiss.knn(queries, tail, min(fetch, len(tail)))
+                for i in range(len(queries)):
+                    found[i].extend(zip(distances[i], positions[i] + offset))
+        results = []
+        for hits in found:
+            hits = sorted((float(d), int(p)) for d, p in hits if p >= 0)[:fetch]
+            results.append(([d for d, _ in hits], [p for _, p in hits]))
+        return results
+
+    def _rows(self, positions):
+        """
+        The SQLite rows (pos, id, page_content, metadata) at `positions`, by
+        position, with changed metadata applied. Deleted rows are missing.
+        """
+        positions = list(positions)
+        own = [pos for pos in positions if pos >= self.start]
+        by_pos = {
+            row[0]: row
+            for row in _select_in(self._db, "SELECT pos, id, page_content, metadata FROM chunks WHERE pos IN ({})", own)
+        }
+        shared = [pos for pos in positions if pos < self.start]
+        if shared:
+            dead = self._deleted(shared)
+            overridden = self._overridden(shared)
+            for segment, group in self._by_segment(pos for pos in shared if pos not in dead):
+                for pos, doc_id, text, metadata in _select_in(
+                    segment.db, "SELECT pos, id, page_content, metadata FROM chunks WHERE pos IN ({})", group
+                ):
+                    by_pos[pos] = (pos, doc_id, text, overridden.get(pos, metadata))
+        return by_pos
+
+    def _fetch(self, positions, distances, by_pos=None):
+        """Read only the SQLite rows of the hits, skipping deleted ones."""
+        if not positions:
+            return []
+        if by_pos is None:
+            by_pos = self._rows(positions)
+        hits = []
+        for pos, distance in zip(positions, distances):
+            row = by_pos.get(pos)
+            if row is not None:
+                doc = Document(id=row[1], page_content=row[2], metadata=json.loads(row[3]))
+                hits.append((doc, distance, pos))
+        return hits
+
+    def _absorb(self):
+        """
+        Move the last shared segment into this store's own files, dropping
+        its tombstones from the tables. Row positions do not change.
+        """
+        segment = self._segments[-1]
+        end = segment.start + segment.rows
+        tmp = self._file(VECTORS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            for _, rows in self._vectors.parts(segment.start):
+                for start in range(0, len(rows), 65536):
+                    f.write(np.ascontiguousarray(rows[start:start + 65536]).tobytes())
+
+        in_segment = (segment.start, end)
+        dead = {row[0] for row in self._db.execute("SELECT pos FROM deleted WHERE pos >= ? AND pos < ?", in_segment)}
+        overridden = dict(self._db.execute("SELECT pos, metadata FROM overrides WHERE pos >= ? AND pos < ?",
+                                           in_segment))
+        cursor = segment.db.execute("SELECT pos, id, source, page_content, metadata FROM chunks")
+        while rows := cursor.fetchmany(_SQL_BATCH):
+            self._db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", [
+                (pos, doc_id, json.loads(overridden[pos]).get("source"), text, overridden[pos])
+                if pos in overridden else (pos, doc_id, source, text, metadata)
+                for pos, doc_id, source, text, metadata in rows if pos not in dead
+            ])
+        # changed chunks already have their links here
+        self._db.executemany("INSERT INTO links VALUES (?, ?)", (
+            (source, pos) for source, pos in segment.db.execute("SELECT source, pos FROM links WHERE pos >= ?",
+                                                                (segment.start,))
+            if pos not in dead and pos not in overridden
+        ))
+        self._db.execute("DELETE FROM deleted WHERE pos >= ? AND pos < ?", in_segment)
+        self._db.execute("DELETE FROM overrides WHERE pos >= ? AND pos < ?", in_segment)
+
+        self._segments.pop()
+        self.start = segment.start
+        self._set_meta("segments", json.dumps([[s.id, s.rows] for s in self._segments]))
+        self._vectors = None
+        os.replace(tmp, self._file(VECTORS_FILE))
+        self._db.commit()
+        segment.db.close()
+        for ext in (".f32", ".sqlite3"):
+            os.remove(self._file(SEGMENT_PREFIX + segment.id + ext))
+        self._map_vectors()
+
+    def _compact(self):
+        """Rewrite the vector file without tombstones and renumber the rows."""
+        while self._segments:
+            self._absorb()
+        live = [row[0] for row in self._db.execute("SELECT pos FROM chunks ORDER BY pos")]
+        tmp = self._file(VECTORS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            for start in range(0, len(live), 65536):
+                f.write(np.ascontiguousarray(self._vectors[live[start:start + 65536]]).tobytes())
+
+        # positions only ever move down, so renumbering in order never collides
+        moves = [(new, old) for new, old in enumerate(live) if new != old]
+        self._db.executemany("UPDATE chunks SET pos = ? WHERE pos = ?", moves)
+        self._db.executemany("UPDATE links SET pos = ? WHERE pos = ?", moves)
+        self.rows = len(live)
+        self._set_meta("rows", self.rows)
+        self._vectors = None
+        self._ann = None
+        os.replace(tmp, self._file(VECTORS_FILE))
+        if os.path.exists(self._file(ANN_FILE)):
+            os.remove(self._file(ANN_FILE))
+        self._db.commit()
+        self._map_vectors()
+
+    def _refresh_ann(self, index_type, live):
+        path = self._file(ANN_FILE)
+        if index_type == "flat" or live < index_factory.MIN_VECTORS:
+            if os.path.exists(path):
+                os.remove(path)
+            self._ann = None
+            return
+
+        up_to_date = (
+            self._ann is not None
+            and index_factory.index_kind(self._ann) == index_type
+            and self.rows - self._ann.ntotal <= ANN_STALE_RATIO * self.rows
+        )
+        if up_to_date:
+            return
+        import faiss
+
+        index = index_factory.build_index(self._vectors[:], index_type)
+        faiss.write_index(index, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self._load_ann()
@@ -0,0 +1,181 @@
+"""
+Persistent cache of fetched articles and their parsed text.
+
+Every page `url_loader` downloads is stored in SQLite keyed by URL: the raw
+HTML (zlib-compressed), its ETag and Last-Modified headers, a digest of the
+body and, once the page has been parsed, its text. The next fetch of the URL
+is a conditional request (If-None-Match / If-Modified-Since). A 304 answer
+means neither the body nor `unstructured`'s parsing is needed again; a 200
+with a body identical to the cached one still skips the parsing.
+
+Entries not validated for `max_age` seconds are dropped and fetched from
+scratch. Once the cache grows past `max_bytes`, the least recently used
+pages are evicted until it is back under 90% of the cap. Configured through
+PAGE_CACHE_MAX_AGE and PAGE_CACHE_MAX_BYTES (0 disables the cache).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+DEFAULT_PATH = os.path.join("page_cache", "pages.sqlite3")
+DEFAULT_MAX_AGE = float(os.getenv("PAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+DEFAULT_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    digest BLOB NOT NULL,
+    html BLOB NOT NULL,
+    text TEXT,
+    size INTEGER NOT NULL,
+    validated REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_used ON pages (used);
+"""
+
+
+def digest(html):
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    html: str
+    text: str = None
+    etag: str = None
+    last_modified: str = None
+    digest: bytes = None
+
+    def conditional_headers(self):
+        """Request headers that let the server answer 304 if the page is unchanged."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    def __init__(self, path=DEFAULT_PATH, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.not_modified = 0  # 304: nothing downloaded or parsed
+        self.unchanged = 0  # downloaded again, same body: not parsed
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        with self._lock:
+            self._purge()
+            self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url):
+        """The cached page for `url`, or None if there is none or it is older than `max_age`."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, digest, html, text, validated FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            etag, last_modified, body_digest, html, text, validated = row
+            if time.time() - validated > self.max_age:
+                self._delete(url)
+                self._db.commit()
+                return None
+        return CachedPage(url, zlib.decompress(html).decode("utf-8"), text, etag, last_modified, body_digest)
+
+    def revalidated(self, page):
+        """Record that the server answered 304 for `page`."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET validated = ?, used = ? WHERE url = ?", (now, now, page.url))
+            self._db.commit()
+            self.not_modified += 1
+
+    def put(self, url, html, etag=None, last_modified=None, cached=None):
+        """
+        Store a freshly downloaded page. Returns its parsed text if `cached`,
+        the previous entry, had the same body, else None.
+        """
+        body_digest = digest(html)
+        text = cached.text if cached is not None and cached.digest == body_digest else None
+        self._write(url, html, text, etag, last_modified, body_digest)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.unchanged += 1
+        return text
+
+    def put_text(self, url, text):
+        """Store the parsed text of a page stored with `put`."""
+        with self._lock:
+            row = self._db.execute("SELECT size, html FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            size = len(row[1]) + len(text.encode("utf-8"))
+            self._db.execute("UPDATE pages SET text = ?, size = ? WHERE url = ?", (text, size, url))
+            self._bytes += size - row[0]
+            self._evict()
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM pages")
+            self._db.commit()
+            self._bytes = 0
+
+    def stats(self):
+        return {"not_modified": self.not_modified, "unchanged": self.unchanged, "misses": self.misses,
+                "bytes": self._bytes}
+
+    def _write(self, url, html, text, etag, last_modified, body_digest):
+        blob = zlib.compress(html.encode("utf-8"))
+        size = len(blob) + (len(text.encode("utf-8")) if text else 0)
+        now = time.time()
+        with self._lock:
+            self._delete(url)
+            self._db.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_digest, blob, text, size, now, now),
+            )
+            self._bytes += size
+            self._evict()
+            self._db.commit()
+
+    def _delete(self, url):
+        row = self._db.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._bytes -= row[0]
+
+    def _purge(self):
+        self._db.execute("DELETE FROM pages WHERE validated < ?", (time.time() - self.max_age,))
+        self._db.commit()
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # evict down to 90% of the cap so the next few puts don't evict again
+        keep = 0
+        target = self.max_bytes * 0.9
+        doomed = []
+        for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY used DESC").fetchall():
+            if doomed or keep + size > target:
+                doomed.append((url,))
+            else:
+                keep += size
+        self._db.executemany("DELETE FROM pages WHERE url = ?", doomed)
+        self._bytes = keep
@@ -0,0 +1,153 @@
+"""
+Parse and split downloaded articles in a pool of worker processes.
+
+`unstructured`'s HTML partitioning and `RecursiveCharacterTextSplitter` are
+CPU-bound pure Python, so on the fetch threads they keep one core busy and
+leave the rest idle. Here every downloaded page becomes one task: a worker
+process parses it and splits it into chunks, and only the chunks are sent
+back. Results are yielded in the order the pages were submitted, with a
+bounded number of pages in flight so a slow embedder still backs up to the
+downloads.
+
+The pool is started once per worker count and reused by later runs, since
+spawning workers that import LangChain and `unstructured` takes a while.
+Configured through PARSE_WORKERS (0 = one per core).
+"""
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+import url_loader
+
+DEFAULT_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+IN_FLIGHT_PER_WORKER = 4
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class SplitSettings:
+    chunk_size: int = 1000
+    chunk_overlap: int = 250
+    separators: tuple = ('\n\n', '\n', '.', '!', '?', ',')
+
+
+@dataclass
+class ParsedDocument:
+    url: str
+    chunks: list = None
+    error: str = None
+    text: str = None  # the parsed text, if asked for with `keep_text`
+    parse_time: float = 0.0
+    split_time: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@functools.lru_cache(maxsize=8)
+def _splitter(settings):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        separators=list(settings.separators),
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        add_start_index=True  # lets context_builder merge overlapping chunks
+    )
+
+
+def parse_and_split(url, html, settings, text=None, keep_text=False):
+    """
+    Parse one page and split it into chunk Documents. Runs in a worker
+    process. Given the page's `text`, parsing is skipped; `keep_text` sends
+    freshly parsed text back in `result.text`.
+    """
+    result = ParsedDocument(url)
+    started = time.perf_counter()
+    if text is None:
+        try:
+            text = url_loader.parse_html(html)
+        except Exception as e:
+            result.error = str(e)
+            result.parse_time = time.perf_counter() - started
+            return result
+        if keep_text:
+            result.text = text
+    parsed = time.perf_counter()
+    result.parse_time = parsed - started
+    document = Document(page_content=text, metadata={"source": url})
+    result.chunks = _splitter(settings).split_documents([document])
+    result.split_time = time.perf_counter() - parsed
+    return result
+
+
+def _pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn rather than fork: the app process runs threads
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def _discard_pool(workers):
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up(workers=DEFAULT_WORKERS):
+    """Start the pool for `workers` and have every worker import its modules."""
+    if workers > 1:
+        pool = _pool(workers)
+        list(pool.map(parse_and_split, ["warm-up"] * workers, ["<p>warm up</p>"] * workers,
+                      [SplitSettings()] * workers))
+
+
+def _page(page):
+    url, html, *text = page
+    text = text[0] if text else None
+    return url, html if text is None else None, text  # no need to ship html that isn't parsed
+
+
+def iter_parse_and_split(pages, settings=SplitSettings(), workers=DEFAULT_WORKERS, keep_text=False):
+    """
+    Parse and split `pages`, an iterable of (url, html) or (url, html, text)
+    where `text` is already parsed, yielding one ParsedDocument per page in
+    input order. With `workers` <= 1 everything runs in this process.
+    """
+    if workers <= 1:
+        for page in pages:
+            url, html, text = _page(page)
+            yield parse_and_split(url, html, settings, text, keep_text)
+        return
+
+    pool = _pool(workers)
+    pending = deque()
+    try:
+        for page in pages:
+            url, html, text = _page(page)
+            pending.append(pool.submit(parse_and_split, url, html, settings, text, keep_text))
+            while len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        _discard_pool(workers)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,84 @@
+"""
+Background answering of suggested questions.
+
+As soon as ingestion finishes, every suggested question can be submitted to
+a small worker pool. Finished answers are written to the answer cache, so
+clicking a question shows them instantly; clicking one that is still being
+worked on attaches to the running computation instead of starting another.
+`answer_fn` answers against whatever version is live, so an answer is only
+cached if the version it was submitted for is still live once it is done.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import index_store
+from answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 3
+
+
+class AnswerPrecomputer:
+    def __init__(self, answer_cache, max_workers=DEFAULT_MAX_WORKERS):
+        self.answer_cache = answer_cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        self._lock = threading.Lock()
+        self._futures = {}  # (index_dir, version, question key) -> Future
+
+    def submit(self, index_dir, version, questions, answer_fn):
+        """
+        Answer `questions` in the background with `answer_fn(question)`, which
+        must return a `RetrievalQA`-shaped result. Work queued for older
+        versions of the same index is cancelled.
+        """
+        with self._lock:
+            self._cancel_stale(index_dir, version)
+            for question in questions:
+                key = (index_dir, version, normalize_question(question))
+                if key not in self._futures:
+                    self._futures[key] = self._pool.submit(
+                        self._answer, index_dir, version, question, answer_fn
+                    )
+
+    def future(self, index_dir, version, question):
+        """The background computation for `question`, or None if none was started."""
+        with self._lock:
+            return self._futures.get((index_dir, version, normalize_question(question)))
+
+    def status(self, index_dir, version):
+        """Return (finished, total) for the questions submitted for this index version."""
+        with self._lock:
+            futures = [f for k, f in self._futures.items() if k[:2] == (index_dir, version)]
+        finished = sum(1 for f in futures if f.done() and not f.cancelled() and f.exception() is None)
+        return finished, len(futures)
+
+    def cancel(self, index_dir):
+        """Cancel queued work and forget every question for `index_dir`."""
+        with self._lock:
+            for key in [k for k in self._futures if k[0] == index_dir]:
+                self._futures.pop(key).cancel()
+
+    def _cancel_stale(self, index_dir, version):
+        for key in [k for k in self._futures if k[0] == index_dir and k[1] != version]:
+            self._futures.pop(key).cancel()
+
+    def _answer(self, index_dir, version, question, answer_fn):
+        # not a user's question: keep it out of the hit and miss counts
+        cached = self.answer_cache.get(index_dir, version, question, count=False)
+        if cached is not None:
+            return cached
+        try:
+            result = answer_fn(question)
+            if result is None:
+                raise RuntimeError(f"index {index_dir!r} is not available")
+        except Exception:
+            logger.exception("precomputing answer failed: %r", question)
+            raise
+        if index_store.version_token(index_dir) != version:
+            # a new version went live meanwhile: the answer may come from either one
+            logger.info("not caching answer for replaced version of %s: %r", index_dir, question)
+            return result
+        self.answer_cache.put(index_dir, version, question, result, count=False)
+        return result
@@ -0,0 +1,108 @@
+"""
+Representative chunks of a corpus, for drafting suggested questions.
+
+A random sample of chunks changes on every run, can miss whole articles and
+costs the same prompt size whatever was ingested. Here the chunk vectors
+already in the index are clustered instead, with no further embedding calls:
+
+    1. up to MAX_SAMPLE live vectors are read, evenly spread over the index,
+    2. spherical k-means groups them into `clusters` topics, seeded by
+       farthest-point sampling so the result is the same on every run,
+    3. the chunk closest to each cluster's centroid stands for it, biggest
+       cluster first, and
+    4. the chunks share the token budget (QUESTION_TOKEN_BUDGET, default
+       1200), short ones leaving their unused share to the others.
+"""
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+import metrics
+
+DEFAULT_CLUSTERS = 8
+DEFAULT_TOKEN_BUDGET = int(os.getenv("QUESTION_TOKEN_BUDGET", "1200"))
+MAX_SAMPLE = 20_000  # vectors clustered at most; plenty to find a handful of topics
+ITERATIONS = 25
+
+
+def _normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def farthest_points(vectors, k):
+    """
+    Indices of `k` rows of `vectors` (normalized) that are far apart: the row
+    closest to the mean first, then each time the row least similar to
+    everything picked so far.
+    """
+    picked = [int(np.argmax(vectors @ vectors.mean(axis=0)))]
+    closest = vectors @ vectors[picked[0]]  # highest similarity to anything picked
+    while len(picked) < min(k, len(vectors)):
+        best = int(np.argmin(closest))
+        picked.append(best)
+        closest = np.maximum(closest, vectors @ vectors[best])
+    return picked
+
+
+def kmeans(vectors, k, iterations=ITERATIONS):
+    """
+    Spherical k-means over the rows of `vectors` (normalized). Returns
+    (labels, centroids); deterministic for the same input.
+    """
+    centroids = vectors[farthest_points(vectors, k)]
+    k = len(centroids)
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        members = (labels == np.arange(k)[:, None]).astype(vectors.dtype)
+        sums = members @ vectors
+        empty = members.sum(axis=1) == 0
+        sums[empty] = centroids[empty]  # a cluster that lost all its members stays put
+        updated = _normalize(sums)
+        if np.allclose(updated, centroids, atol=1e-6):
+            break
+        centroids = updated
+    return np.argmax(vectors @ centroids.T, axis=1), centroids
+
+
+def share_budget(texts, token_budget):
+    """
+    Cut `texts` to fit `token_budget` tokens together. Every text gets an
+    equal share; what a short one does not use goes to the longer ones.
+    """
+    lengths = [metrics.count_tokens(text) for text in texts]
+    allowed = [0] * len(texts)
+    remaining = token_budget
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    for done, i in enumerate(order):
+        allowed[i] = min(lengths[i], remaining // (len(texts) - done))
+        remaining -= allowed[i]
+    return [
+        text if allowed[i] >= lengths[i] else metrics.truncate_tokens(text, allowed[i])
+        for i, text in enumerate(texts)
+    ]
+
+
+def representative_chunks(vectorstore, clusters=DEFAULT_CLUSTERS, token_budget=None, sample=MAX_SAMPLE):
+    """
+    One chunk per topic of `vectorstore` (an `MmapVectorStore`), biggest
+    topic first, cut to share `token_budget` tokens.
+    """
+    if token_budget is None:
+        token_budget = DEFAULT_TOKEN_BUDGET
+    positions, vectors = vectorstore.sample_vectors(sample)
+    if not positions:
+        return []
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    labels, centroids = kmeans(vectors, clusters)
+
+    sizes = np.bincount(labels, minlength=len(centroids))
+    chosen = []
+    for cluster in np.argsort(-sizes, kind="stable"):
+        members = np.flatnonzero(labels == cluster)
+        if len(members):
+            chosen.append(positions[members[np.argmax(vectors[members] @ centroids[cluster])]])
+
+    docs = vectorstore.documents_at(chosen)
+    texts = share_budget([doc.page_content for doc in docs], token_budget)
+    return [Document(page_content=text, metadata=doc.metadata) for text, doc in zip(texts, docs) if text]
@@ -0,0 +1,446 @@
+"""
+Headless load -> split -> embed -> index -> query pipeline.
+
+Everything the Streamlit apps do, without Streamlit: `ingest` builds or
+updates an index from a list of URLs, `suggest_questions` drafts questions
+about the ingested content, and `answer` / `answer_many` query the index.
+`cli.py` and both apps are thin layers over these functions.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import dedup
+import embedding_backends
+import index_store
+import metrics
+import page_cache
+import parallel_parse
+import representatives
+import url_loader
+from embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.path.join(index_store.CORPORA_DIR, index_store.DEFAULT_CORPUS)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 250
+SEPARATORS = ['\n\n', '\n', '.', '!', '?', ',']
+MIN_PAGES_PER_WORKER = 4  # below this, starting worker processes costs more than it saves
+ANSWER_CONCURRENCY = int(os.getenv("ANSWER_CONCURRENCY", "4"))
+
+FALLBACK_QUESTIONS = [
+    "What are the main topics and events discussed in the articles?",
+    "Who are the key stakeholders or entities mentioned?",
+    "What are the potential implications of the developments discussed?",
+    "What challenges or issues are highlighted in the content?",
+    "How might these events affect different sectors or regions?",
+    "What are the different viewpoints or reactions mentioned in the articles?"
+]
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm(temperature=0.8, max_tokens=600):
+    """Process-wide LLM client, so cached QA chains can be reused."""
+    from langchain_openai import OpenAI
+
+    return OpenAI(temperature=temperature, max_tokens=max_tokens)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cached_embeddings(backend="openai"):
+    """Process-wide embedding client for `backend`, behind the on-disk chunk cache."""
+    return CachedEmbeddings(embedding_backends.get_embeddings(backend))
+
+
+@functools.lru_cache(maxsize=None)
+def get_page_cache():
+    """Process-wide cache of fetched pages, or None if PAGE_CACHE_MAX_BYTES is 0."""
+    if page_cache.DEFAULT_MAX_BYTES <= 0:
+        return None
+    return page_cache.PageCache()
+
+
+@dataclass
+class IngestReport:
+    urls: int = 0
+    loaded: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    chunks: list = field(default_factory=list)
+    chunk_count: int = 0
+    added: int = 0
+    removed: int = 0
+    embedding_cache: dict = None
+    seconds: float = 0.0
+    metrics: dict = None
+    dedup: dict = None
+    skipped: int = 0
+    page_cache: dict = None
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def ingest(urls, index_dir=DEFAULT_INDEX_DIR, backend="openai", incremental=False, workers=None,
+           chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS,
+           keep_chunks=True, on_batch=None, embeddings=None,
+           deduplicate=True, dedup_threshold=dedup.DEFAULT_THRESHOLD,
+           report=None, cancel=None, checkpoint=None, page_cache=None, **pipeline_options):
+    """
+    Load `urls`, split them, embed the chunks and write them to `index_dir`,
+    replacing the index unless `incremental` is set.
+
+    Pages are downloaded on threads and parsed and split by `workers`
+    processes (default: PARSE_WORKERS, one per core); small batches are
+    handled in this process.
+
+    `on_batch(report)` is called on the calling thread after each embedded
+    batch. With `keep_chunks` the indexed chunks are kept on the report.
+    `embeddings` overrides the cached client for `backend`. With
+    `deduplicate`, near-duplicate chunks are dropped before embedding and
+    their URLs added to the kept chunk's "sources".
+    Pages go through `page_cache` (default: the process-wide one, False for
+    none), so unchanged articles are neither downloaded nor parsed again.
+    Returns an IngestReport; its `metrics` hold the time spent in each stage.
+
+    For running in the background: pass `report` to watch it fill in from
+    another thread, and a `cancel` threading.Event to stop after the batch in
+    flight with IngestCancelled. `checkpoint` is a dict the caller saves
+    after every batch. It names the version being built and the URLs whose
+    chunks are all written ("done"), counting a URL whose chunks were
+    duplicates only once its URL is saved on the chunks they were merged
+    into. The producer stops updating it once `cancel` is set. Calling `ingest` again with the same
+    checkpoint after a cancel, an error or a crash skips those URLs and
+    writes the rest into the same version.
+    """
+    started = time.perf_counter()
+    report = report or IngestReport()
+    report.urls = len(urls)
+    run = metrics.RunMetrics("ingest")
+
+    if checkpoint is not None:
+        if not index_store.check_checkpoint(index_dir, checkpoint, replace=not incremental):
+            checkpoint.clear()
+        done = checkpoint.setdefault("done", [])
+        urls = [url for url in urls if url not in set(done)]
+        report.skipped = report.urls - len(urls)
+        expected, written = {}, {}
+        waiting = {}  # url -> ids of kept chunks its duplicates were merged into, not yet saved
+        written_ids, unsaved = set(), set()
+        done_lock = threading.Lock()
+
+    def check_cancelled():
+        if cancel is not None and cancel.is_set():
+            raise IngestCancelled(f"ingestion into {index_dir} was cancelled")
+
+    settings = parallel_parse.SplitSettings(chunk_size, chunk_overlap, tuple(separators))
+    workers = parallel_parse.DEFAULT_WORKERS if workers is None else workers
+    workers = min(workers, len(urls) // MIN_PAGES_PER_WORKER)
+    duplicates = dedup.NearDuplicateFilter(dedup_threshold) if deduplicate else None
+    cache = get_page_cache() if page_cache is None else page_cache or None
+    if cache is not None:
+        report.page_cache = {"not_modified": 0, "unchanged": 0, "misses": 0}
+
+    def pages():
+        for result in url_loader.iter_load_urls(urls, parse=False, cache=cache):
+            check_cancelled()
+            run.add_time("fetch", result.fetch_time)
+            run.count("bytes_fetched", result.size)
+            if result.cache:
+                outcome = "misses" if result.cache == "miss" else result.cache
+                report.page_cache[outcome] += 1
+                run.count(f"page_cache_{outcome}")
+            if result.error is None:
+                yield result.url, result.html, result.text
+            else:
+                run.count("urls_failed")
+                report.failed.append(result)
+
+    def chunks():
+        # runs on the pipeline's producer thread
+        parsed_pages = parallel_parse.iter_parse_and_split(pages(), settings, workers,
+                                                           keep_text=cache is not None)
+        for parsed in parsed_pages:
+            run.add_time("parse", parsed.parse_time)
+            run.add_time("split", parsed.split_time)
+            if not parsed.ok:
+                run.count("urls_failed")
+                report.failed.append(url_loader.LoadResult(parsed.url, error=parsed.error))
+                continue
+            if parsed.text is not None:
+                cache.put_text(parsed.url, parsed.text)
+            run.count("urls_loaded")
+            report.loaded.append(parsed.url)
+            pieces = parsed.chunks
+            run.count("chunks", len(pieces))
+            run.count("chunk_tokens", sum(metrics.count_tokens(doc.page_content) for doc in pieces))
+            merged_into = set()
+            if duplicates is not None:
+                with run.stage("dedup"):
+                    kept = []
+                    for doc in pieces:
+                        match = duplicates.add(doc)
+                        if match is None:
+                            kept.append(doc)
+                        else:
+                            merged_into.add(match)
+                    pieces = kept
+            if checkpoint is not None:
+                expect(parsed.url, len(pieces), merged_into)
+            yield from pieces
+
+    def expect(url, count, merged_into):
+        # runs on the producer thread, which may still be busy after a cancel
+        with done_lock:
+            if cancel is not None and cancel.is_set():
+                return
+            expected[url] = count
+            waiting[url] = set(merged_into)
+            unsaved.update(merged_into)
+            mark_done(url)
+
+    def mark_done(url):
+        # a URL is done once every chunk kept for it is written and every
+        # chunk its duplicates were merged into is saved with its URL
+        if url not in checkpoint["done"] and written.get(url, 0) == expected.get(url) and not waiting.get(url):
+            checkpoint["done"].append(url)
+
+    def before_commit(vectorstore):
+        if duplicates is not None:
+            # chunks can gain sources after they were written
+            vectorstore.update_metadata(duplicates.merged_metadata())
+            report.dedup = duplicates.stats(vectorstore.dim)
+            if checkpoint is not None:
+                with done_lock:
+                    for url, ids in waiting.items():
+                        ids.clear()
+                        mark_done(url)
+
+    def batch_done(batch, vectorstore):
+        report.chunk_count += len(batch)
+        if keep_chunks:
+            report.chunks.extend(batch)
+        if checkpoint is not None:
+            with done_lock:
+                written_ids.update(doc.id for doc in batch)
+                saving = unsaved & written_ids
+                unsaved.difference_update(saving)
+            if saving:
+                # written before the duplicates were merged into them
+                vectorstore.update_metadata(duplicates.metadata(saving))
+            with done_lock:
+                candidates = set()
+                for doc in batch:
+                    url = doc.metadata.get("source")
+                    written[url] = written.get(url, 0) + 1
+                    candidates.add(url)
+                for url, ids in waiting.items():
+                    if ids & saving:
+                        ids.difference_update(saving)
+                        candidates.add(url)
+                for url in candidates:
+                    mark_done(url)
+        if on_batch:
+            on_batch(report)
+        check_cancelled()
+
+    embeddings = embeddings or get_cached_embeddings(backend)
+    if hasattr(embeddings, "reset_stats"):
+        embeddings.reset_stats()
+    if incremental:
+        report.added, report.removed = index_store.upsert_documents(
+            index_dir, chunks(), embeddings, on_batch=batch_done, run=run,
+            before_commit=before_commit, checkpoint=checkpoint, sources=report.loaded, **pipeline_options
+        )
+    else:
+        report.added = index_store.rebuild_index(
+            index_dir, chunks(), embeddings, on_batch=batch_done, run=run,
+            before_commit=before_commit, checkpoint=checkpoint, **pipeline_options
+        )
+    if duplicates is not None:
+        report.dedup = report.dedup or duplicates.stats()
+        run.count("duplicate_chunks", report.dedup["duplicates"])
+    report.embedding_cache = embeddings.stats() if hasattr(embeddings, "stats") else None
+    if report.embedding_cache:
+        run.count("embedding_cache_hits", report.embedding_cache["hits"])
+        run.count("embedding_cache_misses", report.embedding_cache["misses"])
+    run.count("chunks_added", report.added)
+    run.count("chunks_removed", report.removed)
+    report.metrics = run.finish()
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        "ingested %d/%d urls into %s: %d chunks added, %d removed in %.1fs",
+        len(report.loaded), report.urls, index_dir, report.added, report.removed, report.seconds,
+    )
+    return report
+
+
+def suggest_questions(index_dir, llm=None, clusters=representatives.DEFAULT_CLUSTERS, token_budget=None):
+    """
+    Ask the LLM for 10 questions about the index in `index_dir`, topped up
+    with topic-based defaults. The prompt holds one representative chunk per
+    topic of the corpus, within `token_budget` tokens (see
+    `representatives`). Returns (questions, sampled text); the questions
+    are FALLBACK_QUESTIONS if the LLM call fails.
+    """
+    vectorstore = index_store.get_vectorstore(index_dir)
+    docs = representatives.representative_chunks(vectorstore, clusters, token_budget) if vectorstore else []
+    if not docs:
+        return [], ""
+
+    combined_text = "\n\n".join(doc.page_content for doc in docs)
+    
+    # Improved general-purpose question generation prompt
+    question_prompt = f"""
+    Based on the following news content, generate 10 specific, insightful questions that would be valuable for understanding and analyzing the topics discussed. Focus on questions about:
+    - Key events and developments mentioned
+    - Policy implications and impacts
+    - Economic and business implications
+    - Stakeholder perspectives and reactions
+    - Future outlook and predictions
+    - Cause-and-effect relationships
+    - Comparative analysis with similar situations
+    
+    Content to analyze:
+    {combined_text}
+    
+    Requirements:
+    - Generate exactly 10 questions, each on a new line starting with "Q:"
+    - Make questions specific to the actual content provided
+    - Focus on the main topics, companies, countries, policies, or events mentioned in the text
+    - Avoid generic questions - be specific to what's actually discussed
+    - Questions should help readers gain deeper insights into the topics covered
+    """
+    
+    try:
+        response = (llm or get_llm()).invoke(question_prompt)
+    except Exception:
+        logger.exception("drafting suggested questions failed for %s", index_dir)
+        return list(FALLBACK_QUESTIONS), combined_text
+    
+    # Parse questions from response
+    questions = []
+    lines = response.split('\n')
+    for line in lines:
+        line = line.strip()
+        if line.startswith('Q:'):
+            question = line[2:].strip()
+            if question and len(question) > 15:
+                questions.append(question)
+    
+    # Ensure we have exactly 6 questions
+    if len(questions) < 10:
+        content_lower = combined_text.lower()
+        default_questions = []
+        
+        if 'trade' in content_lower or 'tariff' in content_lower:
+            default_questions.extend([
+                "What are the main trade issues discussed in the articles?",
+                "How might these trade developments affect the economies involved?"
+            ])
+        if 'policy' in content_lower or 'government' in content_lower:
+            default_questions.extend([
+                "What policy changes or decisions are highlighted?",
+                "What are the potential impacts of these policy decisions?"
+            ])
+        if 'company' in content_lower or 'business' in content_lower:
+            default_questions.extend([
+                "Which companies or sectors are most affected by these developments?",
+                "What are the business implications of the events discussed?"
+            ])
+        
+        if not default_questions:
+            default_questions = [
+                "What are the key developments discussed in these articles?",
+                "Who are the main stakeholders affected by these events?",
+                "What are the potential future implications of these developments?",
+                "How do these events compare to similar situations in the past?",
+                "What are the different perspectives on these issues?",
+                "What challenges and opportunities are identified in the content?"
+            ]
+        
+        questions.extend(default_questions[:10-len(questions)])
+    
+    return questions[:10], combined_text
+
+
+def answer(question, index_dir=DEFAULT_INDEX_DIR, llm=None, embeddings_factory=None, token_budget=None):
+    """
+    Run `question` through the QA chain over `index_dir`, with a context of at
+    most `token_budget` tokens (see `context_builder`). Returns the
+    `RetrievalQA` result plus a "context" report of the prompt size before
+    and after assembly, or None if there is no index.
+    """
+    # the store and chain stay resident until the index on disk changes
+    run = metrics.RunMetrics("query", mode="chain")
+    with run.stage("open"):
+        chain = index_store.get_qa_chain(index_dir, llm or get_llm(), embeddings_factory, token_budget)
+    if chain is None:
+        return None
+    with run.stage("retrieve"):
+        context = chain.retriever.assemble(question)
+    result = _complete(chain, question, context, run)
+    run.finish()
+    return result
+
+
+def _complete(chain, question, context, run):
+    """Run the stuff chain's LLM step over an assembled context."""
+    with run.stage("generate"):
+        combine = chain.combine_documents_chain
+        output = combine.invoke({"input_documents": context.documents, "question": question})[combine.output_key]
+    run.count("source_chunks", context.chunks_used)
+    run.count("prompt_tokens_before", context.prompt_tokens_before)
+    run.count("prompt_tokens", context.prompt_tokens_after)
+    run.count("answer_tokens", metrics.count_tokens(output))
+    return {"result": output, "source_documents": context.documents, "context": context.report()}
+
+
+def answer_many(questions, index_dir=DEFAULT_INDEX_DIR, llm=None, concurrency=ANSWER_CONCURRENCY,
+                embeddings_factory=None, token_budget=None, run=None):
+    """
+    Answer `questions` as one batch: their embeddings are requested together
+    and the index is searched once for all of them, then up to `concurrency`
+    completions run at a time. Yields (question, result, seconds) in input
+    order, with `seconds` counted from the start of the batch; `result` is
+    None if there is no index, or the exception raised for that question.
+    Stage timings and counts are recorded on `run`, a metrics.RunMetrics
+    (a new one if not given), which is finished once the batch is.
+    """
+    questions = list(questions)
+    started = time.perf_counter()
+    run = run or metrics.RunMetrics("query", mode="batch")
+    try:
+        error = None
+        try:
+            with run.stage("open"):
+                chain = index_store.get_qa_chain(index_dir, llm or get_llm(), embeddings_factory, token_budget)
+            if chain is not None:
+                with run.stage("retrieve"):
+                    contexts = chain.retriever.assemble_many(questions)
+        except Exception as e:
+            logger.exception("retrieval failed for %d questions", len(questions))
+            chain, error = None, e
+        if chain is None:
+            for question in questions:
+                yield question, error, time.perf_counter() - started
+            return
+
+        def timed(question, context):
+            try:
+                result = _complete(chain, question, context, run)
+            except Exception as e:
+                logger.exception("answering failed: %r", question)
+                result = e
+            return question, result, time.perf_counter() - started
+
+        run.count("questions", len(questions))
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            yield from pool.map(timed, questions, contexts)
+    finally:
+        run.finish()
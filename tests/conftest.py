@@ -0,0 +1,53 @@
+"""
+Shared fixtures. Everything runs offline: articles come from the benchmark
+article server, embeddings and completions from the benchmark fakes.
+"""
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["METRICS_DIR"] = ""  # no metrics files from test runs
+
+import pytest  # noqa: E402
+
+import url_loader  # noqa: E402
+from benchmarks.article_server import ArticleServer  # noqa: E402
+from benchmarks.fakes import FakeEmbeddings, FakeLLM  # noqa: E402
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # caches and indexes default to paths relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings(dim=64)
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture(scope="session")
+def server():
+    with ArticleServer() as server:
+        yield server
+
+
+@pytest.fixture
+def plain_parse(monkeypatch):
+    """Parse pages by stripping tags, so tests don't need `unstructured` and its NLTK data."""
+    def parse_html(html):
+        paragraphs = [_TAG_RE.sub("", p).strip() for p in re.split(r"</p>|</h1>", html)]
+        return "\n\n".join(p for p in paragraphs if p)
+
+    monkeypatch.setattr(url_loader, "parse_html", parse_html)
+    return parse_html
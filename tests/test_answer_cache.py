@@ -0,0 +1,40 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from answer_cache import AnswerCache
+
+
+def result(answer):
+    return {"result": answer, "source_documents": [Document(page_content="text", metadata={"source": "u"})]}
+
+
+def test_exact_hit_ignores_case_and_punctuation(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    cache.put("idx", "1", "What happened?", result("this"))
+
+    hit = cache.get("idx", "1", "  what HAPPENED ")
+    assert hit["result"] == "this" and hit["cache"] == "exact"
+    assert hit["source_documents"][0].metadata == {"source": "u"}
+    assert cache.get("idx", "1", "What happened next?") is None
+
+
+def test_answers_for_older_versions_are_purged(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    cache.put("idx", "1", "q?", result("old"))
+    assert cache.get("idx", "2", "q?") is None
+    assert cache.get("idx", "1", "q?") is None
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl=-1)
+    cache.put("idx", "1", "q?", result("stale"))
+    assert cache.get("idx", "1", "q?") is None
+
+
+def test_semantic_lookup_reuses_close_questions_only(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_distance=0.05)
+    cache.put("idx", "1", "What did the minister say?", result("this"), np.array([1.0, 0.0, 0.0]))
+
+    hit = cache.get_similar("idx", "1", np.array([0.99, 0.05, 0.0]))
+    assert hit["result"] == "this" and hit["cache"] == "semantic"
+    assert cache.get_similar("idx", "1", np.array([0.0, 1.0, 0.0])) is None
@@ -0,0 +1,21 @@
+from answer_stream import AnswerStream
+from mmap_store import MmapVectorStore
+
+
+def test_sources_come_first_then_the_answer_streams(tmp_path, embeddings, llm):
+    store = MmapVectorStore(str(tmp_path / "store"), embeddings)
+    store.add_texts([f"Port {i} reports freight delays." for i in range(6)],
+                    metadatas=[{"source": f"https://news.test/{i}"} for i in range(6)])
+
+    stream = AnswerStream(store, llm, "Which ports report freight delays?")
+    assert stream.source_documents and stream.answer == "" and stream.metrics is None
+
+    tokens = list(stream)
+    assert len(tokens) == llm.answer_tokens
+    assert stream.answer == "".join(tokens)
+    assert stream.result() == {"result": stream.answer, "source_documents": stream.source_documents}
+
+    timings = stream.timings()
+    assert timings["retrieval"] <= timings["time_to_first_token"] <= timings["total"]
+    assert stream.metrics["counts"]["source_chunks"] == stream.context.chunks_used
+    assert stream.metrics["counts"]["answer_tokens"] > 0
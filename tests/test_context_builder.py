@@ -0,0 +1,67 @@
+import numpy as np
+from langchain_core.documents import Document
+
+import context_builder
+import metrics
+
+ARTICLE = " ".join(f"Sentence {i} of the article about shipping costs and port delays." for i in range(40))
+
+
+def chunk(start, end, source="https://news.test/a", **metadata):
+    return Document(page_content=ARTICLE[start:end], metadata=dict(source=source, start_index=start, **metadata))
+
+
+def test_overlapping_chunks_merge_into_one_passage():
+    merged = context_builder.merge_chunks([chunk(200, 400), chunk(0, 250), chunk(1000, 1200)])
+    assert [doc.page_content for doc in merged] == [ARTICLE[0:400], ARTICLE[1000:1200]]
+    assert merged[0].metadata["start_index"] == 0
+    assert merged[0].metadata["chunks"] == 2
+    assert merged[1].metadata["chunks"] == 1
+
+
+def test_a_chunk_can_bridge_two_passages():
+    merged = context_builder.merge_chunks([chunk(0, 200), chunk(300, 500), chunk(150, 350)])
+    assert [doc.page_content for doc in merged] == [ARTICLE[0:500]]
+    assert merged[0].metadata["chunks"] == 3
+
+
+def test_chunks_of_other_articles_or_far_apart_stay_separate():
+    docs = [chunk(0, 200), chunk(150, 350, source="https://news.test/b"), chunk(203, 400)]
+    assert len(context_builder.merge_chunks(docs)) == 3
+
+
+def test_chunks_without_positions_merge_on_shared_text():
+    first, second = ARTICLE[:300], ARTICLE[200:500]
+    docs = [Document(page_content=second, metadata={"source": "a"}),
+            Document(page_content=first, metadata={"source": "a"})]
+    merged = context_builder.merge_chunks(docs)
+    assert [doc.page_content for doc in merged] == [ARTICLE[:500]]
+    assert "start_index" not in merged[0].metadata
+
+
+def test_merged_passages_keep_every_source():
+    docs = [chunk(0, 200, sources=["https://news.test/a", "https://mirror.test/a"]), chunk(150, 350)]
+    merged = context_builder.merge_chunks(docs)
+    assert merged[0].metadata["sources"] == ["https://news.test/a", "https://mirror.test/a"]
+
+
+def test_pack_takes_chunks_while_the_merged_context_fits():
+    docs = [chunk(0, 300), chunk(250, 550), chunk(2000, 2300)]
+    budget = metrics.count_tokens(ARTICLE[0:550])
+    passages, used = context_builder.pack(docs, budget)
+    # the overlap makes the second chunk cheap; the third no longer fits
+    assert used == 2
+    assert [doc.page_content for doc in passages] == [ARTICLE[0:550]]
+    assert metrics.count_tokens(context_builder.join(passages)) <= budget
+
+
+def test_pack_truncates_a_best_chunk_over_budget():
+    passages, used = context_builder.pack([chunk(0, 2000)], 10)
+    assert used == 1
+    assert metrics.count_tokens(passages[0].page_content) <= 10
+    assert ARTICLE.startswith(passages[0].page_content)
+
+
+def test_mmr_drops_near_duplicates():
+    vectors = np.array([[1, 0, 0], [1, 0, 0.001], [0.6, 0.8, 0]], dtype=np.float32)
+    assert context_builder.mmr_order(np.array([1, 0.1, 0], dtype=np.float32), vectors) == [0, 2]
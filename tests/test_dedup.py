@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from benchmarks.article_server import article_text
+import dedup
+from dedup import NearDuplicateFilter
+
+
+def chunk(text, source):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_near_duplicates_are_dropped_and_their_sources_merged():
+    paragraph = " ".join(article_text(1)[1])
+    duplicates = NearDuplicateFilter()
+    kept = list(duplicates.filter([
+        chunk(paragraph, "https://a.example/1"),
+        chunk(paragraph + " Reporting by a wire service.", "https://b.example/1"),
+        chunk(" ".join(article_text(2)[1]), "https://c.example/2"),
+    ]))
+
+    assert [doc.metadata["source"] for doc in kept] == ["https://a.example/1", "https://c.example/2"]
+    assert kept[0].metadata["sources"] == ["https://a.example/1", "https://b.example/1"]
+    assert duplicates.merged_metadata() == {kept[0].id: kept[0].metadata}
+    assert duplicates.stats()["duplicates"] == 1
+
+
+def test_distinct_chunks_are_all_kept():
+    docs = [chunk(" ".join(article_text(n)[1]), f"https://a.example/{n}") for n in range(20)]
+    assert len(list(NearDuplicateFilter().filter(docs))) == 20
+
+
+def test_duplicates_are_found_behind_an_unrelated_chunk_in_the_same_bucket(monkeypatch):
+    # every band of every chunk lands in one bucket, as if all of them collided
+    monkeypatch.setattr(dedup, "hash", lambda value: 0, raising=False)
+    paragraph = " ".join(article_text(1)[1])
+    kept = list(NearDuplicateFilter().filter([
+        chunk(" ".join(article_text(2)[1]), "https://c.example/2"),
+        chunk(paragraph, "https://a.example/1"),
+        chunk(paragraph + " Reporting by a wire service.", "https://b.example/1"),
+    ]))
+
+    assert [doc.metadata["source"] for doc in kept] == ["https://c.example/2", "https://a.example/1"]
+    assert kept[1].metadata["sources"] == ["https://a.example/1", "https://b.example/1"]
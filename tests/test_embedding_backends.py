@@ -0,0 +1,27 @@
+import pytest
+
+import embedding_backends
+from benchmarks.fakes import FakeEmbeddings
+from embedding_cache import CachedEmbeddings
+
+
+def test_an_index_records_its_backend_and_refuses_another(tmp_path, embeddings):
+    index_dir = str(tmp_path)
+    assert embedding_backends.read_backend(index_dir) is None
+    embedding_backends.check_backend(index_dir, embeddings)  # nothing recorded yet
+
+    embedding_backends.write_backend(index_dir, embeddings)
+    assert embedding_backends.read_backend(index_dir) == "FakeEmbeddings:fake-hash-64"
+    embedding_backends.check_backend(index_dir, FakeEmbeddings(dim=64))
+    with pytest.raises(ValueError, match="fake-hash-64"):
+        embedding_backends.check_backend(index_dir, FakeEmbeddings(dim=32))
+
+
+def test_cached_embeddings_are_identified_by_the_model_they_wrap(tmp_path, embeddings):
+    cached = CachedEmbeddings(embeddings, cache_dir=str(tmp_path))
+    assert embedding_backends.backend_id(cached) == embedding_backends.backend_id(embeddings)
+
+
+def test_unknown_backends_are_rejected():
+    with pytest.raises(ValueError, match="unknown embedding backend"):
+        embedding_backends.get_embeddings("word2vec")
@@ -0,0 +1,53 @@
+import numpy as np
+
+from embedding_cache import CachedEmbeddings
+
+
+def test_repeated_chunks_are_served_from_disk(tmp_path, embeddings):
+    cache = CachedEmbeddings(embeddings, cache_dir=str(tmp_path))
+    first = cache.embed_documents(["alpha beta", "gamma delta", "alpha beta"])
+    assert cache.stats()["misses"] == 2 and embeddings.texts == 2
+
+    reopened = CachedEmbeddings(embeddings, cache_dir=str(tmp_path))
+    again = reopened.embed_documents(["gamma delta", "alpha beta"])
+    assert reopened.stats()["hits"] == 2 and embeddings.texts == 2
+    np.testing.assert_array_equal(again, first[[1, 0]])
+
+
+def test_full_cache_evicts_least_recently_used(tmp_path, embeddings):
+    cache = CachedEmbeddings(embeddings, cache_dir=str(tmp_path), max_entries=10)
+    cache.embed_documents([f"text {i}" for i in range(10)])
+    cache.embed_documents(["text 9"])  # most recently used
+    cache.embed_documents(["new text"])
+
+    assert cache.stats()["entries"] == 10
+    cache.reset_stats()
+    cache.embed_documents(["text 9"])
+    assert cache.stats()["hits"] == 1
+    vectors = cache.embed_documents(["text 0", "new text"])
+    np.testing.assert_allclose(vectors, embeddings.embed_documents(["text 0", "new text"]))
+
+
+def test_instances_sharing_a_directory_never_mix_up_vectors(tmp_path, embeddings):
+    a = CachedEmbeddings(embeddings, cache_dir=str(tmp_path))
+    b = CachedEmbeddings(embeddings, cache_dir=str(tmp_path))
+    a.embed_documents(["opened first"])
+    # b has not seen a's write; it must not reuse a's slot for its own text
+    b.embed_documents(["written by b", "written by b too"])
+
+    texts = ["opened first", "written by b", "written by b too"]
+    expected = embeddings.embed_documents(texts)
+    np.testing.assert_allclose(a.embed_documents(texts), expected)
+    np.testing.assert_allclose(b.embed_documents(texts), expected)
+    assert a.stats()["hits"] == b.stats()["hits"] == 3
+
+
+def test_instances_sharing_a_directory_survive_eviction(tmp_path, embeddings):
+    a = CachedEmbeddings(embeddings, cache_dir=str(tmp_path), max_entries=10)
+    b = CachedEmbeddings(embeddings, cache_dir=str(tmp_path), max_entries=10)
+    for i in range(25):
+        (a if i % 2 else b).embed_documents([f"text {i}", f"other {i}"])
+
+    texts = [f"text {i}" for i in range(20, 25)]
+    np.testing.assert_allclose(a.embed_documents(texts), embeddings.embed_documents(texts))
+    np.testing.assert_allclose(b.embed_documents(texts), embeddings.embed_documents(texts))
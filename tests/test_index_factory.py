@@ -0,0 +1,37 @@
+import faiss
+import numpy as np
+import pytest
+
+import index_factory
+
+
+@pytest.mark.parametrize("index_type", index_factory.INDEX_TYPES)
+def test_small_corpora_stay_flat(index_type):
+    index = index_factory.create_index(index_type, 64, index_factory.MIN_VECTORS - 1)
+    assert index_factory.index_kind(index) == "flat"
+
+
+@pytest.mark.parametrize("index_type", index_factory.INDEX_TYPES)
+def test_create_index_builds_the_requested_kind(index_type):
+    index = index_factory.create_index(index_type, 64, index_factory.MIN_VECTORS)
+    assert index_factory.index_kind(index) == index_type
+
+
+def test_unknown_index_types_are_rejected():
+    with pytest.raises(ValueError):
+        index_factory.create_index("lsh", 64, 10_000)
+
+
+@pytest.mark.parametrize("n_vectors, bits", [(5_000, 7), (9_983, 7), (9_984, 8), (1_000_000, 8)])
+def test_pq_codes_shrink_until_they_can_be_trained(n_vectors, bits):
+    index = faiss.downcast_index(index_factory.create_index("ivfpq", 64, n_vectors))
+    assert index.pq.nbits == bits
+    assert n_vectors >= index_factory.POINTS_PER_CENTROID * 2 ** bits or bits == 1
+
+
+def test_ivfpq_trains_on_the_smallest_corpus_it_is_built_for():
+    vectors = np.random.default_rng(0).random((index_factory.MIN_VECTORS, 64), dtype=np.float32)
+    index = index_factory.build_index(vectors, "ivfpq")
+    assert index.ntotal == len(vectors)
+    _, positions = index.search(vectors[:5], 1)
+    assert (positions[:, 0] == np.arange(5)).mean() >= 0.6
@@ -0,0 +1,139 @@
+import os
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+import index_store
+
+
+def chunks(source, count, prefix="chunk"):
+    return [
+        Document(page_content=f"{prefix} {i} about {source} markets and trade", metadata={"source": source})
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    path = str(tmp_path / "corpus")
+    yield path
+    index_store.invalidate(path)
+
+
+def test_rebuild_publishes_a_new_version_readers_keep_the_old_one(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3), embeddings)
+    old = index_store.get_vectorstore(index_dir, lambda: embeddings)
+    old_version = index_store.index_version(index_dir)
+
+    index_store.rebuild_index(index_dir, chunks("https://b.example/", 2), embeddings)
+    assert index_store.index_version(index_dir) != old_version
+    assert index_store.list_sources(index_dir) == ["https://b.example/"]
+    # the retired version is still on disk and answers queries
+    assert len(old.similarity_search("markets", k=3)) == 3
+
+
+def test_retired_versions_are_collected(index_dir, embeddings, monkeypatch):
+    monkeypatch.setattr(index_store, "RETIRE_SECONDS", 0)
+    for source in ("https://a.example/", "https://b.example/", "https://c.example/"):
+        index_store.rebuild_index(index_dir, chunks(source, 2), embeddings)
+    assert index_store._versions(index_dir) == [os.path.basename(index_store._current(index_dir))]
+
+
+def test_upsert_replaces_the_chunks_of_a_source(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3) + chunks("https://b.example/", 2),
+                              embeddings)
+    added, removed = index_store.upsert_documents(index_dir, chunks("https://a.example/", 1, "new"), embeddings)
+
+    assert (added, removed) == (1, 3)
+    store = index_store.get_vectorstore(index_dir, lambda: embeddings)
+    assert store.count() == 3
+    assert sorted(store.sources()) == ["https://a.example/", "https://b.example/"]
+
+
+def test_clear_and_remove_source(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3) + chunks("https://b.example/", 2),
+                              embeddings)
+    assert index_store.remove_source(index_dir, "https://a.example/", lambda: embeddings) == 3
+    assert index_store.list_sources(index_dir, lambda: embeddings) == ["https://b.example/"]
+
+    index_store.clear_index(index_dir)
+    assert not index_store.index_exists(index_dir)
+
+
+def test_rebuild_that_adds_nothing_keeps_the_corpus(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3), embeddings)
+    version = index_store.index_version(index_dir)
+
+    # e.g. every URL of the run failed to load
+    assert index_store.rebuild_index(index_dir, [], embeddings) == 0
+    assert index_store.index_exists(index_dir)
+    assert index_store.index_version(index_dir) == version
+    assert index_store.list_sources(index_dir) == ["https://a.example/"]
+
+
+def test_clear_fails_fast_while_another_write_holds_the_corpus(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3), embeddings)
+    holding, release = threading.Event(), threading.Event()
+
+    def writer():
+        with index_store._write_lock(index_dir):
+            holding.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    holding.wait(10)
+    try:
+        with pytest.raises(index_store.IndexBusy):
+            index_store.clear_index(index_dir, wait=False)
+        with pytest.raises(index_store.IndexBusy):
+            index_store.remove_source(index_dir, "https://a.example/", lambda: embeddings, wait=False)
+    finally:
+        release.set()
+        thread.join()
+    assert index_store.list_sources(index_dir) == ["https://a.example/"]
+
+
+def test_idle_session_corpora_are_collected(tmp_path, embeddings):
+    root = str(tmp_path / "corpora")
+    for name in ("session-old", "session-new", "shared"):
+        index_store.rebuild_index(index_store.corpus_dir(name, root), chunks(name, 1), embeddings)
+    for name in ("session-old", "shared"):
+        path = index_store.corpus_dir(name, root)
+        os.utime(os.path.join(path, index_store.ACCESSED_FILE), (0, 0))
+
+    assert index_store.collect_idle_corpora(root, max_idle=3600) == ["session-old"]
+    assert sorted(os.listdir(root)) == ["session-new", "shared"]
+
+
+def test_upsert_removes_the_old_chunks_of_every_listed_source(index_dir, embeddings):
+    index_store.rebuild_index(index_dir, chunks("https://a.example/", 3) + chunks("https://b.example/", 2),
+                              embeddings)
+    loaded = []  # filled while the chunks are consumed, like IngestReport.loaded
+
+    def docs():
+        loaded.extend(["https://a.example/", "https://b.example/"])
+        yield from chunks("https://b.example/", 1, "new")  # a.example/ yielded nothing new
+
+    added, removed = index_store.upsert_documents(index_dir, docs(), embeddings, sources=loaded)
+    assert (added, removed) == (1, 5)
+    assert index_store.list_sources(index_dir) == ["https://b.example/"]
+
+
+def test_a_chunk_shared_by_two_sources_stays_until_both_are_gone(index_dir, embeddings):
+    shared = Document(page_content="wire story about tariffs on steel", id="shared",
+                      metadata={"source": "https://a.example/", "sources": ["https://a.example/", "https://b.example/"]})
+    index_store.rebuild_index(index_dir, [shared] + chunks("https://a.example/", 2), embeddings)
+    assert index_store.list_sources(index_dir) == ["https://a.example/", "https://b.example/"]
+
+    # re-ingesting A alone keeps the chunk for B
+    index_store.upsert_documents(index_dir, chunks("https://a.example/", 1, "new"), embeddings)
+    store = index_store.get_vectorstore(index_dir, lambda: embeddings)
+    assert store.count() == 2
+    assert [doc.metadata for doc in store.similarity_search("tariffs on steel", k=1)] == [
+        {"source": "https://b.example/", "sources": ["https://b.example/"]}
+    ]
+
+    assert index_store.remove_source(index_dir, "https://b.example/", lambda: embeddings) == 1
+    assert index_store.list_sources(index_dir) == ["https://a.example/"]
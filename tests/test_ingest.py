@@ -0,0 +1,156 @@
+import dataclasses
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import index_store
+import research_pipeline
+import url_loader
+from ingest_jobs import IngestJob, IngestJobs
+from mmap_store import MmapVectorStore
+
+
+def ingest(server, index_dir, embeddings, count=6, **options):
+    return research_pipeline.ingest(server.urls(count), index_dir, embeddings=embeddings, workers=1,
+                                    page_cache=False, keep_chunks=False, batch_size=8, **options)
+
+
+def wait(jobs, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while jobs.get(job_id).active:
+        assert time.time() < deadline, "job did not finish"
+        time.sleep(0.05)
+    return jobs.get(job_id)
+
+
+def test_ingest_indexes_every_article(server, plain_parse, embeddings, tmp_path):
+    index_dir = str(tmp_path / "corpus")
+    report = ingest(server, index_dir, embeddings)
+
+    assert len(report.loaded) == 6 and not report.failed
+    assert report.added == report.chunk_count > 0
+    assert len(index_store.list_sources(index_dir, lambda: embeddings)) == 6
+
+
+def test_background_job_runs_to_completion(server, plain_parse, embeddings, llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(research_pipeline, "get_cached_embeddings", lambda backend: embeddings)
+    monkeypatch.setattr(research_pipeline, "get_llm", lambda: llm)
+    jobs = IngestJobs(str(tmp_path / "jobs"))
+    index_dir = str(tmp_path / "corpus")
+    job = wait(jobs, jobs.submit(server.urls(4), index_dir, workers=1, page_cache=False))
+
+    assert job.state == "done", job.error
+    assert job.summary["loaded"] == 4 and len(job.checkpoint.get("done", [])) == 4
+    assert len(job.questions) >= 6
+    # a new process sees the finished job
+    assert IngestJobs(str(tmp_path / "jobs")).get(job.id).state == "done"
+
+
+def stored(index_dir, embeddings):
+    store = index_store.get_vectorstore(index_dir, lambda: embeddings)
+    positions, vectors = store.sample_vectors(store.count())
+    return {doc.page_content: vector for doc, vector in zip(store.documents_at(positions), vectors)}
+
+
+def cancelled_run(server, index_dir, embeddings, checkpoint):
+    cancel = threading.Event()
+    with pytest.raises(research_pipeline.IngestCancelled):
+        ingest(server, index_dir, embeddings, incremental=True, checkpoint=checkpoint, cancel=cancel,
+               on_batch=lambda report: cancel.set())
+    assert checkpoint["done"] and os.path.isdir(os.path.join(index_dir, checkpoint["version"]))
+
+
+def test_resumed_update_matches_an_uninterrupted_one(server, plain_parse, embeddings, tmp_path):
+    clean, resumed = str(tmp_path / "clean"), str(tmp_path / "resumed")
+    for index_dir in (clean, resumed):
+        ingest(server, index_dir, embeddings, count=2)
+    ingest(server, clean, embeddings, incremental=True)
+
+    checkpoint = {}
+    cancelled_run(server, resumed, embeddings, checkpoint)
+    # another update started from the same live version and abandoned
+    cancelled_run(server, resumed, embeddings, {})
+    report = ingest(server, resumed, embeddings, incremental=True, checkpoint=checkpoint)
+
+    assert report.skipped > 0
+    expected, actual = stored(clean, embeddings), stored(resumed, embeddings)
+    assert sorted(actual) == sorted(expected)
+    for text, vector in actual.items():
+        np.testing.assert_allclose(vector, embeddings.embed_query(text), atol=1e-6)
+
+
+def test_update_removes_the_old_chunks_of_a_page_whose_chunks_are_all_duplicates(server, plain_parse, embeddings,
+                                                                                   tmp_path):
+    index_dir = str(tmp_path / "corpus")
+    mirror = server.url(0) + "#mirror"  # the same page under another URL
+    first = research_pipeline.ingest([mirror], index_dir, embeddings=embeddings, workers=1, page_cache=False)
+
+    # whichever of the two is loaded first, the other one's chunks are all duplicates of it
+    report = research_pipeline.ingest([server.url(0), mirror], index_dir, embeddings=embeddings, workers=1,
+                                      page_cache=False, incremental=True)
+
+    assert report.removed == first.added > 0
+    assert index_store.get_vectorstore(index_dir, lambda: embeddings).count() == report.added == first.added
+
+
+def test_a_page_of_duplicates_is_done_only_once_its_url_is_saved(server, plain_parse, embeddings, tmp_path,
+                                                                  monkeypatch):
+    index_dir = str(tmp_path / "corpus")
+    page, mirror = server.url(0), server.url(0) + "#mirror"
+    chunks = research_pipeline.ingest([page], str(tmp_path / "alone"), embeddings=embeddings, workers=1,
+                                      page_cache=False).added
+
+    # the mirror is loaded only once every chunk of the page is written, so
+    # its duplicates are merged into chunks that are already on disk
+    all_written = threading.Event()
+    load = url_loader.iter_load_urls
+
+    def one_at_a_time(urls, **kwargs):
+        for url in urls:
+            if url == mirror:
+                assert all_written.wait(10)
+            yield from load([url], **kwargs)
+
+    def on_batch(report):
+        if report.chunk_count >= chunks:
+            all_written.set()
+
+    crash = [True]
+    remove_source = MmapVectorStore.remove_source
+
+    def crashing_remove_source(self, *args, **kwargs):
+        if crash[0]:
+            raise RuntimeError("crashed before commit")
+        return remove_source(self, *args, **kwargs)
+
+    monkeypatch.setattr(url_loader, "iter_load_urls", one_at_a_time)
+    monkeypatch.setattr(MmapVectorStore, "remove_source", crashing_remove_source)
+    checkpoint = {}
+    with pytest.raises(RuntimeError):
+        research_pipeline.ingest([page, mirror], index_dir, embeddings=embeddings, workers=1, page_cache=False,
+                                 batch_size=1, checkpoint=checkpoint, on_batch=on_batch)
+    assert checkpoint["done"] == [page]
+
+    crash[0] = False
+    research_pipeline.ingest([page, mirror], index_dir, embeddings=embeddings, workers=1, page_cache=False,
+                             checkpoint=checkpoint)
+    assert index_store.list_sources(index_dir, lambda: embeddings) == sorted([page, mirror])
+
+
+def test_jobs_that_ended_long_ago_are_forgotten(tmp_path):
+    jobs_dir = str(tmp_path / "jobs")
+    os.makedirs(jobs_dir)
+    now = time.time()
+    for job_id, state, finished in [("old", "done", now - 3600), ("stale", "cancelled", now - 7200),
+                                    ("recent", "failed", now - 60)]:
+        job = IngestJob(job_id, ["https://news.test/a"], str(tmp_path / "corpus"), state=state, finished=finished)
+        with open(os.path.join(jobs_dir, f"{job_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(dataclasses.asdict(job), f)
+
+    jobs = IngestJobs(jobs_dir, retention=600)
+    assert [job.id for job in jobs.jobs()] == ["recent"]
+    assert sorted(os.listdir(jobs_dir)) == ["recent.json"]
@@ -0,0 +1,56 @@
+import os
+
+from mmap_store import MmapVectorStore, copy_store
+
+
+def test_live_count_is_kept_across_deletes_compaction_and_reopening(tmp_path, embeddings):
+    path = str(tmp_path / "store")
+    store = MmapVectorStore(path, embeddings)
+    ids = store.add_texts([f"chunk {i} about trade" for i in range(10)])
+    store.delete(ids[:6] + ["unknown"])
+    assert store.count() == 4
+    assert len(store.similarity_search("trade", k=10)) == 4
+
+    store.commit()  # compacts the tombstones away
+    assert (store.rows, store.count()) == (4, 4)
+    store.close()
+    assert MmapVectorStore(path, embeddings).count() == 4
+
+
+def test_a_copy_shares_the_rows_of_its_base_and_writes_only_its_own(tmp_path, embeddings):
+    base = MmapVectorStore(str(tmp_path / "base"), embeddings)
+    ids = base.add_texts(
+        [f"chunk {i} about trade" for i in range(6)],
+        metadatas=[{"source": "a" if i < 3 else "b"} for i in range(6)],
+    )
+    base.commit()
+    copy_store(base.path, str(tmp_path / "copy"))
+
+    store = MmapVectorStore(str(tmp_path / "copy"), embeddings)
+    segment = f"seg-{base._meta('segment')}"
+    assert os.path.samefile(tmp_path / "copy" / f"{segment}.f32", tmp_path / "base" / "vectors.f32")
+    assert os.path.samefile(tmp_path / "copy" / f"{segment}.sqlite3", tmp_path / "base" / "docs.sqlite3")
+
+    store.add_texts(["chunk 6 about trade"], metadatas=[{"source": "c"}])
+    store.update_metadata({ids[0]: {"source": "a", "sources": ["a", "c"]}})
+    assert store.remove_source("a") == (2, 1)
+    assert os.path.getsize(tmp_path / "copy" / "vectors.f32") == 64 * 4  # only the new row
+    assert store.sources() == ["b", "c"]
+    assert len(store.ids_for_source("c")) == 2 and store.ids_for_source("c")[0] == ids[0]
+    store.commit()
+    store.close()
+
+    store = MmapVectorStore(str(tmp_path / "copy"), embeddings)
+    assert store.count() == 5
+    assert {doc.metadata["source"] for doc in store.similarity_search("trade", k=10)} == {"b", "c"}
+    # the base is untouched
+    assert base.count() == 6
+    assert base.sources() == ["a", "b"]
+
+    # a big enough update folds the shared rows back into the store's own file
+    store.add_texts([f"chunk {i} about trade" for i in range(7, 20)], metadatas=[{"source": "d"}] * 13)
+    store.commit()
+    assert not [name for name in os.listdir(store.path) if name.startswith("seg-")]
+    assert store.count() == 18
+    assert store.ids_for_source("c")[0] == ids[0]
+    assert base.count() == len(base.similarity_search("trade", k=10)) == 6
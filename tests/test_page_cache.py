@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+import url_loader
+from page_cache import PageCache
+
+
+@pytest.fixture
+def pages(tmp_path):
+    return PageCache(str(tmp_path / "pages.sqlite3"))
+
+
+def test_unchanged_page_is_revalidated_not_downloaded_or_parsed(server, pages, plain_parse, monkeypatch):
+    url = server.url(1)
+    first = url_loader.load_url(url, cache=pages)
+    assert first.ok and first.cache == "miss"
+
+    monkeypatch.setattr(url_loader, "parse_html", lambda html: pytest.fail("parsed again"))
+    before = server.not_modified
+    second = url_loader.load_url(url, cache=pages)
+    assert second.cache == "not_modified" and server.not_modified == before + 1
+    assert second.document.page_content == first.document.page_content
+    assert pages.stats()["not_modified"] == 1
+
+
+def test_same_body_without_validators_skips_parsing(pages):
+    pages.put("https://a.example/", "<p>body</p>")
+    pages.put_text("https://a.example/", "body")
+    cached = pages.get("https://a.example/")
+    assert cached.conditional_headers() == {}
+    assert pages.put("https://a.example/", "<p>body</p>", cached=cached) == "body"
+    assert pages.put("https://a.example/", "<p>new body</p>", cached=pages.get("https://a.example/")) is None
+
+
+def test_entries_older_than_max_age_are_fetched_again(tmp_path):
+    pages = PageCache(str(tmp_path / "pages.sqlite3"), max_age=0.01)
+    pages.put("https://a.example/", "<p>body</p>", etag='"x"')
+    time.sleep(0.02)
+    assert pages.get("https://a.example/") is None
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path):
+    pages = PageCache(str(tmp_path / "pages.sqlite3"), max_bytes=2000)
+    for n in range(40):
+        pages.put(f"https://a.example/{n}", f"<p>{n} " + "x" * 300 + f"{n * 7919}</p>")
+        pages.put_text(f"https://a.example/{n}", f"text {n} " * 20)
+    assert pages.stats()["bytes"] <= 2000
+    assert pages.get("https://a.example/39") is not None
+    assert pages.get("https://a.example/0") is None
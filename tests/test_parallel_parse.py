@@ -0,0 +1,41 @@
+import parallel_parse
+import url_loader
+
+SETTINGS = parallel_parse.SplitSettings(chunk_size=200, chunk_overlap=50)
+
+
+def article(i):
+    return " ".join(f"Paragraph {j} of article {i}." for j in range(30))
+
+
+def test_pages_come_back_in_order_with_positioned_chunks(plain_parse):
+    pages = [(f"https://news.test/{i}", f"<p>{article(i)}</p>") for i in range(3)]
+    parsed = list(parallel_parse.iter_parse_and_split(pages, SETTINGS, workers=1, keep_text=True))
+    assert [p.url for p in parsed] == [url for url, _ in pages]
+    for i, result in enumerate(parsed):
+        assert result.ok and result.text == article(i)
+        assert len(result.chunks) > 1
+        for chunk in result.chunks:
+            assert chunk.metadata["source"] == result.url
+            start = chunk.metadata["start_index"]
+            assert article(i)[start:start + len(chunk.page_content)] == chunk.page_content
+
+
+def test_a_page_that_fails_to_parse_is_reported_not_raised(monkeypatch):
+    def parse_html(html):
+        raise ValueError("not html")
+
+    monkeypatch.setattr(url_loader, "parse_html", parse_html)
+    [result] = parallel_parse.iter_parse_and_split([("https://news.test/bad", "???")], SETTINGS, workers=1)
+    assert not result.ok and result.error == "not html"
+
+
+def test_worker_processes_split_already_parsed_text_in_input_order():
+    pages = [(f"https://news.test/{i}", None, article(i)) for i in range(12)]
+    try:
+        parsed = list(parallel_parse.iter_parse_and_split(pages, SETTINGS, workers=2))
+    finally:
+        parallel_parse._discard_pool(2)
+    assert [p.url for p in parsed] == [url for url, _, _ in pages]
+    in_process = list(parallel_parse.iter_parse_and_split(pages, SETTINGS, workers=1))
+    assert [p.chunks for p in parsed] == [p.chunks for p in in_process]
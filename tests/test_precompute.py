@@ -0,0 +1,49 @@
+from langchain_core.documents import Document
+
+import index_store
+from answer_cache import AnswerCache
+from precompute import AnswerPrecomputer
+
+
+def rebuild(index_dir, embeddings, text):
+    index_store.rebuild_index(index_dir, [Document(page_content=text, metadata={"source": "u"})], embeddings)
+
+
+def test_answers_are_cached_only_for_the_version_they_were_submitted_for(tmp_path, embeddings):
+    index_dir = str(tmp_path / "corpus")
+    rebuild(index_dir, embeddings, "first version")
+    version = index_store.version_token(index_dir)
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    precomputer = AnswerPrecomputer(cache, max_workers=1)
+
+    def answer_after_a_rebuild(question):
+        rebuild(index_dir, embeddings, "second version")
+        return {"result": "from the second version", "source_documents": []}
+
+    precomputer.submit(index_dir, version, ["Replaced?"], answer_after_a_rebuild)
+    assert precomputer.future(index_dir, version, "Replaced?").result()["result"] == "from the second version"
+    assert cache.get(index_dir, version, "Replaced?") is None
+
+    version = index_store.version_token(index_dir)
+    precomputer.submit(index_dir, version, ["Kept?"], lambda question: {"result": "ok", "source_documents": []})
+    precomputer.future(index_dir, version, "Kept?").result()
+    assert cache.get(index_dir, version, "Kept?")["result"] == "ok"
+    index_store.invalidate(index_dir)
+
+
+def test_precomputing_does_not_count_as_cache_hits_or_misses(tmp_path, embeddings):
+    index_dir = str(tmp_path / "corpus")
+    rebuild(index_dir, embeddings, "only version")
+    version = index_store.version_token(index_dir)
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"))
+    cache.put(index_dir, version, "Asked before?", {"result": "yes", "source_documents": []})
+    precomputer = AnswerPrecomputer(cache, max_workers=1)
+
+    precomputer.submit(index_dir, version, ["Asked before?", "New?"],
+                       lambda question: {"result": "computed", "source_documents": []})
+    for question in ("Asked before?", "New?"):
+        precomputer.future(index_dir, version, question).result()
+    assert cache.stats() == {"hits": 0, "semantic_hits": 0, "misses": 1}
+    assert cache.get(index_dir, version, "New?")["result"] == "computed"
+    assert cache.stats()["hits"] == 1
+    index_store.invalidate(index_dir)
@@ -0,0 +1,36 @@
+import metrics
+import representatives
+from mmap_store import MmapVectorStore
+
+TOPICS = {
+    "shipping": "container freight port congestion vessel",
+    "elections": "ballot voters campaign polling candidate",
+    "weather": "storm rainfall forecast flooding temperature",
+}
+
+
+def test_one_chunk_stands_for_each_topic(tmp_path, embeddings):
+    store = MmapVectorStore(str(tmp_path / "store"), embeddings)
+    texts, metadatas = [], []
+    for topic, words in TOPICS.items():
+        for i in range(4 if topic == "shipping" else 2):
+            texts.append(f"{words} report {i}")
+            metadatas.append({"source": topic})
+    store.add_texts(texts, metadatas=metadatas)
+
+    picked = representatives.representative_chunks(store, clusters=3)
+    assert picked[0].metadata["source"] == "shipping"  # the biggest topic first
+    assert {doc.metadata["source"] for doc in picked} == set(TOPICS)
+    assert representatives.representative_chunks(store, clusters=3) == picked
+
+
+def test_the_budget_is_shared_and_short_texts_leave_theirs_to_others():
+    short, long = "one two", " ".join(["word"] * 200)
+    cut = representatives.share_budget([long, short, long], 62)
+    assert cut[1] == short
+    assert sum(metrics.count_tokens(text) for text in cut) <= 62
+    assert metrics.count_tokens(cut[0]) == metrics.count_tokens(cut[2]) == 30
+
+
+def test_an_empty_store_has_no_representatives(tmp_path, embeddings):
+    assert representatives.representative_chunks(MmapVectorStore(str(tmp_path / "store"), embeddings)) == []
@@ -0,0 +1,61 @@
+import pytest
+from langchain_core.documents import Document
+
+import index_store
+import metrics
+import research_pipeline
+
+
+class BrokenLLM:
+    def invoke(self, prompt):
+        raise ConnectionError("LLM unreachable")
+
+
+@pytest.fixture
+def index_dir(tmp_path, embeddings):
+    path = str(tmp_path / "corpus")
+    docs = [
+        Document(page_content=f"Article {i} on tariffs, trade policy and company earnings.",
+                 metadata={"source": f"https://{i}.example/"})
+        for i in range(4)
+    ]
+    index_store.rebuild_index(path, docs, embeddings)
+    index_store.get_vectorstore(path, lambda: embeddings)
+    yield path
+    index_store.invalidate(path)
+
+
+def test_answer_runs_the_chain_over_the_assembled_context(index_dir, embeddings, llm):
+    result = research_pipeline.answer("What about tariffs?", index_dir, llm, lambda: embeddings)
+
+    assert result["result"].startswith("token")
+    assert result["source_documents"]
+    assert result["context"]["prompt_tokens_after"] > 0
+
+
+def test_suggest_questions_falls_back_when_the_llm_fails(index_dir):
+    questions, sample = research_pipeline.suggest_questions(index_dir, BrokenLLM())
+
+    assert questions == research_pipeline.FALLBACK_QUESTIONS
+    assert "tariffs" in sample
+
+
+def test_answer_many_records_its_batch_on_the_given_run(index_dir, embeddings, llm):
+    run = metrics.RunMetrics("query", mode="batch")
+    results = list(research_pipeline.answer_many(["What about tariffs?", "And earnings?"], index_dir, llm,
+                                                  embeddings_factory=lambda: embeddings, run=run))
+
+    assert all(isinstance(result, dict) for _, result, _ in results)
+    summary = run.as_dict()
+    assert summary["counts"]["questions"] == 2
+    assert summary["counts"]["answer_tokens"] > 0
+    assert run.seconds is not None  # finished
+
+
+def test_answer_many_finishes_its_run_when_the_caller_stops_early(index_dir, embeddings, llm):
+    run = metrics.RunMetrics("query", mode="batch")
+    batch = research_pipeline.answer_many(["What about tariffs?", "And earnings?"], index_dir, llm,
+                                          embeddings_factory=lambda: embeddings, run=run)
+    next(batch)
+    batch.close()
+    assert run.seconds is not None
@@ -0,0 +1,37 @@
+import url_loader
+
+
+def test_url_lists_are_extracted_deduplicated_and_capped():
+    text = """
+        https://a.example/one, https://b.example/two.
+        (see https://a.example/one) http://c.example/three;https://d.example/four
+    """
+    assert url_loader.parse_url_list(text) == [
+        "https://a.example/one", "https://b.example/two", "http://c.example/three", "https://d.example/four",
+    ]
+    assert url_loader.parse_url_list(text, limit=2) == ["https://a.example/one", "https://b.example/two"]
+    assert url_loader.parse_url_list(None) == []
+
+
+def test_hosts_are_interleaved():
+    urls = ["https://a.example/1", "https://a.example/2", "https://a.example/3", "https://b.example/1"]
+    assert url_loader._interleave_hosts(urls) == [
+        "https://a.example/1", "https://b.example/1", "https://a.example/2", "https://a.example/3",
+    ]
+
+
+def test_every_url_gets_a_result_and_failures_do_not_stop_the_batch(server, plain_parse):
+    urls = server.urls(5) + [f"http://127.0.0.1:{server.port}/missing"]
+    results = {result.url: result for result in url_loader.iter_load_urls(urls, max_workers=4, per_host=2)}
+    assert set(results) == set(urls)
+    for url in server.urls(5):
+        assert results[url].ok and results[url].document.metadata == {"source": url}
+        assert results[url].html is None  # parsed pages don't keep their html
+    missing = results[urls[-1]]
+    assert not missing.ok and "404" in missing.error
+
+
+def test_unparsed_pages_keep_their_html(server):
+    [result] = url_loader.iter_load_urls([server.url(0)], parse=False)
+    assert result.error is None and result.document is None
+    assert result.html.startswith("<") and result.size == len(result.html.encode("utf-8"))